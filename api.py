@@ -0,0 +1,225 @@
+# api.py
+# Parsing and validation of the speech requests, shared by the Flask server
+# (server.py) and the ASGI server (asgi.py). Each parser returns the keyword
+# arguments of an audio response: the generation `params`, `response_format`,
+# `stream_format` (None when not streaming) and `priority`.
+# Streamed audio is framed by `stream_event`, and response bodies are sent in
+# slices by `iter_slices`.
+
+import base64
+import json
+
+import config
+from models import model_registry, variant_name
+
+# WSGI and ASGI bodies must be bytes, so audio written in place in a buffer
+# is sent in slices of this size, copying only one slice at a time
+SEND_SLICE_BYTES = 2**20
+
+
+class RequestError(ValueError):
+    """Invalid request, answered with a 400 and the message."""
+
+
+def parse_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def validate_stream_format(stream_format) -> None:
+    if stream_format not in config.SUPPORTED_STREAM_FORMATS:
+        raise RequestError(
+            "Unsupported stream format specified. Got: " + str(stream_format)
+        )
+
+
+def _validate(text, voice, response_format) -> None:
+    if not text:
+        raise RequestError("Input text is required.")
+    if voice not in config.SUPPORTED_VOICES:
+        raise RequestError("Unsupported voice specified.")
+    if response_format not in config.SUPPORTED_RESPONSE_FORMATS:
+        raise RequestError(
+            "Unsupported response format specified. Got: " + response_format
+        )
+
+
+def parse_speech_request(data: dict) -> dict:
+    """
+    OpenAI API compatible request, it supports a limited set of parameters.
+    """
+    # OpenAI API compatible parameters only
+    text = data.get("input")
+    model = data.get("model", config.MODEL)
+    voice = data.get("voice")
+    response_format = data.get("response_format", "wav")
+    stream_format = data.get("stream_format")
+
+    print(f"Got request: {data}")
+
+    _validate(text, voice, response_format)
+    if stream_format is not None:
+        validate_stream_format(stream_format)
+
+    params = dict(
+        text=text,
+        voice=voice,
+        speed=1.0,
+        cfg_weight=config.AUDIO_CFG_WEIGHT,
+        temperature=config.AUDIO_TEMPERATURE,
+        exaggeration=config.AUDIO_EXAGGERATION,
+        chunk_size=250,
+        # A short first chunk only gets the first audio out sooner when
+        # the response is streamed
+        first_chunk_size=config.FIRST_CHUNK_SIZE if stream_format else 0,
+        target_latency=config.TARGET_LATENCY if stream_format else 0.0,
+        stream_tokens=config.STREAM_TOKENS if stream_format else 0,
+        seed=0,
+        model_name=model,
+        language_id=config.LANGUAGE_ID,
+        precision=config.PRECISION,
+    )
+    return dict(
+        params=params,
+        response_format=response_format,
+        stream_format=stream_format,
+        priority=config.DEFAULT_PRIORITY,
+    )
+
+
+def parse_tts_request(data: dict) -> dict:
+    """Request with the additional parameters used by Chatterbox."""
+    text = data.get("text")
+    voice = data.get("predefined_voice_id")
+    model = data.get("model", config.MODEL)
+    speed = float(data.get("speed_factor", 1.0))
+    cfg = float(data.get("cfg_weight", config.AUDIO_CFG_WEIGHT))
+    temperature = float(data.get("temperature", config.AUDIO_TEMPERATURE))
+    exaggeration = float(data.get("exaggeration", config.AUDIO_EXAGGERATION))
+    response_format = data.get("output_format", "wav")
+    seed = data.get("seed", config.SEED)
+    language_id = data.get("language_id", config.LANGUAGE_ID)
+    precision = data.get("precision", config.PRECISION)
+    stream_format = data.get("stream_format")
+    stream = parse_bool(data.get("stream", False)) or stream_format is not None
+    priority = int(data.get("priority", config.DEFAULT_PRIORITY))
+
+    print(f"Got request: {data}")
+    chunk_size = data.get("chunk_size", 250)
+    first_chunk_size = int(data.get("first_chunk_size", config.FIRST_CHUNK_SIZE))
+    target_latency = float(data.get("target_latency", config.TARGET_LATENCY))
+    stream_tokens = int(data.get("stream_tokens", config.STREAM_TOKENS))
+
+    _validate(text, voice, response_format)
+
+    if chunk_size < 1:
+        raise RequestError("Chunk size must be greater than 0.")
+
+    if first_chunk_size < 0 or target_latency < 0:
+        raise RequestError("First chunk size and target latency can't be negative.")
+
+    if stream_tokens < 0:
+        raise RequestError("Stream tokens can't be negative.")
+
+    if model not in config.SUPPORTED_MODELS:
+        raise RequestError("Unsupported model specified.")
+
+    if language_id not in config.SUPPORTED_LANGUAGE_IDS:
+        raise RequestError("Unsupported language id specified.")
+
+    # Only the variants loaded by the server, not one per request
+    if precision not in config.PRECISIONS:
+        supported = ", ".join(config.PRECISIONS)
+        raise RequestError(f"Unsupported precision specified. Supported: {supported}")
+
+    # A variant evicted since the warmup is not reloaded by a request either
+    variant = variant_name(model, precision)
+    if (
+        config.WARMUP
+        and precision != config.PRECISION
+        and variant not in model_registry.loaded()
+    ):
+        raise RequestError(f"Precision {precision} of {model} is not loaded.")
+
+    if stream:
+        stream_format = stream_format or "audio"
+        validate_stream_format(stream_format)
+
+    params = dict(
+        text=text,
+        voice=voice,
+        speed=speed,
+        cfg_weight=cfg,
+        temperature=temperature,
+        exaggeration=exaggeration,
+        chunk_size=chunk_size,
+        # Only streamed responses are sent before their chunks are done, the
+        # others are chunked the same way whatever the speed of the model
+        first_chunk_size=first_chunk_size if stream else 0,
+        target_latency=target_latency if stream else 0.0,
+        stream_tokens=stream_tokens if stream else 0,
+        seed=seed,
+        model_name=model,
+        language_id=language_id,
+        precision=precision,
+    )
+    return dict(
+        params=params,
+        response_format=response_format,
+        stream_format=stream_format if stream else None,
+        priority=priority,
+    )
+
+
+def parse_job_request(data: dict) -> dict:
+    """
+    Background job request, with the parameters of /tts. Jobs run at
+    JOB_PRIORITY unless the request sets its priority. Nobody waits for
+    their first audio, so their chunks have the same size unless the request
+    sets first_chunk_size, and never depend on the measured speed: a resumed
+    job must split its text the same way. Jobs checkpoint whole chunks, so
+    they are never streamed in pieces.
+    """
+    request = parse_tts_request(data)
+    del request["stream_format"]
+    request["params"]["stream_tokens"] = 0
+    request["params"]["first_chunk_size"] = int(data.get("first_chunk_size", 0))
+    request["params"]["target_latency"] = 0.0
+    request["priority"] = int(data.get("priority", config.JOB_PRIORITY))
+    return request
+
+
+def iter_slices(data, size: int = SEND_SLICE_BYTES):
+    """Yields bytes-like `data` as bytes, in slices unless it is bytes."""
+    if isinstance(data, bytes):
+        yield data
+        return
+    with memoryview(data) as view:
+        for start in range(0, len(view), size):
+            yield bytes(view[start : start + size])
+
+
+def stream_event(data: bytes, stream_format: str):
+    """
+    Frames streamed audio: raw bytes, or with the "sse" stream format base64
+    encoded `speech.audio.delta` server-sent events like the OpenAI API.
+    """
+    if not data:
+        return
+    if stream_format != "sse":
+        yield from iter_slices(data)
+        return
+    for start in range(0, len(data), SEND_SLICE_BYTES):
+        event = {
+            "type": "speech.audio.delta",
+            "audio": base64.b64encode(data[start : start + SEND_SLICE_BYTES]).decode(
+                "ascii"
+            ),
+        }
+        yield f"data: {json.dumps(event)}\n\n"
+
+
+def stream_done_event(stream_format: str):
+    if stream_format == "sse":
+        yield f"data: {json.dumps({'type': 'speech.audio.done'})}\n\n"
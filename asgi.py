@@ -0,0 +1,450 @@
+# asgi.py
+# Async variant of the routes of server.py, as a plain ASGI application run
+# by an ASGI server such as uvicorn:
+#
+#     uvicorn asgi:app --host 0.0.0.0 --port 5001
+#
+# While a request is being generated, it watches for the client disconnecting
+# and for REQUEST_TIMEOUT, and cancels the generation at the next chunk
+# boundary so that the model moves on to the queued requests. The synthesis
+# time saved by cancelling is reported by GET /queue.
+
+import asyncio
+import json
+import os
+import time
+import traceback
+
+import api
+import config
+import metrics
+import tts
+from api import RequestError, stream_done_event, stream_event
+from chunk_cache import chunk_cache
+from conditionals import conditionals_cache
+from jobs import job_manager
+from models import model_registry
+from response_cache import response_cache
+from scheduler import QueueFullError
+from warmup import WarmingUpError, warmup
+
+
+class Interrupted(Exception):
+    """The client went away or the request timed out while `pending` ran."""
+
+    def __init__(self, reason: str, pending: asyncio.Future = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.pending = pending
+
+
+class Request:
+    def __init__(self, scope, receive):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        self._receive = receive
+        self.disconnected = asyncio.Event()
+        self.deadline = None
+        if config.REQUEST_TIMEOUT:
+            self.deadline = time.monotonic() + config.REQUEST_TIMEOUT
+
+    async def body(self) -> bytes:
+        chunks = []
+        while True:
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                self.disconnected.set()
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def watch_disconnect(self) -> None:
+        """Once the body is read, the next message is the disconnection."""
+        while not self.disconnected.is_set():
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                self.disconnected.set()
+
+    async def run(self, func, *args):
+        """
+        Runs the blocking `func` in a thread. Raises Interrupted if the client
+        disconnects or the deadline passes first, leaving `func` running.
+        """
+        pending = asyncio.get_running_loop().run_in_executor(None, func, *args)
+        disconnected = asyncio.ensure_future(self.disconnected.wait())
+        timeout = None
+        if self.deadline is not None:
+            timeout = max(0.0, self.deadline - time.monotonic())
+        done, _ = await asyncio.wait(
+            {pending, disconnected},
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        disconnected.cancel()
+        if pending in done:
+            return pending.result()
+        reason = "disconnected" if self.disconnected.is_set() else "timed out"
+        raise Interrupted(reason, pending)
+
+
+def _disconnect_on_error(send):
+    """
+    `send` raising Interrupted when the ASGI server fails to send to a
+    disconnected client, so that only those errors cancel the generation.
+    """
+
+    async def checked_send(message):
+        try:
+            await send(message)
+        except OSError:
+            raise Interrupted("disconnected")
+
+    return checked_send
+
+
+def _cors_headers() -> list:
+    return [(b"access-control-allow-origin", config.CORS_ALLOWED_ORIGIN.encode())]
+
+
+async def _start_response(send, status: int, content_type: str, headers=()):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type.encode())]
+            + _cors_headers()
+            + [(name.encode(), str(value).encode()) for name, value in headers],
+        }
+    )
+
+
+async def _send(send, status: int, body: bytes, content_type: str, headers=()):
+    await _start_response(send, status, content_type, headers)
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, data, status: int = 200, headers=()):
+    await _send(send, status, json.dumps(data).encode(), "application/json", headers)
+
+
+async def _send_audio(send, audio_data: bytes, response_format: str, etag: str):
+    headers = [
+        ("content-disposition", f"attachment; filename=speech.{response_format}"),
+        ("content-length", len(audio_data)),
+    ]
+    if etag:
+        headers.append(("etag", f'"{etag}"'))
+    await _start_response(send, 200, "audio/" + response_format, headers)
+    for data in api.iter_slices(audio_data):
+        await _send_body(send, data)
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _matches_etag(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = [
+        tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")
+    ]
+    return etag in tags
+
+
+async def _audio_response(
+    request: Request,
+    send,
+    params: dict,
+    response_format: str,
+    stream_format: str = None,
+    priority: int = config.DEFAULT_PRIORITY,
+):
+    warmup.check()
+    start = time.perf_counter()
+    key = None
+    if response_cache.enabled:
+        key = response_cache.key(response_format, **params)
+        if _matches_etag(request, key):
+            headers = [("etag", f'"{key}"')]
+            await _send(send, 304, b"", "audio/" + response_format, headers)
+            return
+        audio_data = response_cache.get(key, response_format)
+        if audio_data is not None:
+            metrics.observe_request(
+                params["model_name"],
+                params["voice"],
+                response_format,
+                time.perf_counter() - start,
+                cache="hit",
+            )
+            await _send_audio(send, audio_data, response_format, key)
+            return
+
+    send = _disconnect_on_error(send)
+    audio_stream = tts.generate_audio_stream(**params, priority=priority)
+    audio = tts.encode_audio_stream(
+        audio_stream, response_format, streaming=stream_format is not None
+    )
+    started = False
+    try:
+        # Wait for the worker to start the job so that errors get a proper status
+        await request.run(lambda: audio_stream.sample_rate)
+
+        if stream_format is None:
+            audio_data = tts.join_audio(await request.run(list, audio))
+            if key:
+                response_cache.put(key, response_format, audio_data)
+            await _send_audio(send, audio_data, response_format, key)
+            return
+
+        content_type = "audio/" + response_format
+        if stream_format == "sse":
+            content_type = "text/event-stream"
+        await _start_response(
+            send,
+            200,
+            content_type,
+            [("x-accel-buffering", "no"), ("cache-control", "no-cache")],
+        )
+        started = True
+        while (data := await request.run(next, audio, None)) is not None:
+            for event in stream_event(data, stream_format):
+                await _send_body(send, event)
+        for event in stream_done_event(stream_format):
+            await _send_body(send, event)
+        await send({"type": "http.response.body", "body": b""})
+
+    except Interrupted as e:
+        reason = e.reason
+        print(f"Request {reason}, cancelling its generation")
+        audio_stream.cancel()
+        pending = e.pending
+        if pending is not None and audio.gi_running:
+            # The worker stops at the end of the current chunk, then the
+            # encoder can be released
+            try:
+                await pending
+            except Exception:
+                pass
+        audio.close()
+        if reason == "timed out":
+            if not started:
+                await _send_json(send, {"error": "Request timed out."}, 504)
+            else:
+                await send({"type": "http.response.body", "body": b""})
+    except Exception:
+        # Generation or encoding failed: stop the generation, then answer
+        # with a 500 unless the audio is already being streamed
+        audio_stream.cancel()
+        audio.close()
+        if not started:
+            raise
+        traceback.print_exc()
+        try:
+            await send({"type": "http.response.body", "body": b""})
+        except Interrupted:
+            pass
+
+
+async def _send_body(send, data) -> None:
+    if isinstance(data, str):
+        data = data.encode()
+    await send({"type": "http.response.body", "body": data, "more_body": True})
+
+
+async def _speech_api(request: Request, send, data: dict):
+    await _audio_response(request, send, **api.parse_speech_request(data))
+
+
+async def _tts_api(request: Request, send, data: dict):
+    await _audio_response(request, send, **api.parse_tts_request(data))
+
+
+async def _send_file(send, path: str, content_type: str, headers=()):
+    """Streams the file from disk."""
+    size = os.path.getsize(path)
+    await _start_response(
+        send, 200, content_type, [("content-length", size), *headers]
+    )
+    loop = asyncio.get_running_loop()
+    with open(path, "rb") as f:
+        while data := await loop.run_in_executor(None, f.read, 65536):
+            await _send_body(send, data)
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _jobs_api(request: Request, send) -> None:
+    """POST /jobs, GET /jobs/<id>, GET /jobs/<id>/audio and DELETE /jobs/<id>."""
+    parts = request.path.strip("/").split("/")
+    if request.method == "POST" and parts == ["jobs"]:
+        if not job_manager.enabled:
+            await _send_json(send, {"error": "Jobs are disabled."}, 404)
+            return
+        try:
+            data = json.loads(await request.body())
+            job_request = api.parse_job_request(data)
+        except RequestError as e:
+            await _send_json(send, {"error": str(e)}, 400)
+            return
+        except ValueError:
+            await _send_json(send, {"error": "Invalid JSON body."}, 400)
+            return
+        job = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: job_manager.submit(**job_request)
+        )
+        await _send_json(send, job, 202, [("location", f"/jobs/{job['id']}")])
+        return
+
+    job = job_manager.status(parts[1]) if len(parts) in (2, 3) else None
+    if job is None:
+        await _send_json(send, {"error": "Job not found."}, 404)
+    elif request.method == "GET" and len(parts) == 2:
+        await _send_json(send, job)
+    elif request.method == "DELETE" and len(parts) == 2:
+        job_manager.delete(job["id"])
+        await _send(send, 204, b"", "text/plain")
+    elif request.method == "GET" and parts[2] == "audio":
+        path = job_manager.audio_path(job["id"])
+        if path is None:
+            error = {"error": "Job is not done.", "status": job["status"]}
+            await _send_json(send, error, 409)
+            return
+        response_format = job["response_format"]
+        await _send_file(
+            send,
+            path,
+            "audio/" + response_format,
+            [
+                (
+                    "content-disposition",
+                    f"attachment; filename=speech.{response_format}",
+                )
+            ],
+        )
+    else:
+        await _send_json(send, {"error": "Not found."}, 404)
+
+
+def _predefined_voices():
+    return [
+        {"display_name": voice, "filename": voice}
+        for voice in config.SUPPORTED_VOICES
+    ]
+
+
+AUDIO_ROUTES = {
+    "/v1/audio/speech": _speech_api,
+    "/tts": _tts_api,
+}
+
+JSON_ROUTES = {
+    "/health/live": lambda: {"status": "ok"},
+    "/voices": lambda: {"voices": config.SUPPORTED_VOICES},
+    "/models": lambda: {"models": config.SUPPORTED_MODELS},
+    "/models/stats": model_registry.stats,
+    "/cache/stats": lambda: {
+        "responses": response_cache.stats(),
+        "chunks": chunk_cache.stats(),
+        "conditionals": conditionals_cache.stats(),
+    },
+    "/queue": lambda: tts.inference_scheduler.stats(),
+    "/languages": lambda: {"languages": config.SUPPORTED_LANGUAGE_IDS},
+    "/get_predefined_voices": _predefined_voices,
+    # These are strictly for ST to avoid errors
+    "/get_reference_files": lambda: [],
+    "/api/ui/initial-data": lambda: {},
+}
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Resume the unfinished background jobs once the model is warm
+            warmup.start(on_ready=job_manager.start)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    request = Request(scope, receive)
+    if request.method == "OPTIONS":
+        # CORS preflight
+        headers = [
+            ("access-control-allow-methods", "GET, POST, DELETE, OPTIONS"),
+            (
+                "access-control-allow-headers",
+                request.headers.get("access-control-request-headers", "*"),
+            ),
+        ]
+        await _send(send, 204, b"", "text/plain", headers)
+        return
+
+    if request.path == "/jobs" or request.path.startswith("/jobs/"):
+        await _jobs_api(request, send)
+        return
+    if request.method == "GET" and request.path == "/health/ready":
+        await _send_json(send, warmup.status(), 200 if warmup.ready else 503)
+        return
+    if request.method == "GET" and request.path == "/metrics":
+        await _send(send, 200, metrics.render().encode(), metrics.CONTENT_TYPE)
+        return
+    if request.method == "GET" and request.path in JSON_ROUTES:
+        await _send_json(send, JSON_ROUTES[request.path]())
+        return
+    if request.method != "POST" or request.path not in AUDIO_ROUTES:
+        await _send_json(send, {"error": "Not found."}, 404)
+        return
+
+    try:
+        data = json.loads(await request.body())
+    except ValueError:
+        await _send_json(send, {"error": "Invalid JSON body."}, 400)
+        return
+    if request.disconnected.is_set():
+        return
+
+    watcher = asyncio.ensure_future(request.watch_disconnect())
+    try:
+        await AUDIO_ROUTES[request.path](request, send, data)
+    except RequestError as e:
+        await _send_json(send, {"error": str(e)}, 400)
+    except WarmingUpError as e:
+        await _send_json(send, {"error": str(e)}, 503, [("retry-after", "5")])
+    except QueueFullError as e:
+        # Rejects the request right away instead of piling it onto the model
+        await _send_json(
+            send,
+            {"error": "Server is busy, please retry later."},
+            config.QUEUE_FULL_STATUS,
+            [
+                ("retry-after", "1"),
+                ("x-queue-depth", e.depth),
+                ("x-queue-capacity", e.capacity),
+            ],
+        )
+    except Exception:
+        traceback.print_exc()
+        await _send_json(send, {"error": "Internal server error."}, 500)
+    finally:
+        watcher.cancel()
+
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The ASGI server needs uvicorn: pip install uvicorn")
+
+    uvicorn.run(app, host=config.API_HOST, port=int(config.API_PORT))
@@ -0,0 +1,31 @@
+# backends/__init__.py
+# Inference backends, see backends/base.py for the interface. BACKEND picks
+# the engine of the models:
+#   pytorch  the Chatterbox models of the chatterbox package, in PyTorch
+#   onnx     Chatterbox-Turbo with its transformer run under ONNX Runtime on
+#            CPU, from the graphs of export_onnx.py. The other models and
+#            precisions use the pytorch backend.
+# The Stub model of STUB_MODEL has a backend of its own, see backends/stub.py.
+# The engines are imported when a model is loaded, not with the server.
+
+import config
+from backends.base import BATCH, STREAM, Backend  # noqa: F401
+
+
+def load_backend(model_name: str, precision: str = "fp32") -> Backend:
+    """Loads `model_name` in `precision` with the BACKEND engine."""
+    if model_name == "Stub":
+        from backends.stub import StubBackend
+
+        return StubBackend.load(model_name, precision)
+
+    if config.BACKEND == "onnx":
+        from backends.onnx_runtime import OnnxBackend
+
+        if OnnxBackend.supports(model_name, precision):
+            return OnnxBackend.load(model_name, precision)
+        print(f"No ONNX backend for {model_name} in {precision}, using PyTorch")
+
+    from backends.pytorch import ChatterboxBackend
+
+    return ChatterboxBackend.load(model_name, precision)
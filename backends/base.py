@@ -0,0 +1,68 @@
+# backends/base.py
+# Interface between the server and an inference engine. A backend holds one
+# loaded model in one precision. It turns a reference wav into voice
+# conditionals, and generates the float waveform of a text chunk with them.
+# Backends are only called from the inference worker thread, one chunk at a
+# time, apart from `prepare_voice`, `load_voice` and `save_voice`, which the
+# warmup also calls.
+
+# Capabilities of a backend
+BATCH = "batch"  # generate_batch generates several chunks in one call
+STREAM = "stream"  # stream hands out pieces of a chunk while it is generated
+
+
+class Backend:
+    # Name of the engine, for the logs and the stats
+    engine = ""
+
+    def __init__(self, model_name: str, precision: str = "fp32"):
+        self.model_name = model_name
+        self.precision = precision
+        self.capabilities = frozenset()
+
+    @classmethod
+    def load(cls, model_name: str, precision: str = "fp32") -> "Backend":
+        """Loads `model_name` in `precision`."""
+        raise NotImplementedError
+
+    @property
+    def sample_rate(self) -> int:
+        """Sample rate of the generated audio."""
+        raise NotImplementedError
+
+    def prepare_voice(self, wav_path: str, exaggeration: float):
+        """Voice conditionals of the reference wav, passed to `generate`."""
+        raise NotImplementedError
+
+    def load_voice(self, path: str):
+        """Voice conditionals saved by `save_voice`."""
+        raise NotImplementedError
+
+    def save_voice(self, voice, path: str) -> None:
+        raise NotImplementedError
+
+    def generate(self, text: str, voice, **params):
+        """
+        Float32 waveform of `text`, as a 1-D numpy array. `params` are the
+        generation parameters: exaggeration, temperature, cfg_weight, seed
+        (0 when the request has none) and, for the multilingual model,
+        language_id. The global generators are already seeded by the
+        inference worker for seeded requests.
+        """
+        raise NotImplementedError
+
+    def generate_batch(self, texts: list, voice, **params) -> list:
+        """Waveforms of `texts`, generated together with the BATCH capability."""
+        return [self.generate(text, voice, **params) for text in texts]
+
+    def stream(self, text: str, voice, stream_tokens: int, emit, **params):
+        """
+        With the STREAM capability, generates `text` like `generate` but
+        calls `emit(wav)` with each piece of about `stream_tokens` speech
+        tokens decoded before the end of the text. Returns the last piece.
+        """
+        raise NotImplementedError
+
+    def memory_bytes(self) -> int:
+        """Memory used by the weights, for the memory budget of the registry."""
+        return 0
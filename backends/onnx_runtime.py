@@ -0,0 +1,223 @@
+# backends/onnx_runtime.py
+# Chatterbox-Turbo with its speech token transformer run under ONNX Runtime
+# on CPU. The transformer runs once per generated speech token and takes most
+# of the synthesis time, so it is exported by export_onnx.py as one graph
+# taking the input embeddings and the key/value cache of the previous tokens,
+# and returning the hidden states and the extended cache. ONNX Runtime
+# replaces `t3.tfmr` in the PyTorch model, whose token loop, embeddings,
+# sampling and S3Gen decoder are used as they are.
+#
+# Needs onnxruntime, which is not installed with the other dependencies, and
+# the graphs in ONNX_DIR/<model>/, see export_onnx.py. This module is only
+# imported with BACKEND=onnx, so it imports torch right away.
+
+import os
+
+import numpy as np
+import torch
+
+import config
+from backends.pytorch import ChatterboxBackend
+
+# Models whose transformer can be exported: the GPT-2 backbone of Turbo. The
+# Llama backbone of the others is run by chatterbox with attention outputs
+# for its alignment analysis, which the graph doesn't return.
+MODELS = ("Chatterbox-Turbo",)
+TRANSFORMER_FILE = "t3_tfmr.onnx"
+
+
+def graph_path(model_name: str, onnx_dir: str = None) -> str:
+    return os.path.join(onnx_dir or config.ONNX_DIR, model_name, TRANSFORMER_FILE)
+
+
+def _stack_cache(cache) -> tuple:
+    """Keys and values of a key/value cache, stacked over the layers."""
+    if hasattr(cache, "layers"):
+        # transformers 5
+        keys = [layer.keys for layer in cache.layers]
+        values = [layer.values for layer in cache.layers]
+    elif hasattr(cache, "key_cache"):
+        # Cache object of transformers 4
+        keys, values = cache.key_cache, cache.value_cache
+    else:
+        # Legacy tuple of (key, value) per layer, returned by the GPT-2 of the
+        # transformers 4.46 pinned by chatterbox
+        keys = [layer[0] for layer in cache]
+        values = [layer[1] for layer in cache]
+    return torch.stack(keys), torch.stack(values)
+
+
+def _transformer_step(tfmr):
+    """Module running `tfmr` on stacked tensors of its key/value cache."""
+    import transformers
+
+    # GPT-2 only takes Cache objects from transformers 5, and only the legacy
+    # tuples before
+    legacy_cache = int(transformers.__version__.split(".")[0]) < 5
+
+    class TransformerStep(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.tfmr = tfmr
+
+        def forward(self, inputs_embeds, past_keys, past_values):
+            # Caches are (layers, batch, heads, tokens, head size)
+            layers = range(past_keys.shape[0])
+            if legacy_cache:
+                cache = tuple((past_keys[i], past_values[i]) for i in layers)
+            else:
+                from transformers.cache_utils import DynamicCache
+
+                cache = DynamicCache()
+                for i in layers:
+                    cache.update(past_keys[i], past_values[i], i)
+            outputs = self.tfmr(
+                inputs_embeds=inputs_embeds, past_key_values=cache, use_cache=True
+            )
+            keys, values = _stack_cache(outputs.past_key_values)
+            return outputs.last_hidden_state, keys, values
+
+    return TransformerStep().eval()
+
+
+def _cache_shape(tfmr_config, batch: int, tokens: int) -> tuple:
+    heads = tfmr_config.n_head
+    return (
+        tfmr_config.n_layer,
+        batch,
+        heads,
+        tokens,
+        tfmr_config.hidden_size // heads,
+    )
+
+
+def export(tts_model, model_name: str, onnx_dir: str = None) -> str:
+    """Exports the transformer of `tts_model`, returns the graph path."""
+    t3 = tts_model.t3
+    step = _transformer_step(t3.tfmr)
+    # Batch of 2 so that the batch dimension is not specialized to 1
+    inputs_embeds = torch.randn(2, 8, t3.cfg.hidden_size)
+    past_keys = torch.randn(_cache_shape(t3.cfg, 2, 4))
+    past_values = torch.randn(_cache_shape(t3.cfg, 2, 4))
+    batch = torch.export.Dim("batch")
+    cache = {1: batch, 3: torch.export.Dim("past")}
+
+    path = graph_path(model_name, onnx_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.onnx.export(
+        step,
+        (inputs_embeds, past_keys, past_values),
+        path,
+        input_names=["inputs_embeds", "past_keys", "past_values"],
+        output_names=["hidden_states", "keys", "values"],
+        dynamic_shapes={
+            "inputs_embeds": {0: batch, 1: torch.export.Dim("tokens")},
+            "past_keys": cache,
+            "past_values": cache,
+        },
+        dynamo=True,
+    )
+    return path
+
+
+def check(tts_model, path: str) -> float:
+    """Largest difference between the hidden states of the graph and PyTorch."""
+    t3 = tts_model.t3
+    transformer = OnnxTransformer(path, t3.cfg)
+    inputs_embeds = torch.randn(1, 12, t3.cfg.hidden_size)
+    next_embeds = torch.randn(1, 1, t3.cfg.hidden_size)
+    with torch.inference_mode():
+        expected = t3.tfmr(inputs_embeds=inputs_embeds, use_cache=True)
+        expected = t3.tfmr(
+            inputs_embeds=next_embeds,
+            past_key_values=expected.past_key_values,
+            use_cache=True,
+        )[0]
+        outputs = transformer(inputs_embeds=inputs_embeds, use_cache=True)
+        outputs = transformer(
+            inputs_embeds=next_embeds,
+            past_key_values=outputs.past_key_values,
+            use_cache=True,
+        )[0]
+    return float(np.abs(outputs.numpy() - expected.numpy()).max())
+
+
+class OnnxTransformer(torch.nn.Module):
+    """
+    Stand-in for the Hugging Face transformer of T3: same call, with the
+    key/value cache kept as the numpy arrays of the graph.
+    """
+
+    def __init__(self, path: str, tfmr_config):
+        super().__init__()
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError(
+                "The onnx backend needs onnxruntime: pip install onnxruntime"
+            )
+
+        options = onnxruntime.SessionOptions()
+        if config.CPU_THREADS > 0:
+            options.intra_op_num_threads = config.CPU_THREADS
+        if config.CPU_INTEROP_THREADS > 0:
+            options.inter_op_num_threads = config.CPU_INTEROP_THREADS
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.config = tfmr_config
+        # The weights are saved next to the graph, in <graph>.data
+        files = [file for file in (path, path + ".data") if os.path.exists(file)]
+        self.file_bytes = sum(os.path.getsize(file) for file in files)
+
+    def forward(self, inputs_embeds, past_key_values=None, use_cache=True, **kwargs):
+        from transformers.modeling_outputs import (
+            BaseModelOutputWithPastAndCrossAttentions,
+        )
+
+        if past_key_values is None:
+            empty = np.zeros(
+                _cache_shape(self.config, inputs_embeds.shape[0], 0), np.float32
+            )
+            past_key_values = (empty, empty)
+        hidden_states, keys, values = self.session.run(
+            None,
+            {
+                "inputs_embeds": inputs_embeds.float().cpu().numpy(),
+                "past_keys": past_key_values[0],
+                "past_values": past_key_values[1],
+            },
+        )
+        return BaseModelOutputWithPastAndCrossAttentions(
+            last_hidden_state=torch.from_numpy(hidden_states),
+            past_key_values=(keys, values),
+        )
+
+
+class OnnxBackend(ChatterboxBackend):
+    engine = "onnx"
+
+    @classmethod
+    def supports(cls, model_name: str, precision: str) -> bool:
+        # The graphs are exported in fp32
+        return model_name in MODELS and precision == "fp32"
+
+    @classmethod
+    def load(cls, model_name: str, precision: str = "fp32", device: str = None):
+        path = graph_path(model_name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"No ONNX graph for {model_name} in {path}, "
+                f"run: python export_onnx.py --model {model_name}"
+            )
+        # ONNX Runtime runs on the CPU, and so does the rest of the model
+        backend = super().load(model_name, precision, device="cpu")
+        t3 = backend.tts_model.t3
+        # Replaces the PyTorch transformer, whose weights are released
+        t3.tfmr = OnnxTransformer(path, t3.cfg)
+        print(f"Running the {model_name} transformer with ONNX Runtime: {path}")
+        return backend
+
+    def memory_bytes(self) -> int:
+        # The weights of the graph are held by ONNX Runtime
+        return super().memory_bytes() + self.tts_model.t3.tfmr.file_bytes
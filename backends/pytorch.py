@@ -0,0 +1,157 @@
+# backends/pytorch.py
+# The Chatterbox models of the chatterbox package, run in PyTorch on
+# config.DEVICE. In bf16 and fp16, the weights of T3, the transformer that
+# generates the speech tokens and holds most of the weights, are cast to that
+# dtype, and so are the float tensors of its voice conditionals but for the
+# exaggeration, which the models compare with the requested one and replace
+# with an fp32 tensor when it differs, so it stays in fp32 and is cast by the
+# emotion layer. S3Gen, which decodes the tokens to a waveform, stays in fp32:
+# it only takes tokens and returns float32 audio. On CPU, the CPU fast path of
+# cpu.py is applied.
+
+import copy
+import importlib
+
+import config
+import cpu
+import streaming
+from backends.base import STREAM, Backend
+
+# Torch dtype of each precision
+DTYPES = {"fp32": "float32", "bf16": "bfloat16", "fp16": "float16"}
+
+
+def precision_dtype(precision: str):
+    import torch
+
+    return getattr(torch, DTYPES[precision])
+
+
+def model_class(model_name: str):
+    if model_name == "Chatterbox-Turbo":
+        from chatterbox.tts_turbo import ChatterboxTurboTTS as ChatterboxTTS
+    elif model_name == "Chatterbox":
+        from chatterbox.tts import ChatterboxTTS
+    elif model_name == "Chatterbox-Multilingual":
+        from chatterbox.mtl_tts import ChatterboxMultilingualTTS as ChatterboxTTS
+    else:
+        raise ValueError(f"Unknown model: {model_name}")
+    return ChatterboxTTS
+
+
+def cast_model(tts_model, model_name: str, precision: str) -> None:
+    import torch
+
+    t3 = getattr(tts_model, "t3", None)
+    if not isinstance(t3, torch.nn.Module):
+        print(f"{model_name} has no T3 to cast, it stays in fp32")
+        return
+    t3.to(dtype=precision_dtype(precision))
+    # The exaggeration of the voice conditionals is an fp32 tensor
+    emotion_adv_fc = getattr(getattr(t3, "cond_enc", None), "emotion_adv_fc", None)
+    if emotion_adv_fc is not None:
+        emotion_adv_fc.register_forward_pre_hook(_cast_inputs)
+    print(f"Cast {model_name} T3 to {precision}")
+
+
+def _cast_inputs(module, inputs):
+    return tuple(tensor.to(dtype=module.weight.dtype) for tensor in inputs)
+
+
+def model_size(tts_model) -> int:
+    """Size in bytes of the parameters and buffers of all the model's submodules."""
+    import torch
+
+    size = 0
+    for module in vars(tts_model).values():
+        if isinstance(module, torch.nn.Module):
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                size += tensor.numel() * tensor.element_size()
+            # The weights of quantized layers are packed outside of them
+            for layer in module.modules():
+                packed = getattr(layer, "_packed_params", None)
+                if isinstance(packed, torch.nn.Module):
+                    for tensor in packed._weight_bias():
+                        if tensor is not None:
+                            size += tensor.numel() * tensor.element_size()
+    return size
+
+
+class ChatterboxBackend(Backend):
+    engine = "pytorch"
+
+    def __init__(self, model_name: str, precision: str, tts_model):
+        super().__init__(model_name, precision)
+        self.tts_model = tts_model
+        # The token loops of the chatterbox models generate one text at a
+        # time, so chunks are not batched
+        capabilities = set()
+        if streaming.supports_streaming(tts_model, model_name):
+            capabilities.add(STREAM)
+        self.capabilities = frozenset(capabilities)
+
+    @classmethod
+    def load(cls, model_name: str, precision: str = "fp32", device: str = None):
+        ChatterboxTTS = model_class(model_name)
+        device = device or config.DEVICE
+        if device == "cpu":
+            cpu.configure_threads()
+        tts_model = ChatterboxTTS.from_pretrained(device)
+        if precision != "fp32":
+            cast_model(tts_model, model_name, precision)
+        if device == "cpu":
+            cpu.optimize(tts_model, model_name, precision)
+        return cls(model_name, precision, tts_model)
+
+    @property
+    def sample_rate(self) -> int:
+        return self.tts_model.sr
+
+    def _cast_voice(self, conds):
+        if self.precision != "fp32" and hasattr(conds, "t3"):
+            emotion_adv = getattr(conds.t3, "emotion_adv", None)
+            # Integer tensors, like the prompt speech tokens, keep their dtype
+            conds.t3 = conds.t3.to(dtype=precision_dtype(self.precision))
+            if emotion_adv is not None:
+                conds.t3.emotion_adv = emotion_adv
+        return conds
+
+    def _use_voice(self, voice) -> None:
+        # The models replace the T3 conditionals of `conds` when the
+        # exaggeration changes, which must not reach the cached voice
+        self.tts_model.conds = copy.copy(voice)
+
+    def prepare_voice(self, wav_path: str, exaggeration: float):
+        self.tts_model.prepare_conditionals(wav_path, exaggeration=exaggeration)
+        return self._cast_voice(self.tts_model.conds)
+
+    def load_voice(self, path: str):
+        # Each Chatterbox model module defines its own Conditionals class
+        module = importlib.import_module(type(self.tts_model).__module__)
+        device = self.tts_model.device
+        conds = module.Conditionals.load(path, map_location=device).to(device)
+        return self._cast_voice(conds)
+
+    def save_voice(self, voice, path: str) -> None:
+        voice.save(path)
+
+    # The seed is applied to the global generators by the inference worker
+    def generate(self, text: str, voice, seed: int = 0, **params):
+        self._use_voice(voice)
+        return _numpy(self.tts_model.generate(text, **params))
+
+    def stream(self, text: str, voice, stream_tokens: int, emit, seed=0, **params):
+        self._use_voice(voice)
+        return _numpy(
+            streaming.generate_stream(
+                self.tts_model, text, stream_tokens, emit, **params
+            )
+        )
+
+    def memory_bytes(self) -> int:
+        return model_size(self.tts_model)
+
+
+def _numpy(wav):
+    """The (1, samples) waveform tensor of the models as a 1-D numpy array."""
+    return wav.squeeze(0).numpy()
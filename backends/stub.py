@@ -0,0 +1,98 @@
+# backends/stub.py
+# Stand-in model for load testing and CI, served as the "Stub" model when
+# STUB_MODEL is set. It needs no weights and barely any compute: the audio of
+# a chunk is a tone whose pitch is derived from the text and the voice, as
+# long as the text would take to speak, with a little noise scaled by the
+# temperature. The noise is drawn from a generator of its own, seeded from
+# the text, the voice and the request seed, so the same request always gives
+# the same audio, seeded or not, and a different seed gives other noise.
+# STUB_CHAR_LATENCY simulates the synthesis time per character, so that the
+# HTTP, queue, chunking and encoding paths can be measured under load. A batch
+# of chunks takes the time of its longest chunk, like one batched model pass.
+
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+import config
+import streaming
+from backends.base import BATCH, STREAM, Backend
+
+MODEL = "Stub"
+SAMPLE_RATE = 24000
+# Seconds of audio per character, about the pace of normal speech
+AUDIO_SECONDS_PER_CHAR = 0.06
+NOISE_LEVEL = 0.05
+
+
+def _digest(text: str, size: int = 2) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:size], "little")
+
+
+class StubBackend(Backend):
+    engine = "stub"
+
+    def __init__(self, model_name: str = MODEL, precision: str = "fp32"):
+        super().__init__(model_name, precision)
+        self.char_latency = config.STUB_CHAR_LATENCY
+        self.capabilities = frozenset([BATCH, STREAM])
+
+    @classmethod
+    def load(cls, model_name: str = MODEL, precision: str = "fp32"):
+        return cls(model_name, precision)
+
+    @property
+    def sample_rate(self) -> int:
+        return SAMPLE_RATE
+
+    def prepare_voice(self, wav_path: str, exaggeration: float):
+        # The reference audio is not read, only its name picks the pitch
+        voice = os.path.splitext(os.path.basename(wav_path))[0]
+        return {"voice": voice, "exaggeration": float(exaggeration)}
+
+    def load_voice(self, path: str):
+        with open(path) as f:
+            return json.load(f)
+
+    def save_voice(self, voice, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(voice, f)
+
+    def _synthesize(
+        self, text: str, voice, exaggeration=0.5, temperature=0.8, seed=0, **params
+    ):
+        frequency = 110 + (_digest(text) + _digest(voice["voice"])) % 330
+        num_samples = max(1, int(SAMPLE_RATE * AUDIO_SECONDS_PER_CHAR * len(text)))
+        t = np.arange(num_samples, dtype=np.float32) / SAMPLE_RATE
+        wav = np.sin(2 * math.pi * frequency * t, dtype=np.float32)
+        wav *= 0.3 + 0.4 * min(1.0, exaggeration)
+        if temperature > 0:
+            rng = np.random.default_rng(
+                _digest(f"{voice['voice']}\0{seed}\0{text}", size=8)
+            )
+            noise = rng.standard_normal(num_samples, dtype=np.float32)
+            wav += NOISE_LEVEL * temperature * noise
+        return wav
+
+    def generate(self, text: str, voice, **params):
+        time.sleep(self.char_latency * len(text))
+        return self._synthesize(text, voice, **params)
+
+    def generate_batch(self, texts: list, voice, **params) -> list:
+        time.sleep(self.char_latency * max(len(text) for text in texts))
+        return [self._synthesize(text, voice, **params) for text in texts]
+
+    def stream(self, text: str, voice, stream_tokens: int, emit, **params):
+        wav = self._synthesize(text, voice, **params)
+        # The synthesis time is spread over the pieces, like a token loop
+        piece = max(1, stream_tokens * SAMPLE_RATE // streaming.TOKENS_PER_SECOND)
+        seconds = self.char_latency * len(text)
+        for start in range(0, len(wav), piece):
+            time.sleep(seconds * min(piece, len(wav) - start) / len(wav))
+            if start + piece >= len(wav):
+                return wav[start:]
+            emit(wav[start : start + piece])
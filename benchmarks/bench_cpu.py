@@ -0,0 +1,223 @@
+# benchmarks/bench_cpu.py
+# CPU fast path with the real model: generates the same seeded texts on the
+# CPU with each mode (fp32, int8 quantization, torch.compile, bf16 and fp16
+# precision, the ONNX Runtime backend) and thread count in a fresh process,
+# and reports the real-time factor, the load time and the model size as JSON.
+# The audio of each mode is compared with the fp32 audio of the same thread
+# count by the correlation of their long-term log spectra (1 is the same
+# spectrum) and their duration ratio, as sampling diverges once the weights
+# differ. Needs the model weights and a voice in VOICES_DIR, and the graphs of
+# export_onnx.py for the onnx mode.
+#
+#     python benchmarks/bench_cpu.py --modes fp32,int8,bf16 --threads 4,8
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import common  # noqa: E402
+from benchmarks.bench_server import make_text  # noqa: E402
+
+# Modes: their precision, whether they quantize and compile, and their backend
+MODES = {
+    "fp32": ("fp32", False, False, "pytorch"),
+    "int8": ("fp32", True, False, "pytorch"),
+    "compile": ("fp32", False, True, "pytorch"),
+    "int8+compile": ("fp32", True, True, "pytorch"),
+    "bf16": ("bf16", False, False, "pytorch"),
+    "bf16+compile": ("bf16", False, True, "pytorch"),
+    "fp16": ("fp16", False, False, "pytorch"),
+    "onnx": ("fp32", False, False, "onnx"),
+}
+FFT_SIZE = 1024
+HOP_SIZE = 256
+
+
+def run_case(args, mode: str, threads: int, audio_path: str) -> dict:
+    """Runs in the child process, returns the measurements."""
+    import numpy as np
+
+    server_log = sys.stderr if args.verbose else open(os.devnull, "w")
+    with contextlib.redirect_stdout(server_log):
+        import config
+        import tts
+        from models import model_registry
+
+        voice = args.voice or config.SUPPORTED_VOICES[0]
+        texts = [make_text(args.text_length, seed=i) for i in range(args.requests)]
+
+        def generate(text):
+            return tts.generate_audio(
+                text,
+                voice,
+                model_name=args.model,
+                seed=args.seed,
+                response_format="pcm",
+            )
+
+        # Loads the model, and compiles it in the compile modes
+        warmup_start = time.perf_counter()
+        generate(texts[0])
+        warmup_seconds = time.perf_counter() - warmup_start
+
+        audio = []
+        start = time.perf_counter()
+        for text in texts:
+            audio.append(np.frombuffer(generate(text), dtype=np.int16))
+        seconds = time.perf_counter() - start
+        backend = model_registry.get(args.model)
+        sample_rate = backend.sample_rate
+        model_bytes = backend.memory_bytes()
+
+    np.savez(audio_path, *audio)
+    audio_seconds = sum(len(pcm) for pcm in audio) / sample_rate
+    return {
+        "model": args.model,
+        "mode": mode,
+        "precision": config.PRECISION,
+        "backend": backend.engine,
+        "threads": threads,
+        "text_length": args.text_length,
+        "load_seconds": round(model_registry.load_seconds, 3),
+        "warmup_seconds": round(warmup_seconds, 3),
+        "model_bytes": model_bytes,
+        "rtf": round(seconds / audio_seconds, 4),
+    }
+
+
+def log_spectrum(pcm):
+    """Mean log power spectrum of int16 PCM."""
+    import numpy as np
+
+    samples = pcm.astype(np.float32) / 32768
+    if len(samples) < FFT_SIZE:
+        samples = np.pad(samples, (0, FFT_SIZE - len(samples)))
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    power = np.abs(np.fft.rfft(frames * np.hanning(FFT_SIZE), axis=1)) ** 2
+    return np.log10(power.mean(axis=0) + 1e-10)
+
+
+def similarity(audio_path: str, baseline_path: str) -> tuple:
+    """Mean spectral correlation and duration ratio against the baseline."""
+    import numpy as np
+
+    with np.load(audio_path) as audio, np.load(baseline_path) as baseline:
+        pairs = [(audio[name], baseline[name]) for name in baseline.files]
+    correlations = [
+        float(np.corrcoef(log_spectrum(pcm), log_spectrum(reference))[0, 1])
+        for pcm, reference in pairs
+    ]
+    ratios = [len(pcm) / max(1, len(reference)) for pcm, reference in pairs]
+    return sum(correlations) / len(pairs), sum(ratios) / len(pairs)
+
+
+def _list(value):
+    return value.split(",")
+
+
+def _ints(value):
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CPU fast path.")
+    parser.add_argument("--model", default="Chatterbox-Turbo")
+    parser.add_argument("--voice", default=None, help="Default: the first voice")
+    parser.add_argument("--modes", type=_list, default=list(MODES))
+    parser.add_argument(
+        "--threads", type=_ints, default=[0], help="CPU_THREADS values, 0: default"
+    )
+    parser.add_argument(
+        "--quantize", default="t3,s3gen.flow", help="CPU_QUANTIZE of the int8 modes"
+    )
+    parser.add_argument(
+        "--compile", default="t3.tfmr", help="CPU_COMPILE of the compile modes"
+    )
+    parser.add_argument("--text-length", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Show the server logs")
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--audio", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        mode, threads = args.case.split(":")
+        print(json.dumps(run_case(args, mode, int(threads), args.audio)))
+        return
+
+    unknown = [mode for mode in args.modes if mode not in MODES]
+    if unknown:
+        parser.error(f"Unknown modes: {', '.join(unknown)}")
+    # fp32 first, it is the reference of the other modes
+    modes = ["fp32"] + [mode for mode in args.modes if mode != "fp32"]
+    audio_dir = tempfile.mkdtemp(prefix="tts-bench-cpu-")
+    results = []
+    for threads in args.threads:
+        for mode in modes:
+            precision, quantize, compile_, backend = MODES[mode]
+            env = dict(os.environ)
+            env.update(
+                {
+                    # The CPU fast path only applies without CUDA
+                    "CUDA_VISIBLE_DEVICES": "",
+                    "CPU_THREADS": str(threads),
+                    "PRECISION": precision,
+                    "PRECISIONS": precision,
+                    "BACKEND": backend,
+                    "CPU_QUANTIZE": args.quantize if quantize else "",
+                    "CPU_COMPILE": args.compile if compile_ else "",
+                    "RESPONSE_CACHE_MB": "0",
+                    "CHUNK_CACHE_MB": "0",
+                    "WARMUP": "false",
+                }
+            )
+            audio_path = os.path.join(audio_dir, f"{mode}-{threads}.npz")
+            # A fresh process per case, as the settings apply at model load
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__)]
+                + sys.argv[1:]
+                + ["--case", f"{mode}:{threads}", "--audio", audio_path],
+                env=env,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            if child.returncode != 0:
+                print(f"mode={mode} threads={threads}: failed", file=sys.stderr)
+                continue
+            case = json.loads(child.stdout.strip().splitlines()[-1])
+            baseline_path = os.path.join(audio_dir, f"fp32-{threads}.npz")
+            if os.path.exists(baseline_path):
+                correlation, ratio = similarity(audio_path, baseline_path)
+                case["spectral_similarity"] = round(correlation, 4)
+                case["duration_ratio"] = round(ratio, 4)
+            print(
+                f"mode={mode} threads={threads}: rtf {case['rtf']}, "
+                f"similarity {case.get('spectral_similarity')}",
+                file=sys.stderr,
+            )
+            if mode in args.modes:
+                results.append(case)
+
+    del args.case, args.audio
+    common.write_json(
+        {
+            "benchmark": "cpu",
+            "meta": common.metadata(),
+            "args": vars(args),
+            "results": results,
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
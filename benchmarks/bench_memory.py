@@ -0,0 +1,158 @@
+# benchmarks/bench_memory.py
+# Peak memory of long outputs with the stub engine: each case generates
+# `--minutes` of audio in a fresh process, either through tts.generate_audio
+# or through a whole /tts response of the Flask app, and reports the peak RSS
+# increase against the size of the output as JSON.
+#
+#     python benchmarks/bench_memory.py --minutes 30 --output before.json
+#     python benchmarks/compare.py before.json after.json
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import common  # noqa: E402
+from benchmarks.bench_server import make_text  # noqa: E402
+
+
+def _server_response(text, voice, chunk_size, response_format) -> int:
+    """Sends the response of /tts nowhere, returns its size."""
+    from server import app
+
+    response = app.test_client().post(
+        "/tts",
+        json={
+            "text": text,
+            "predefined_voice_id": voice,
+            "output_format": response_format,
+            "chunk_size": chunk_size,
+        },
+        buffered=False,
+    )
+    size = sum(len(data) for data in response.response)
+    response.close()
+    return size
+
+
+def run_case(
+    response_format: str,
+    via: str,
+    minutes: float,
+    chunk_size: int,
+    char_latency: float,
+) -> dict:
+    """Runs in the child process, returns the measurements."""
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        common.setup(char_latency)
+        import config
+        import tts
+        from backends.stub import AUDIO_SECONDS_PER_CHAR
+
+        voice = config.SUPPORTED_VOICES[0]
+        tts.generate_audio("Loads the stub model.", voice)
+        text = make_text(int(minutes * 60 / AUDIO_SECONDS_PER_CHAR))
+        rss_before = common.rss_bytes()
+        if via == "server":
+            size = _server_response(text, voice, chunk_size, response_format)
+        else:
+            size = len(
+                tts.generate_audio(
+                    text, voice, chunk_size=chunk_size, response_format=response_format
+                )
+            )
+        peak = common.peak_rss_bytes()
+    return {
+        "format": response_format,
+        "via": via,
+        "minutes": minutes,
+        "chunk_size": chunk_size,
+        "output_bytes": size,
+        "peak_rss_delta_bytes": max(0, peak - rss_before),
+        "peak_to_output": round(max(0, peak - rss_before) / size, 3),
+    }
+
+
+def _list(value):
+    return value.split(",")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of long outputs.")
+    parser.add_argument("--formats", type=_list, default=["wav", "pcm"])
+    parser.add_argument(
+        "--via",
+        type=_list,
+        default=["generate", "server"],
+        help="generate: tts.generate_audio, server: a /tts response",
+    )
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--chunk-size", type=int, default=250)
+    parser.add_argument(
+        "--char-latency",
+        type=float,
+        default=0.0002,
+        help="Simulated synthesis seconds per character. Without it the stub "
+        "outpaces the encoders and the queued chunks dominate the memory.",
+    )
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        response_format, via = args.case.split(":")
+        case = run_case(
+            response_format, via, args.minutes, args.chunk_size, args.char_latency
+        )
+        print(json.dumps(case))
+        return
+
+    results = []
+    for response_format, via in itertools.product(args.formats, args.via):
+        # A fresh process per case, so that the peak RSS is its own
+        child = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--case",
+                f"{response_format}:{via}",
+                "--minutes",
+                str(args.minutes),
+                "--chunk-size",
+                str(args.chunk_size),
+                "--char-latency",
+                str(args.char_latency),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        case = json.loads(child.stdout.strip().splitlines()[-1])
+        print(
+            f"format={response_format} via={via}: "
+            f"{case['output_bytes'] / 2**20:.1f} MB output, "
+            f"peak RSS +{case['peak_rss_delta_bytes'] / 2**20:.1f} MB "
+            f"({case['peak_to_output']}x)",
+            file=sys.stderr,
+        )
+        results.append(case)
+
+    del args.case
+    common.write_json(
+        {
+            "benchmark": "memory",
+            "meta": common.metadata(),
+            "args": vars(args),
+            "results": results,
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/bench_segmenter.py
+# Times `utils.chunk_text_by_sentences` against the previous segmenter, kept
+# in tests/legacy_segmenter.py, on MB-sized texts. tests/test_segmenter.py
+# checks that they produce the same chunks.
+#
+#     python benchmarks/bench_segmenter.py --sizes 1,4 --output segmenter.json
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import common  # noqa: E402
+from benchmarks.bench_server import make_text  # noqa: E402
+from tests.legacy_segmenter import legacy_chunk_text_by_sentences  # noqa: E402
+from utils import chunk_text_by_sentences  # noqa: E402
+
+
+def mixed_text(size: int) -> str:
+    """Prose with abbreviations, numbers, quotes, cues and bullet lists."""
+    rng = random.Random(1)
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraph = make_text(rng.randint(200, 1200), seed=rng.randint(0, 10**6))
+        paragraph = paragraph.replace(" the ", " Mr. Smith and the ", 2)
+        paragraph = paragraph.replace(" a ", " approx. 3.5 of a ", 1)
+        if rng.random() < 0.3:
+            paragraph = f'"{paragraph}" (laughs)'
+        if rng.random() < 0.2:
+            paragraph += "\n- first point\n- second point. With detail."
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def best_time(func, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _list(cast):
+    return lambda value: [cast(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the sentence segmenter against the previous one."
+    )
+    parser.add_argument("--sizes", type=_list(float), default=[1, 4], help="MB")
+    parser.add_argument("--chunk-size", type=int, default=250)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    args = parser.parse_args()
+
+    # utils logs a line per chunked text
+    import logging
+
+    logging.disable(logging.INFO)
+
+    results = []
+    for size_mb in args.sizes:
+        for kind, make in (("prose", make_text), ("mixed", mixed_text)):
+            text = make(int(size_mb * 1024 * 1024))
+            legacy = best_time(
+                legacy_chunk_text_by_sentences,
+                text,
+                args.chunk_size,
+                repeat=args.repeat,
+            )
+            current = best_time(
+                chunk_text_by_sentences, text, args.chunk_size, repeat=args.repeat
+            )
+            result = {
+                "text": kind,
+                "size_mb": size_mb,
+                "chunk_size": args.chunk_size,
+                "legacy_seconds": round(legacy, 4),
+                "seconds": round(current, 4),
+                "mb_per_second": round(size_mb / current, 2),
+                "speedup": round(legacy / current, 2),
+            }
+            print(
+                f"{size_mb} MB {kind}: {legacy:.3f}s -> {current:.3f}s "
+                f"({result['speedup']}x)",
+                file=sys.stderr,
+            )
+            results.append(result)
+
+    common.write_json(
+        {
+            "benchmark": "segmenter",
+            "meta": common.metadata(),
+            "args": vars(args),
+            "results": results,
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# benchmarks/bench_server.py
+# End-to-end benchmark of the server with the stub engine: drives /tts
+# through the Flask test client over a matrix of text lengths, chunk sizes,
+# first chunk sizes of streamed requests, response formats, streaming and
+# concurrency levels, and reports throughput, latency percentiles, time to
+# first byte and memory as JSON.
+#
+#     python benchmarks/bench_server.py --output before.json
+#     python benchmarks/compare.py before.json after.json
+
+import argparse
+import contextlib
+import itertools
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import common  # noqa: E402
+
+WORDS = (
+    "the quick brown fox jumps over a lazy dog while seven wizards quietly "
+    "hum old songs about distant mountains rivers and forgotten cities"
+).split()
+
+
+def make_text(length: int, seed: int = 0) -> str:
+    """Deterministic text of about `length` characters made of sentences."""
+    rng = random.Random(seed)
+    sentences = []
+    size = 0
+    while size < length:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 14))]
+        sentence = " ".join(words).capitalize() + rng.choice([".", ".", "!", "?"])
+        sentences.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def _request(client, text, chunk_size, first_chunk_size, response_format, stream):
+    payload = {
+        "text": text,
+        "predefined_voice_id": common.VOICE,
+        "output_format": response_format,
+        "chunk_size": chunk_size,
+        "first_chunk_size": first_chunk_size,
+        "stream": stream,
+    }
+    start = time.perf_counter()
+    response = client.post("/tts", json=payload, buffered=False)
+    ttfb = None
+    size = 0
+    for data in response.response:
+        if ttfb is None and data:
+            ttfb = time.perf_counter() - start
+        size += len(data)
+    latency = time.perf_counter() - start
+    response.close()
+    if response.status_code != 200:
+        raise RuntimeError(f"Request failed with status {response.status_code}")
+    return latency, ttfb if ttfb is not None else latency, size
+
+
+def run_case(
+    client,
+    text_length,
+    chunk_size,
+    first_chunk_size,
+    response_format,
+    stream,
+    concurrency,
+    requests,
+):
+    texts = [make_text(text_length, seed=i) for i in range(requests)]
+    rss_before = common.rss_bytes()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(
+            pool.map(
+                lambda text: _request(
+                    client, text, chunk_size, first_chunk_size, response_format, stream
+                ),
+                texts,
+            )
+        )
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _, _ in results]
+    ttfbs = [ttfb for _, ttfb, _ in results]
+    chars = sum(len(text) for text in texts)
+    return {
+        "text_length": text_length,
+        "chunk_size": chunk_size,
+        "first_chunk_size": first_chunk_size,
+        "format": response_format,
+        "stream": stream,
+        "concurrency": concurrency,
+        "requests": requests,
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(requests / elapsed, 3),
+        "chars_per_second": round(chars / elapsed, 1),
+        "output_bytes": sum(size for _, _, size in results),
+        "latency_p50": round(common.percentile(latencies, 50), 4),
+        "latency_p95": round(common.percentile(latencies, 95), 4),
+        "latency_p99": round(common.percentile(latencies, 99), 4),
+        "ttfb_p50": round(common.percentile(ttfbs, 50), 4),
+        "ttfb_p95": round(common.percentile(ttfbs, 95), 4),
+        "ttfb_p99": round(common.percentile(ttfbs, 99), 4),
+        "rss_delta_bytes": common.rss_bytes() - rss_before,
+        "peak_rss_bytes": common.peak_rss_bytes(),
+    }
+
+
+def _list(cast):
+    return lambda value: [cast(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the server with the stub engine."
+    )
+    parser.add_argument("--text-lengths", type=_list(int), default=[100, 1000, 5000])
+    parser.add_argument("--chunk-sizes", type=_list(int), default=[100, 250])
+    parser.add_argument(
+        "--first-chunk-sizes",
+        type=_list(int),
+        default=[0, 80],
+        help="First chunk sizes of streamed requests, 0 for chunks of the same size",
+    )
+    parser.add_argument("--formats", type=_list(str), default=["wav", "mp3"])
+    parser.add_argument("--stream", type=_list(int), default=[0, 1])
+    parser.add_argument("--concurrency", type=_list(int), default=[1, 4])
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument(
+        "--char-latency",
+        type=float,
+        default=0.0005,
+        help="Simulated synthesis seconds per character",
+    )
+    parser.add_argument("--caches", action="store_true", help="Keep the caches on")
+    parser.add_argument("--verbose", action="store_true", help="Show the server logs")
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    args = parser.parse_args()
+
+    # Concurrent requests must fit in the queue
+    os.environ["QUEUE_MAX_SIZE"] = str(max(16, max(args.concurrency)))
+    server_log = sys.stderr if args.verbose else open(os.devnull, "w")
+    with contextlib.redirect_stdout(server_log):
+        common.setup(args.char_latency, caches=args.caches)
+        cases = run_matrix(args)
+
+    common.write_json(
+        {
+            "benchmark": "server",
+            "meta": common.metadata(),
+            "args": vars(args),
+            "results": cases,
+        },
+        args.output,
+    )
+
+
+def _matrix(args):
+    for (
+        text_length,
+        chunk_size,
+        response_format,
+        stream,
+        concurrency,
+    ) in itertools.product(
+        args.text_lengths,
+        args.chunk_sizes,
+        args.formats,
+        args.stream,
+        args.concurrency,
+    ):
+        # The first chunk is only shortened when streaming, the other
+        # requests are chunked the same way whatever its size
+        for first_chunk_size in args.first_chunk_sizes if stream else [0]:
+            yield (
+                text_length,
+                chunk_size,
+                first_chunk_size,
+                response_format,
+                stream,
+                concurrency,
+            )
+
+
+def run_matrix(args) -> list:
+    from server import app
+
+    client = app.test_client()
+    _request(client, make_text(50), 250, 0, "wav", False)  # Load the stub model
+
+    cases = []
+    for (
+        text_length,
+        chunk_size,
+        first_chunk_size,
+        response_format,
+        stream,
+        concurrency,
+    ) in _matrix(args):
+        case = run_case(
+            client,
+            text_length,
+            chunk_size,
+            first_chunk_size,
+            response_format,
+            bool(stream),
+            concurrency,
+            args.requests,
+        )
+        print(
+            f"len={text_length} chunk={chunk_size} first={first_chunk_size} "
+            f"format={response_format} "
+            f"stream={bool(stream)} concurrency={concurrency}: "
+            f"{case['requests_per_second']} req/s, p50 {case['latency_p50']}s, "
+            f"ttfb p50 {case['ttfb_p50']}s",
+            file=sys.stderr,
+        )
+        cases.append(case)
+    return cases
+
+
+if __name__ == "__main__":
+    main()
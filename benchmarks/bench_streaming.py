@@ -0,0 +1,108 @@
+# benchmarks/bench_streaming.py
+# Time to first audio of sub-sentence streaming with the real model: streams
+# the same texts with each `stream_tokens` setting (0 streams whole chunks)
+# and reports the time to the first audio, the real-time factor and the
+# number of pieces as JSON. Needs the model weights and a voice in VOICES_DIR.
+#
+#     python benchmarks/bench_streaming.py --stream-tokens 0,10,25,50
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import common  # noqa: E402
+from benchmarks.bench_server import make_text  # noqa: E402
+
+
+def run_case(tts, model_name, voice, text, stream_tokens, seed):
+    audio_stream = tts.generate_audio_stream(
+        text,
+        voice,
+        model_name=model_name,
+        seed=seed,
+        stream_tokens=stream_tokens,
+    )
+    start = time.perf_counter()
+    ttfa = None
+    pieces = 0
+    samples = 0
+    for wav in audio_stream:
+        if ttfa is None:
+            ttfa = time.perf_counter() - start
+        pieces += 1
+        samples += len(wav)
+    elapsed = time.perf_counter() - start
+    audio_seconds = samples / audio_stream.sample_rate
+    return ttfa, elapsed, pieces, audio_seconds
+
+
+def _list(value):
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sub-sentence streaming.")
+    parser.add_argument("--model", default="Chatterbox-Turbo")
+    parser.add_argument("--voice", default=None, help="Default: the first voice")
+    parser.add_argument("--stream-tokens", type=_list, default=[0, 10, 25, 50])
+    parser.add_argument("--text-length", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=250)
+    parser.add_argument("--requests", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Show the server logs")
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    args = parser.parse_args()
+
+    os.environ.setdefault("CHUNK_CACHE_MB", "0")
+    server_log = sys.stderr if args.verbose else open(os.devnull, "w")
+    results = []
+    with contextlib.redirect_stdout(server_log):
+        import config
+        import tts
+
+        voice = args.voice or config.SUPPORTED_VOICES[0]
+        texts = [make_text(args.text_length, seed=i) for i in range(args.requests)]
+        # Loads the model and warms up the kernels of both paths
+        run_case(tts, args.model, voice, texts[0], 0, args.seed)
+        run_case(tts, args.model, voice, texts[0], max(args.stream_tokens), args.seed)
+        for stream_tokens in args.stream_tokens:
+            runs = [
+                run_case(tts, args.model, voice, text, stream_tokens, args.seed)
+                for text in texts
+            ]
+            ttfas = [ttfa for ttfa, _, _, _ in runs]
+            seconds = sum(elapsed for _, elapsed, _, _ in runs)
+            audio_seconds = sum(audio for _, _, _, audio in runs)
+            case = {
+                "model": args.model,
+                "stream_tokens": stream_tokens,
+                "text_length": args.text_length,
+                "ttfa_p50": round(common.percentile(ttfas, 50), 4),
+                "ttfa_max": round(max(ttfas), 4),
+                "rtf": round(seconds / audio_seconds, 4),
+                "pieces": sum(pieces for _, _, pieces, _ in runs),
+            }
+            print(
+                f"stream_tokens={stream_tokens}: ttfa p50 {case['ttfa_p50']}s, "
+                f"rtf {case['rtf']}",
+                file=sys.stderr,
+            )
+            results.append(case)
+
+    common.write_json(
+        {
+            "benchmark": "streaming",
+            "meta": common.metadata(),
+            "args": vars(args),
+            "results": results,
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
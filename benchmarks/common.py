@@ -0,0 +1,116 @@
+# benchmarks/common.py
+# Shared setup of the benchmarks: makes the repository importable, points the
+# configuration at a temporary voices directory and serves the Stub model of
+# backends/stub.py. `setup()` must run before importing the server modules.
+
+import json
+import os
+import platform
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VOICE = "bench"
+
+
+def _write_voice(voices_dir: str) -> None:
+    # One second of silence, the Stub model never reads it
+    sample_rate = 24000
+    data = b"\0\0" * sample_rate
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + len(data),
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,
+        1,
+        sample_rate,
+        sample_rate * 2,
+        2,
+        16,
+        b"data",
+        len(data),
+    )
+    with open(os.path.join(voices_dir, f"{VOICE}.wav"), "wb") as f:
+        f.write(header + data)
+
+
+def voices_dir() -> str:
+    """Temporary voices directory holding the benchmark voice."""
+    path = tempfile.mkdtemp(prefix="tts-bench-voices-")
+    _write_voice(path)
+    return path
+
+
+def setup(char_latency: float = 0.0, caches: bool = False) -> None:
+    """
+    Configures the server for benchmarking. The response and chunk caches
+    are disabled unless `caches` is set, so that every request is synthesized.
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    os.environ["VOICES_DIR"] = voices_dir()
+    os.environ["SUPPORTED_VOICES"] = VOICE
+    if not caches:
+        os.environ["RESPONSE_CACHE_MB"] = "0"
+        os.environ["CHUNK_CACHE_MB"] = "0"
+
+    os.environ["STUB_MODEL"] = "true"
+    os.environ["MODEL"] = "Stub"
+    os.environ["STUB_CHAR_LATENCY"] = str(char_latency)
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: list, p: float) -> float:
+    """Percentile with linear interpolation, `p` in [0, 100]."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_json(results: dict, path: str) -> None:
+    text = json.dumps(results, indent=2)
+    if path == "-":
+        print(text)
+        return
+    with open(path, "w") as f:
+        f.write(text + "\n")
+    print(f"Results written to {path}")
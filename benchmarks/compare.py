@@ -0,0 +1,73 @@
+# benchmarks/compare.py
+# Compares two benchmark JSON files case by case, e.g. before and after a
+# change:
+#
+#     python benchmarks/compare.py before.json after.json
+
+import argparse
+import json
+
+# Metrics where lower is better, the others are better when higher
+LOWER_IS_BETTER = ("latency", "ttfb", "seconds", "bytes", "rss", "rtf", "time")
+
+
+def _case_key(case: dict) -> tuple:
+    """The parameters of a case: its non-numeric fields and integer settings."""
+    return tuple(
+        (name, value)
+        for name, value in sorted(case.items())
+        if not isinstance(value, float) and name not in _metric_names(case)
+    )
+
+
+def _metric_names(case: dict) -> set:
+    return {
+        name
+        for name, value in case.items()
+        if isinstance(value, float) or name.endswith("_bytes")
+    }
+
+
+def _change(name: str, before: float, after: float) -> str:
+    if not before:
+        return ""
+    change = (after - before) / before * 100
+    lower_is_better = any(part in name for part in LOWER_IS_BETTER)
+    better = change < 0 if lower_is_better else change > 0
+    mark = "" if abs(change) < 5 else (" (better)" if better else " (worse)")
+    return f"{change:+.1f}%{mark}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark results.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(
+        f"{before['meta'].get('commit', '?')} -> {after['meta'].get('commit', '?')}"
+    )
+    before_cases = {_case_key(case): case for case in before["results"]}
+    for case in after["results"]:
+        key = _case_key(case)
+        print(", ".join(f"{name}={value}" for name, value in key))
+        previous = before_cases.get(key)
+        if previous is None:
+            print("  not in the first file")
+            continue
+        for name in sorted(_metric_names(case)):
+            if name not in previous:
+                continue
+            print(
+                f"  {name:24} {previous[name]:>14} -> {case[name]:>14}  "
+                f"{_change(name, previous[name], case[name])}"
+            )
+
+
+if __name__ == "__main__":
+    main()
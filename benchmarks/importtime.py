@@ -0,0 +1,145 @@
+# benchmarks/importtime.py
+# Import time report: imports each server module in a fresh interpreter with
+# `python -X importtime`, and reports its cumulative import time, the startup
+# time of the interpreter and the slowest imports as JSON. Heavy dependencies
+# (torch, numpy, the model packages) are only imported by the inference path,
+# so the command exits with an error when one of them is imported by a module
+# or when an import takes longer than --max-seconds.
+#
+#     python benchmarks/importtime.py --output before.json
+#     python benchmarks/compare.py before.json after.json
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import common  # noqa: E402
+
+MODULES = ["config", "utils", "tts", "jobs", "warmup", "server", "asgi", "serve"]
+FORBIDDEN = ["torch", "numpy", "chatterbox", "torchaudio", "librosa", "pydub"]
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Cumulative import seconds by top-level and nested module name."""
+    imports = {}
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|", 2)
+        try:
+            seconds = int(cumulative) / 1e6
+        except ValueError:
+            continue  # The header line
+        imports[name.strip()] = seconds
+    return imports
+
+
+def measure(module: str, env: dict, repeat: int) -> tuple:
+    """Best import time and startup time of `module` over `repeat` runs."""
+    command = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    best_import = best_startup = None
+    imports = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            command, cwd=common.ROOT, env=env, capture_output=True, text=True
+        )
+        startup = time.perf_counter() - start
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+        run_imports = parse_importtime(result.stderr)
+        if best_import is None or run_imports[module] < best_import:
+            best_import = run_imports[module]
+            imports = run_imports
+        if best_startup is None or startup < best_startup:
+            best_startup = startup
+    return best_import, best_startup, imports
+
+
+def _list(value):
+    return [item for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the import time.")
+    parser.add_argument("--modules", type=_list, default=MODULES)
+    parser.add_argument(
+        "--forbid",
+        type=_list,
+        default=FORBIDDEN,
+        help="Modules that must not be imported, empty to allow all",
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=None,
+        help="Fail when a module takes longer to import",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["VOICES_DIR"] = common.voices_dir()
+    env["SUPPORTED_VOICES"] = common.VOICE
+    env["SEED"] = "0"
+
+    results = []
+    details = {}
+    failures = []
+    for module in args.modules:
+        import_seconds, startup_seconds, imports = measure(module, env, args.repeat)
+        forbidden = sorted(name for name in args.forbid if name in imports)
+        slowest = sorted(
+            (name for name in imports if name != module),
+            key=imports.get,
+            reverse=True,
+        )[: args.top]
+        results.append(
+            {
+                "module": module,
+                "import_seconds": round(import_seconds, 4),
+                "startup_seconds": round(startup_seconds, 4),
+            }
+        )
+        details[module] = {
+            "forbidden_imports": forbidden,
+            "slowest_imports": {name: round(imports[name], 4) for name in slowest},
+        }
+        print(
+            f"{module}: {import_seconds * 1000:.1f} ms import, "
+            f"{startup_seconds * 1000:.1f} ms startup",
+            file=sys.stderr,
+        )
+        if forbidden:
+            failures.append(f"{module} imports {', '.join(forbidden)}")
+        if args.max_seconds is not None and import_seconds > args.max_seconds:
+            failures.append(
+                f"{module} takes {import_seconds:.3f}s to import, "
+                f"more than {args.max_seconds}s"
+            )
+
+    common.write_json(
+        {
+            "benchmark": "importtime",
+            "meta": common.metadata(),
+            "args": vars(args),
+            "results": results,
+            "imports": details,
+        },
+        args.output,
+    )
+    for failure in failures:
+        print(f"Regression: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# cache.py
+# Small thread-safe LRU cache shared by the TTS pipeline (voice conditionals,
+# models, audio). Bounded by number of items and/or total size in bytes.
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Least-recently-used mapping bounded by `max_items` and/or `max_bytes`.
+    A bound of 0 means unbounded. `sizeof` returns the size of a value in bytes
+    and `on_evict` is called with (key, value) for every evicted entry.
+    """
+
+    def __init__(
+        self,
+        max_items: int = 0,
+        max_bytes: int = 0,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._on_evict = on_evict
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            size = self._sizeof(value)
+            if self.max_bytes and size > self.max_bytes:
+                # Would evict everything and still not fit, don't cache it.
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            self._shrink()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: Hashable) -> Any:
+        value = self._data.pop(key)
+        self._bytes -= self._sizes.pop(key)
+        return value
+
+    def _shrink(self) -> None:
+        while self._data and (
+            (self.max_items and len(self._data) > self.max_items)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._data))
+            value = self._remove(key)
+            self.evictions += 1
+            if self._on_evict:
+                self._on_evict(key, value)
@@ -0,0 +1,64 @@
+# chunk_cache.py
+# Cache of the int16 PCM of single text chunks, so that sentences repeated
+# across requests ("Sure!", "Hello there.") are synthesized once.
+#
+# A chunk generated without a seed only depends on its text, voice, model and
+# parameters. With a seed it also depends on the RNG state left by the chunks
+# before it, so seeded entries are keyed by the whole text up to the chunk and
+# keep the RNG state after it: later chunks resume exactly as if every chunk
+# had been generated.
+
+import hashlib
+
+import config
+from cache import LRUCache
+from conditionals import conditionals_cache
+
+
+class ChunkCache:
+    def __init__(self, max_bytes: int):
+        # Entries are (pcm, rng_state), the RNG state is small next to the audio
+        self.memory = LRUCache(
+            max_bytes=max_bytes, sizeof=lambda entry: entry[0].nbytes
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory.max_bytes > 0
+
+    def key(self, task, chunk: str, prefix: str = None):
+        """
+        `prefix` is the digest of the chunks before `chunk`, only used for
+        seeded tasks.
+        """
+        voice_key = conditionals_cache.key(
+            task.model_name, task.voice, task.exaggeration, task.precision
+        )
+        language_id = (
+            task.language_id if task.model_name == "Chatterbox-Multilingual" else None
+        )
+        params = (float(task.cfg_weight), float(task.temperature), language_id)
+        if task.seed == 0:
+            return voice_key + params + (chunk,)
+        return voice_key + params + (chunk, task.seed, prefix)
+
+    def get(self, key):
+        """Returns the (pcm, rng_state) of the chunk, or None."""
+        return self.memory.get(key)
+
+    def put(self, key, pcm, rng_state=None) -> None:
+        self.memory.put(key, (pcm, rng_state))
+
+    def clear(self) -> None:
+        self.memory.clear()
+
+    def stats(self) -> dict:
+        return self.memory.stats()
+
+
+def chain_digest(prefix: str, chunk: str) -> str:
+    """Digest of the chunks so far, given the digest of the previous ones."""
+    return hashlib.sha256(f"{prefix}\0{chunk}".encode()).hexdigest()
+
+
+chunk_cache = ChunkCache(config.CHUNK_CACHE_MB * 2**20)
@@ -0,0 +1,116 @@
+# conditionals.py
+# Cache for the voice conditionals (speaker embedding, prompt tokens, S3Gen
+# reference) that Chatterbox models compute from a reference wav.
+# Building them means reading, resampling and embedding the reference audio,
+# so they are computed once per (model, voice, exaggeration, file mtime) and
+# kept in an LRU memory tier with an optional on-disk tier. They are built,
+# saved and loaded by the backend of the model, in its precision.
+
+import os
+import threading
+
+import config
+from cache import LRUCache
+from models import variant_name
+
+
+def _voice_file(voice: str) -> str:
+    return config.AUDIO_PROMPT_PATH + f"{voice}.wav"
+
+
+class ConditionalsCache:
+    def __init__(self, max_items: int, disk_dir: str = ""):
+        self.memory = LRUCache(max_items=max_items)
+        self.disk_dir = disk_dir
+        self.disk_hits = 0
+        self.builds = 0
+        self._lock = threading.Lock()
+
+    def key(
+        self, model_name: str, voice: str, exaggeration: float, precision: str = "fp32"
+    ):
+        mtime = os.stat(_voice_file(voice)).st_mtime_ns
+        return (model_name, voice, float(exaggeration), mtime, precision)
+
+    def get(
+        self,
+        backend,
+        model_name: str,
+        voice: str,
+        exaggeration: float,
+        precision: str = "fp32",
+    ):
+        """
+        Returns the conditionals for `voice` on `backend`, building them with
+        `backend.prepare_voice` only when neither cache tier has them.
+        """
+        key = self.key(model_name, voice, exaggeration, precision)
+        conds = self.memory.get(key)
+        if conds is not None:
+            return conds
+
+        with self._lock:
+            # Another thread may have built them while we were waiting
+            if key in self.memory:
+                return self.memory.get(key)
+
+            conds = self._load_from_disk(backend, key)
+            if conds is None:
+                print(f"Building conditionals for voice: {voice} ({model_name})")
+                conds = backend.prepare_voice(_voice_file(voice), exaggeration)
+                self.builds += 1
+                self._save_to_disk(backend, conds, key)
+
+            self.memory.put(key, conds)
+            return conds
+
+    def invalidate(self, model_name: str = None) -> None:
+        """Drops in-memory conditionals, optionally only those of one model."""
+        for key in self.memory.keys():
+            if model_name is None or key[0] == model_name:
+                self.memory.pop(key)
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats.update({"disk_hits": self.disk_hits, "builds": self.builds})
+        return stats
+
+    def _disk_path(self, key) -> str:
+        model_name, voice, exaggeration, mtime, precision = key
+        return os.path.join(
+            self.disk_dir,
+            variant_name(model_name, precision),
+            f"{voice}-{exaggeration:g}-{mtime}.pt",
+        )
+
+    def _load_from_disk(self, backend, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            conds = backend.load_voice(path)
+        except Exception as e:
+            print(f"Could not load cached conditionals {path}: {e}")
+            return None
+        self.disk_hits += 1
+        return conds
+
+    def _save_to_disk(self, backend, conds, key) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            backend.save_voice(conds, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Could not save conditionals to {path}: {e}")
+
+
+conditionals_cache = ConditionalsCache(
+    config.CONDS_CACHE_SIZE,
+    config.CONDS_CACHE_DIR if config.CONDS_DISK_CACHE else "",
+)
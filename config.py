@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-import torch
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,15 +13,18 @@ if not os.path.exists(AUDIO_PROMPT_PATH):
 if AUDIO_PROMPT_PATH[-1] != "/":
     AUDIO_PROMPT_PATH += "/"
 
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 API_PORT = os.getenv("API_PORT", "5001")
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
+WORKERS = int(os.getenv("WORKERS", 1))
 AUDIO_EXAGGERATION = float(os.getenv("AUDIO_EXAGGERATION", 0.5))
 AUDIO_TEMPERATURE = float(os.getenv("AUDIO_TEMPERATURE", 0.8))
 AUDIO_CFG_WEIGHT = float(os.getenv("AUDIO_CFG_WEIGHT", 0.5))
 SUPPORTED_VOICES = os.getenv("SUPPORTED_VOICES", "").split(",")
 SUPPORTED_RESPONSE_FORMATS = ["mp3", "opus", "aac", "flac", "wav", "pcm"]
+SUPPORTED_STREAM_FORMATS = ["audio", "sse"]
 SUPPORTED_MODELS = ["Chatterbox", "Chatterbox-Turbo", "Chatterbox-Multilingual"]
+SUPPORTED_PRECISIONS = ["fp32", "bf16", "fp16"]
+SUPPORTED_BACKENDS = ["pytorch", "onnx"]
 SUPPORTED_LANGUAGE_IDS = [
     "ar",
     "da",
@@ -49,9 +51,44 @@ SUPPORTED_LANGUAGE_IDS = [
     "zh",
 ]
 MODEL = os.getenv("MODEL", "Chatterbox")
+BACKEND = os.getenv("BACKEND", "pytorch")
+ONNX_DIR = os.getenv("ONNX_DIR", AUDIO_PROMPT_PATH + ".onnx/")
+PRECISION = os.getenv("PRECISION", "fp32")
+PRECISIONS = [p for p in os.getenv("PRECISIONS", PRECISION).split(",") if p]
+MAX_LOADED_MODELS = int(os.getenv("MAX_LOADED_MODELS", 1))
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", 0))
+WARMUP = os.getenv("WARMUP", "true").lower() == "true"
+WARMUP_MODELS = [model for model in os.getenv("WARMUP_MODELS", "").split(",") if model]
 CORS_ALLOWED_ORIGIN = os.getenv("CORS_ALLOWED_ORIGIN", "*")
 SEED = int(os.getenv("SEED", 0))
 LANGUAGE_ID = os.getenv("LANGUAGE_ID", "en")
+QUEUE_MAX_SIZE = int(os.getenv("QUEUE_MAX_SIZE", 16))
+QUEUE_FULL_STATUS = int(os.getenv("QUEUE_FULL_STATUS", 429))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", 0))
+DEFAULT_PRIORITY = int(os.getenv("DEFAULT_PRIORITY", 0))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 1))
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", 0))
+CONDS_CACHE_SIZE = int(os.getenv("CONDS_CACHE_SIZE", 32))
+CONDS_DISK_CACHE = os.getenv("CONDS_DISK_CACHE", "false").lower() == "true"
+CONDS_CACHE_DIR = os.getenv("CONDS_CACHE_DIR", AUDIO_PROMPT_PATH + ".conds/")
+RESPONSE_CACHE_MB = int(os.getenv("RESPONSE_CACHE_MB", 64))
+RESPONSE_DISK_CACHE = os.getenv("RESPONSE_DISK_CACHE", "false").lower() == "true"
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", AUDIO_PROMPT_PATH + ".responses/")
+CHUNK_CACHE_MB = int(os.getenv("CHUNK_CACHE_MB", 128))
+FIRST_CHUNK_SIZE = int(os.getenv("FIRST_CHUNK_SIZE", 80))
+CHUNK_GROWTH = float(os.getenv("CHUNK_GROWTH", 2.0))
+TARGET_LATENCY = float(os.getenv("TARGET_LATENCY", 0))
+STREAM_TOKENS = int(os.getenv("STREAM_TOKENS", 0))
+CROSSFADE_MS = int(os.getenv("CROSSFADE_MS", 10))
+FFMPEG_SPARES = int(os.getenv("FFMPEG_SPARES", 4))
+CPU_THREADS = int(os.getenv("CPU_THREADS", 0))
+CPU_INTEROP_THREADS = int(os.getenv("CPU_INTEROP_THREADS", 0))
+CPU_QUANTIZE = [path for path in os.getenv("CPU_QUANTIZE", "").split(",") if path]
+CPU_COMPILE = [path for path in os.getenv("CPU_COMPILE", "").split(",") if path]
+JOBS_DIR = os.getenv("JOBS_DIR", AUDIO_PROMPT_PATH + ".jobs/")
+JOB_PRIORITY = int(os.getenv("JOB_PRIORITY", 10))
+STUB_MODEL = os.getenv("STUB_MODEL", "false").lower() == "true"
+STUB_CHAR_LATENCY = float(os.getenv("STUB_CHAR_LATENCY", 0))
 
 # if SUPPORTED_VOICES is empty, then we will use all voices in the AUDIO_PROMPT_PATH directory
 if SUPPORTED_VOICES == [""]:
@@ -63,9 +100,39 @@ if SUPPORTED_VOICES == [""]:
 
     print(f"Found {len(SUPPORTED_VOICES)} voices in the AUDIO_PROMPT_PATH directory")
 
-print(f"🚀 Running on device: {DEVICE}")
+# The synthetic model of backends/stub.py, for load testing without weights
+if STUB_MODEL:
+    SUPPORTED_MODELS.append("Stub")
+
+if BACKEND not in SUPPORTED_BACKENDS:
+    raise ValueError(f"Unsupported backend: {BACKEND}")
+_unsupported = sorted(set([PRECISION] + PRECISIONS) - set(SUPPORTED_PRECISIONS))
+if _unsupported:
+    raise ValueError(f"Unsupported precision: {', '.join(_unsupported)}")
+# The default precision can always be used
+if PRECISION not in PRECISIONS:
+    PRECISIONS.append(PRECISION)
+# Every precision variant stays loaded, as requests don't load them
+if len(PRECISIONS) > 1 and 0 < MAX_LOADED_MODELS < len(PRECISIONS):
+    raise ValueError(
+        f"MAX_LOADED_MODELS must be 0 or at least {len(PRECISIONS)} "
+        f"to keep the PRECISIONS loaded: {', '.join(PRECISIONS)}"
+    )
 
 if SEED != 0:
     import utils
 
     utils.set_seed(SEED)  # For reproducibility
+
+
+def __getattr__(name):
+    # Importing torch takes seconds, so DEVICE is only picked when the models
+    # need it rather than by every process importing the configuration
+    if name == "DEVICE":
+        global DEVICE
+        import torch
+
+        DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"🚀 Running on device: {DEVICE}")
+        return DEVICE
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
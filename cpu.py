@@ -0,0 +1,107 @@
+# cpu.py
+# CPU fast path, applied by backends/pytorch.ChatterboxBackend.load when the
+# model is loaded on the cpu. The thread pools of torch are sized before the
+# first model is loaded, then the linear layers of the CPU_QUANTIZE
+# submodules are quantized to int8 with dynamic activation scales, and the
+# CPU_COMPILE submodules are compiled with torch.compile. Submodules are
+# named by their attribute path from the model, e.g. "t3" or "s3gen.flow".
+# Generation itself runs under torch.inference_mode on every device, see
+# tts.generate_batch.
+
+import threading
+
+import config
+
+_threads_lock = threading.Lock()
+_threads_configured = False
+
+
+def configure_threads() -> None:
+    """Sizes the intra-op and inter-op thread pools, once per process."""
+    global _threads_configured
+    with _threads_lock:
+        if _threads_configured:
+            return
+        _threads_configured = True
+        import torch
+
+        if config.CPU_THREADS > 0:
+            torch.set_num_threads(config.CPU_THREADS)
+        if config.CPU_INTEROP_THREADS > 0:
+            try:
+                torch.set_num_interop_threads(config.CPU_INTEROP_THREADS)
+            except RuntimeError:
+                # Only possible before the first parallel work of the process
+                print("Inter-op threads already started, CPU_INTEROP_THREADS ignored")
+        print(
+            f"CPU threads: {torch.get_num_threads()} intra-op, "
+            f"{torch.get_num_interop_threads()} inter-op"
+        )
+
+
+def _submodule(tts_model, path: str):
+    import torch
+
+    module = tts_model
+    for name in path.split("."):
+        module = getattr(module, name, None)
+    return module if isinstance(module, torch.nn.Module) else None
+
+
+def _conv1d_to_linear(module) -> int:
+    """
+    Replaces the Conv1D layers of transformers (GPT-2, used by Chatterbox-Turbo)
+    with the equivalent nn.Linear, which can be quantized. Returns their count.
+    """
+    import torch
+
+    replaced = 0
+    for parent in list(module.modules()):
+        for name, child in list(parent.named_children()):
+            if type(child).__name__ != "Conv1D":
+                continue
+            # Conv1D weights are stored transposed, (in_features, out_features)
+            linear = torch.nn.Linear(child.nx, child.nf, device=child.weight.device)
+            with torch.no_grad():
+                linear.weight.copy_(child.weight.t())
+                linear.bias.copy_(child.bias)
+            setattr(parent, name, linear)
+            replaced += 1
+    return replaced
+
+
+def quantize(tts_model, model_name: str, paths: list) -> None:
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+
+    for path in paths:
+        module = _submodule(tts_model, path)
+        if module is None:
+            print(f"{model_name} has no submodule {path}, not quantized")
+            continue
+        _conv1d_to_linear(module)
+        layers = sum(isinstance(m, torch.nn.Linear) for m in module.modules())
+        quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        print(f"Quantized {layers} linear layers of {model_name} {path} to int8")
+
+
+def compile_modules(tts_model, model_name: str, paths: list) -> None:
+    for path in paths:
+        module = _submodule(tts_model, path)
+        if module is None:
+            print(f"{model_name} has no submodule {path}, not compiled")
+            continue
+        # Compiled on their first call, which the warmup takes care of. Text
+        # lengths vary, so the graphs are traced with dynamic shapes.
+        module.compile(dynamic=True)
+        print(f"Compiling {model_name} {path} with torch.compile")
+
+
+def optimize(tts_model, model_name: str, precision: str = "fp32") -> None:
+    """Applies the CPU_QUANTIZE and CPU_COMPILE settings to a loaded model."""
+    if precision == "fp32":
+        quantize(tts_model, model_name, config.CPU_QUANTIZE)
+    elif config.CPU_QUANTIZE:
+        # Dynamic quantization only takes fp32 weights
+        print(f"CPU_QUANTIZE ignored for {model_name} in {precision}")
+    compile_modules(tts_model, model_name, config.CPU_COMPILE)
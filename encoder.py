@@ -0,0 +1,310 @@
+# encoder.py
+# Incremental audio encoders fed with int16 PCM straight from the generation
+# loop. wav and pcm are written in-process; compressed formats are piped
+# through ffmpeg while the next chunks are still being generated. Complete
+# wav and pcm files are written in place into one growing buffer.
+
+import struct
+import subprocess
+import threading
+import config
+from cache import LRUCache
+
+# Bytes of ffmpeg error output kept for the error message
+FFMPEG_ERROR_BYTES = 4096
+
+# ffmpeg output options for each response format
+FFMPEG_FORMATS = {
+    "mp3": ["-f", "mp3", "-c:a", "libmp3lame"],
+    "opus": ["-f", "opus", "-c:a", "libopus", "-page_duration", "200000"],
+    "aac": ["-f", "adts", "-c:a", "aac"],
+    "flac": ["-f", "flac"],
+}
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def wav_header(sample_rate: int, num_samples: int = None) -> bytes:
+    """
+    Header of a mono 16-bit WAV file. When the length is unknown (streaming),
+    the sizes are set to their maximum so that players read until the end.
+    """
+    data_size = num_samples * 2 if num_samples is not None else 0xFFFFFFFF - 36
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,  # fmt chunk size
+        1,  # PCM
+        1,  # Mono
+        sample_rate,
+        sample_rate * 2,  # Byte rate
+        2,  # Block align
+        16,  # Bits per sample
+        b"data",
+        data_size,
+    )
+
+
+class PCMBuffer:
+    """
+    Growing buffer of int16 samples written in place, with `header_size` free
+    bytes in front of them for the header of the file, so that the file is
+    returned without copying the audio again.
+    """
+
+    def __init__(self, header_size: int = 0):
+        self.header_size = header_size
+        self.num_samples = 0
+        self._buffer = bytearray(header_size)
+
+    def reserve(self, num_samples: int) -> None:
+        """Grows the buffer to hold `num_samples` samples in total."""
+        size = self.header_size + 2 * num_samples
+        if size > len(self._buffer):
+            self._buffer.extend(bytes(size - len(self._buffer)))
+
+    def write(self, audio_data) -> None:
+        start = self.header_size + 2 * self.num_samples
+        end = start + 2 * len(audio_data)
+        if end > len(self._buffer):
+            # Grows by half at least, so that audio longer than reserved
+            # doesn't reallocate the buffer at each chunk
+            self.reserve(max(self.num_samples * 3 // 2, (end - self.header_size) // 2))
+        with memoryview(self._buffer) as view:
+            view[start:end] = memoryview(audio_data).cast("B")
+        self.num_samples += len(audio_data)
+
+    def getbuffer(self, header: bytes = b"") -> bytearray:
+        """Returns the file, `header` followed by the samples."""
+        buffer, self._buffer = self._buffer, bytearray(self.header_size)
+        del buffer[self.header_size + 2 * self.num_samples :]
+        buffer[: self.header_size] = header
+        return buffer
+
+
+class Encoder:
+    """
+    Encodes a stream of int16 PCM chunks. `write` returns the encoded bytes
+    available so far (possibly empty) and `close` returns the remaining ones.
+    """
+
+    def __init__(self, sample_rate: int, streaming: bool = True):
+        self.sample_rate = sample_rate
+        self.streaming = streaming
+
+    def reserve(self, num_samples: int) -> None:
+        """Hint of the expected length of the audio."""
+
+    def write(self, audio_data) -> bytes:
+        raise NotImplementedError
+
+    def close(self) -> bytes:
+        return b""
+
+    def abort(self) -> None:
+        pass
+
+
+class PCMEncoder(Encoder):
+    """Unless streaming, the audio is written into a buffer until `close`."""
+
+    header_size = 0
+
+    def __init__(self, sample_rate: int, streaming: bool = True):
+        super().__init__(sample_rate, streaming)
+        self._buffer = None if streaming else PCMBuffer(self.header_size)
+
+    def reserve(self, num_samples: int) -> None:
+        if self._buffer is not None:
+            self._buffer.reserve(num_samples)
+
+    def write(self, audio_data) -> bytes:
+        if self._buffer is not None:
+            self._buffer.write(audio_data)
+            return b""
+        return audio_data.tobytes()
+
+    def close(self) -> bytes:
+        return self._buffer.getbuffer() if self._buffer is not None else b""
+
+
+class WAVEncoder(PCMEncoder):
+    """
+    When streaming, the header is sent first with an unknown length.
+    Otherwise the audio is written into a buffer, after the room left for
+    the header, and `close` writes the header with the exact length.
+    """
+
+    header_size = len(wav_header(24000))
+
+    def __init__(self, sample_rate: int, streaming: bool = True):
+        super().__init__(sample_rate, streaming)
+        self._header_sent = False
+
+    def write(self, audio_data) -> bytes:
+        if self._buffer is not None:
+            self._buffer.write(audio_data)
+            return b""
+        if not self._header_sent:
+            self._header_sent = True
+            header = wav_header(self.sample_rate)
+            return b"".join((header, memoryview(audio_data).cast("B")))
+        return audio_data.tobytes()
+
+    def close(self) -> bytes:
+        if self._buffer is None:
+            return b"" if self._header_sent else wav_header(self.sample_rate)
+        header = wav_header(self.sample_rate, self._buffer.num_samples)
+        return self._buffer.getbuffer(header)
+
+
+class FFmpegEncoder(Encoder):
+    """
+    When streaming, `write` returns what ffmpeg has output so far. Otherwise
+    the output is read from the pipe into one buffer returned by `close`: a
+    whole response needs its length and goes to the response cache, so it
+    can't be sent from the pipe.
+    """
+
+    def __init__(self, response_format: str, sample_rate: int, streaming: bool = True):
+        super().__init__(sample_rate, streaming)
+        self.response_format = response_format
+        self._process = ffmpeg_pool.take(response_format, sample_rate)
+        self._output = []
+        self._file = bytearray()
+        self._errors = bytearray()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+        # stderr is drained too, ffmpeg blocks once its pipe is full
+        self._error_reader = threading.Thread(target=self._read_errors, daemon=True)
+        self._error_reader.start()
+
+    def write(self, audio_data) -> bytes:
+        # memoryview avoids copying the chunk into a bytes object
+        self._process.stdin.write(memoryview(audio_data))
+        self._process.stdin.flush()
+        return self._drain() if self.streaming else b""
+
+    def close(self) -> bytes:
+        self._process.stdin.close()
+        self._reader.join()
+        self._error_reader.join()
+        if self._process.wait() != 0:
+            raise RuntimeError(
+                f"ffmpeg failed to encode {self.response_format}: "
+                + self._errors.decode(errors="replace")
+            )
+        return self._drain()
+
+    def abort(self) -> None:
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+    def _read_output(self) -> None:
+        stdout = self._process.stdout
+        while data := stdout.read1(65536):
+            with self._lock:
+                if self.streaming:
+                    self._output.append(data)
+                else:
+                    self._file += data
+
+    def _read_errors(self) -> None:
+        stderr = self._process.stderr
+        while data := stderr.read1(65536):
+            self._errors += data
+            del self._errors[:-FFMPEG_ERROR_BYTES]
+
+    def _drain(self) -> bytes:
+        if not self.streaming:
+            data, self._file = self._file, bytearray()
+            return data
+        with self._lock:
+            data = b"".join(self._output)
+            self._output = []
+        return data
+
+
+class FFmpegPool:
+    """
+    Prespawns ffmpeg processes, so that a request does not wait for ffmpeg to
+    start. Each request still takes a process of its own, and a replacement
+    is spawned in its place. At most `max_spares` idle processes are kept, one
+    per (format, sample rate), the least recently used are stopped first.
+    """
+
+    def __init__(self, max_spares: int = 0):
+        self.max_spares = max_spares
+        self._spare = LRUCache(
+            max_items=max_spares, on_evict=lambda key, process: self._stop(process)
+        )
+        self._lock = threading.Lock()
+
+    def take(self, response_format: str, sample_rate: int) -> subprocess.Popen:
+        key = (response_format, sample_rate)
+        with self._lock:
+            process = self._spare.pop(key)
+            if process is None or process.poll() is not None:
+                process = self._spawn(*key)
+            if self.max_spares > 0:
+                self._spare.put(key, self._spawn(*key))
+        return process
+
+    @staticmethod
+    def _stop(process: subprocess.Popen) -> None:
+        process.kill()
+        process.wait()
+        for pipe in (process.stdin, process.stdout, process.stderr):
+            pipe.close()
+
+    @staticmethod
+    def _spawn(response_format: str, sample_rate: int) -> subprocess.Popen:
+        output_options = list(FFMPEG_FORMATS[response_format])
+        if response_format == "opus" and sample_rate not in OPUS_SAMPLE_RATES:
+            output_options += ["-ar", "48000"]
+        command = [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            # Start encoding right away instead of analyzing the first seconds
+            "-probesize",
+            "32",
+            "-analyzeduration",
+            "0",
+            "-f",
+            "s16le",
+            "-ar",
+            str(sample_rate),
+            "-ac",
+            "1",
+            "-i",
+            "pipe:0",
+            *output_options,
+            "-flush_packets",
+            "1",
+            "pipe:1",
+        ]
+        return subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+
+ffmpeg_pool = FFmpegPool(config.FFMPEG_SPARES)
+
+
+def open_encoder(response_format: str, sample_rate: int, streaming: bool = True):
+    if response_format == "wav":
+        return WAVEncoder(sample_rate, streaming)
+    if response_format == "pcm":
+        return PCMEncoder(sample_rate, streaming)
+    if response_format in FFMPEG_FORMATS:
+        return FFmpegEncoder(response_format, sample_rate, streaming)
+    raise ValueError(f"Unsupported response format: {response_format}")
@@ -0,0 +1,43 @@
+# export_onnx.py
+# Exports the speech token transformer of a model to ONNX for BACKEND=onnx,
+# in ONNX_DIR/<model>/, and checks the graph against PyTorch. The weights are
+# downloaded like the server does. Needs onnx, onnxscript and onnxruntime:
+#
+#     pip install onnx onnxscript onnxruntime
+#     python export_onnx.py --model Chatterbox-Turbo
+
+import argparse
+
+import config
+
+
+def main():
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime  # noqa: F401
+        import onnxscript  # noqa: F401
+    except ImportError as e:
+        raise SystemExit(
+            f"{e}, the export needs: pip install onnx onnxscript onnxruntime"
+        )
+
+    from backends import onnx_runtime
+    from backends.pytorch import model_class
+
+    parser = argparse.ArgumentParser(description="Export a model to ONNX.")
+    parser.add_argument(
+        "--model", default=onnx_runtime.MODELS[0], choices=onnx_runtime.MODELS
+    )
+    parser.add_argument("--output", default=config.ONNX_DIR, help="Default: ONNX_DIR")
+    args = parser.parse_args()
+
+    print(f"Loading model: {args.model}")
+    tts_model = model_class(args.model).from_pretrained("cpu")
+    path = onnx_runtime.export(tts_model, args.model, args.output)
+    print(f"Exported the {args.model} transformer to {path}")
+    difference = onnx_runtime.check(tts_model, path)
+    print(f"Largest difference with PyTorch: {difference:.2e}")
+
+
+if __name__ == "__main__":
+    main()
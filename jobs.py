@@ -0,0 +1,443 @@
+# jobs.py
+# Background synthesis jobs for long documents such as audiobook chapters.
+# A job is submitted once and generated on the inference worker at a lower
+# priority than the live requests, while the client polls its progress.
+# The PCM of each chunk is checkpointed to disk as soon as it is generated,
+# so a job interrupted by a restart resumes at its first missing chunk, and
+# the final file is assembled by streaming the checkpoints from disk.
+#
+# Each job is a directory of JOBS_DIR:
+#
+#     job.json          parameters and progress
+#     text.txt          input text
+#     00000.pcm ...     int16 PCM of each generated chunk
+#     00000.rng ...     RNG state after the chunk, for seeded jobs
+#     speech.<format>   final audio, once the job is done
+#     lock              locked by the process generating the job
+#
+# With serve.py, every worker runs jobs and the lock makes sure that a job
+# is generated by a single process at a time.
+
+import fcntl
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+
+import config
+import encoder
+import tts
+import utils
+from chunk_cache import chain_digest
+from scheduler import QueueFullError
+from stitcher import ChunkStitcher
+
+# How often an idle runner looks for jobs submitted to other processes or
+# left unfinished by a previous run
+POLL_SECONDS = 5.0
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class JobTask(tts.SynthesisTask):
+    """
+    Synthesis task that remembers the RNG state after each chunk, since the
+    worker may be a chunk ahead of the checkpoints.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.rng_states = deque()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def rng_state(self):
+        return self._rng_state
+
+    @rng_state.setter
+    def rng_state(self, state) -> None:
+        self._rng_state = state
+        if state is not None:
+            self.rng_states.append((self.position, state))
+
+    def rng_state_after(self, index: int):
+        """RNG state after the chunk at `index`, older states are dropped."""
+        state = None
+        while self.rng_states and self.rng_states[0][0] <= index + 1:
+            position, candidate = self.rng_states.popleft()
+            if position == index + 1:
+                state = candidate
+        return state
+
+
+class JobManager:
+    def __init__(self, jobs_dir: str, priority: int):
+        self.jobs_dir = jobs_dir
+        self.priority = priority
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._runner = None
+        self._runner_pid = None
+        # Jobs being generated by this process, by id
+        self._running = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.jobs_dir)
+
+    def start(self) -> None:
+        """
+        Starts the runner of this process, which also resumes the jobs left
+        unfinished by a previous run. Threads don't survive a fork, so each
+        process starts its own.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._runner is None or self._runner_pid != os.getpid():
+                self._runner_pid = os.getpid()
+                self._running = {}
+                self._runner = threading.Thread(
+                    target=self._run, name="job-runner", daemon=True
+                )
+                self._runner.start()
+
+    def submit(self, params: dict, response_format: str, priority: int = None) -> dict:
+        """Creates a job for the generation `params`, returns its status."""
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        text = params["text"]
+        chunks = utils.chunk_text_by_sentences(
+            text, params["chunk_size"], params["first_chunk_size"], config.CHUNK_GROWTH
+        )
+        with open(os.path.join(job_dir, "text.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        params = {name: value for name, value in params.items() if name != "text"}
+        _write_json(
+            os.path.join(job_dir, "job.json"),
+            {
+                "status": "queued",
+                "params": params,
+                "response_format": response_format,
+                "priority": self.priority if priority is None else priority,
+                "created": time.time(),
+                "chunks_total": len(chunks),
+                "chunks_done": 0,
+                "chars_total": sum(len(chunk) for chunk in chunks),
+                "chars_done": 0,
+                "sample_rate": None,
+                "audio_seconds": 0.0,
+                "seconds_per_char": None,
+                "error": None,
+            },
+        )
+        print(f"Job {job_id} queued with {len(chunks)} chunks")
+        self.start()
+        self._wakeup.set()
+        return self.status(job_id)
+
+    def status(self, job_id: str):
+        """Progress of the job, None if it doesn't exist."""
+        job = self._read(job_id)
+        if job is None:
+            return None
+        chars_left = job["chars_total"] - job["chars_done"]
+        if job["status"] == "done":
+            eta = 0.0
+        elif job["seconds_per_char"]:
+            eta = job["seconds_per_char"] * chars_left
+        else:
+            # Nothing generated yet, use the rate measured by this process
+            model_name = job["params"]["model_name"]
+            eta = tts.estimate_synthesis_seconds(model_name, chars_left) or None
+        return {
+            "id": job_id,
+            "status": job["status"],
+            "model": job["params"]["model_name"],
+            "voice": job["params"]["voice"],
+            "response_format": job["response_format"],
+            "created": job["created"],
+            "chunks_done": job["chunks_done"],
+            "chunks_total": job["chunks_total"],
+            "progress": round(job["chunks_done"] / max(1, job["chunks_total"]), 4),
+            "audio_seconds": round(job["audio_seconds"], 2),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "error": job["error"],
+            "audio_url": f"/jobs/{job_id}/audio" if job["status"] == "done" else None,
+        }
+
+    def audio_path(self, job_id: str):
+        """Path of the final audio, None until the job is done."""
+        job = self._read(job_id)
+        if job is None or job["status"] != "done":
+            return None
+        return self._audio_path(job_id, job["response_format"])
+
+    def delete(self, job_id: str) -> bool:
+        """
+        Cancels the job and deletes its files. A job being generated by
+        another process is deleted by that process at its next chunk.
+        """
+        if self._read(job_id) is None:
+            return False
+        job_dir = self._job_dir(job_id)
+        open(os.path.join(job_dir, "cancelled"), "w").close()
+        audio_stream = self._running.get(job_id)
+        if audio_stream is not None:
+            audio_stream.cancel()
+            return True
+        lock_file = self._try_lock(job_id)
+        if lock_file is not None:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            lock_file.close()
+        return True
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _audio_path(self, job_id: str, response_format: str) -> str:
+        return os.path.join(self._job_dir(job_id), f"speech.{response_format}")
+
+    def _chunk_path(self, job_id: str, index: int, extension: str) -> str:
+        return os.path.join(self._job_dir(job_id), f"{index:05d}.{extension}")
+
+    def _read(self, job_id: str):
+        if not self.enabled or not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self._job_dir(job_id), "job.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _update(self, job_id: str, job: dict, **changes) -> None:
+        job.update(changes)
+        _write_json(os.path.join(self._job_dir(job_id), "job.json"), job)
+
+    def _try_lock(self, job_id: str):
+        """Returns the locked lock file, None if another process holds it."""
+        try:
+            lock_file = open(os.path.join(self._job_dir(job_id), "lock"), "a")
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _cancelled(self, job_id: str) -> bool:
+        return os.path.exists(os.path.join(self._job_dir(job_id), "cancelled"))
+
+    def _claim_next(self):
+        """Locks the oldest unfinished job, returns (job id, lock file)."""
+        try:
+            names = os.listdir(self.jobs_dir)
+        except FileNotFoundError:
+            return None, None
+        jobs = [(name, self._read(name)) for name in names if _JOB_ID.match(name)]
+        jobs = [
+            (job["created"], job_id)
+            for job_id, job in jobs
+            if job is not None and job["status"] in ("queued", "running")
+        ]
+        for _, job_id in sorted(jobs):
+            lock_file = self._try_lock(job_id)
+            if lock_file is None:
+                continue
+            job = self._read(job_id)
+            if self._cancelled(job_id):
+                shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+            elif job is not None and job["status"] in ("queued", "running"):
+                return job_id, lock_file
+            lock_file.close()
+        return None, None
+
+    def _run(self) -> None:
+        while True:
+            job_id, lock_file = self._claim_next()
+            if job_id is None:
+                self._wakeup.wait(POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            try:
+                self._generate(job_id)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                job = self._read(job_id)
+                if job is not None:
+                    self._update(job_id, job, status="failed", error=str(e))
+            finally:
+                self._running.pop(job_id, None)
+                if self._cancelled(job_id):
+                    shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+                    print(f"Job {job_id} cancelled")
+                lock_file.close()
+
+    def _checkpoints(self, job_id: str, total: int) -> int:
+        """Number of chunks already checkpointed, in order."""
+        done = 0
+        while done < total and os.path.exists(self._chunk_path(job_id, done, "pcm")):
+            done += 1
+        return done
+
+    def _generate(self, job_id: str) -> None:
+        job = self._read(job_id)
+        text_path = os.path.join(self._job_dir(job_id), "text.txt")
+        with open(text_path, encoding="utf-8") as f:
+            text = f.read()
+        task = JobTask(text, **job["params"])
+        total = len(task.chunks)
+        if total != job["chunks_total"]:
+            raise RuntimeError("The text is not split into the same chunks anymore")
+
+        done = self._checkpoints(job_id, total)
+        if done:
+            print(f"Resuming job {job_id} at chunk {done + 1}/{total}")
+            task.position = done
+            for chunk in task.chunks[:done]:
+                task.prefix = chain_digest(task.prefix, chunk)
+            if task.seed != 0 and done < total:
+                self._restore_rng_state(job_id, task, done)
+
+        if done < total:
+            self._update(job_id, job, status="running")
+            self._synthesize(job_id, job, task, done)
+            if self._cancelled(job_id):
+                return
+            if not task.done:
+                raise RuntimeError("The generation stopped before the last chunk")
+
+        self._assemble(job_id, job)
+        self._update(job_id, job, status="done")
+        print(f"Job {job_id} done")
+
+    def _restore_rng_state(self, job_id: str, task: JobTask, done: int) -> None:
+        import torch
+
+        try:
+            task.rng_state = torch.load(
+                self._chunk_path(job_id, done - 1, "rng"), weights_only=False
+            )
+        except FileNotFoundError:
+            print(f"No RNG state to resume job {job_id}, reseeding it")
+
+    def _submit(self, job_id: str, job: dict, task: JobTask):
+        """Queues the task, waiting for room in the inference queue."""
+        while not self._cancelled(job_id):
+            try:
+                return tts.inference_scheduler.submit(task, job["priority"])
+            except QueueFullError:
+                time.sleep(1.0)
+        return None
+
+    def _synthesize(self, job_id: str, job: dict, task: JobTask, done: int) -> None:
+        import torch
+
+        audio_stream = self._submit(job_id, job, task)
+        if audio_stream is None:
+            return
+        self._running[job_id] = audio_stream
+        sample_rate = audio_stream.sample_rate
+        start = time.perf_counter()
+        chars = 0
+        for index, wav in enumerate(audio_stream, start=done):
+            audio_data = tts.postprocess(wav)
+            if audio_data is not wav:
+                task.store_chunk(audio_data)
+
+            if task.seed != 0:
+                # Saved before the chunk, so that a checkpointed chunk always
+                # has the state to resume after it
+                rng_path = self._chunk_path(job_id, index, "rng")
+                torch.save(task.rng_state_after(index), rng_path + ".tmp")
+                os.replace(rng_path + ".tmp", rng_path)
+            pcm_path = self._chunk_path(job_id, index, "pcm")
+            audio_data.tofile(pcm_path + ".tmp")
+            os.replace(pcm_path + ".tmp", pcm_path)
+            if index > 0 and task.seed != 0:
+                try:
+                    os.remove(self._chunk_path(job_id, index - 1, "rng"))
+                except FileNotFoundError:
+                    pass
+
+            chars += len(task.chunks[index])
+            self._update(
+                job_id,
+                job,
+                chunks_done=index + 1,
+                chars_done=job["chars_done"] + len(task.chunks[index]),
+                sample_rate=sample_rate,
+                audio_seconds=job["audio_seconds"] + len(audio_data) / sample_rate,
+                # Measured on this run, including the time waiting for the
+                # model while it served live requests
+                seconds_per_char=(time.perf_counter() - start) / chars,
+            )
+            if self._cancelled(job_id):
+                audio_stream.cancel()
+        task.report_timings()
+
+    def _assemble(self, job_id: str, job: dict) -> None:
+        """
+        Writes the final audio from the checkpoints, then removes them. The
+        chunks are crossfaded like the responses of tts.py.
+        """
+        import numpy as np
+
+        response_format = job["response_format"]
+        sample_rate = job["sample_rate"]
+        paths = [
+            self._chunk_path(job_id, index, "pcm")
+            for index in range(job["chunks_total"])
+        ]
+        stitcher = ChunkStitcher(config.CROSSFADE_MS * sample_rate // 1000)
+
+        def stitched():
+            for path in paths:
+                yield from stitcher.add(np.fromfile(path, dtype=np.int16))
+            yield from stitcher.flush()
+
+        audio_path = self._audio_path(job_id, response_format)
+        tmp_path = audio_path + ".tmp"
+        with open(tmp_path, "wb") as output:
+            if response_format in ("wav", "pcm"):
+                if response_format == "wav":
+                    # The length is only known once the chunks are crossfaded
+                    output.write(encoder.wav_header(sample_rate, 0))
+                num_samples = 0
+                for audio_data in stitched():
+                    output.write(memoryview(audio_data))
+                    num_samples += len(audio_data)
+                if response_format == "wav":
+                    output.seek(0)
+                    output.write(encoder.wav_header(sample_rate, num_samples))
+            else:
+                audio_encoder = encoder.open_encoder(response_format, sample_rate)
+                try:
+                    for audio_data in stitched():
+                        output.write(audio_encoder.write(audio_data))
+                    output.write(audio_encoder.close())
+                except BaseException:
+                    audio_encoder.abort()
+                    raise
+        os.replace(tmp_path, audio_path)
+
+        for name in os.listdir(self._job_dir(job_id)):
+            # The checkpoints, not the final audio of a pcm job
+            if name.endswith((".pcm", ".rng")) and not name.startswith("speech."):
+                os.remove(os.path.join(self._job_dir(job_id), name))
+
+
+job_manager = JobManager(config.JOBS_DIR, config.JOB_PRIORITY)
@@ -1,6 +1,10 @@
 from server import app
+from jobs import job_manager
+from warmup import warmup
 import config
 
 if __name__ == "__main__":
     print("Please wait while the server is starting...")
+    # Resume the unfinished background jobs once the model is warm
+    warmup.start(on_ready=job_manager.start)
     app.run(host=config.API_HOST, port=config.API_PORT)
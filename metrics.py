@@ -0,0 +1,307 @@
+# metrics.py
+# Minimal Prometheus metrics (counters, gauges, histograms) rendered in the
+# text exposition format by GET /metrics, without an extra dependency.
+# Synthesis metrics are labeled by model and voice, the metrics of a response
+# also by its format. Metrics are kept per process, so with serve.py each
+# worker exposes its own.
+
+import math
+import threading
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    math.inf,
+)
+
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), collect=None):
+        """
+        `collect()`, when given, returns the values at each scrape as
+        {label values tuple: value} instead of the metric being updated.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self):
+        """Yields (name suffix, labels, value)."""
+        if self._collect is not None:
+            for key, value in self._collect().items():
+                yield "", self._labels(key), value
+            return
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield "", self._labels(key), value
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}"
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if self.buckets[-1] != math.inf:
+            self.buckets += (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, (list(c), t)) for key, (c, t) in self._values.items()]
+        for key, (counts, total) in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+def render() -> str:
+    """All the metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- Requests ---
+
+REQUEST_SECONDS = Histogram(
+    "tts_request_duration_seconds",
+    "Time to produce the whole audio of a request.",
+    ["model", "voice", "format", "cache"],
+)
+
+
+def observe_request(
+    model: str, voice: str, response_format: str, seconds: float, cache: str
+) -> None:
+    """`cache` is "hit" for responses served from the response cache."""
+    REQUEST_SECONDS.observe(
+        seconds, model=model, voice=voice, format=response_format, cache=cache
+    )
+
+
+# --- Pipeline stages ---
+
+CHUNKING_SECONDS = Histogram(
+    "tts_chunking_duration_seconds",
+    "Time to split the text of a request into chunks.",
+    ["model", "voice"],
+)
+CHUNK_GENERATION_SECONDS = Histogram(
+    "tts_chunk_generation_duration_seconds",
+    "Time to synthesize one chunk.",
+    ["model", "voice"],
+)
+POSTPROCESS_SECONDS = Histogram(
+    "tts_postprocess_duration_seconds",
+    "Time to convert the waveform of one chunk to int16 PCM.",
+    ["model", "voice", "format"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1),
+)
+ENCODE_SECONDS = Histogram(
+    "tts_encode_duration_seconds",
+    "Time to encode one chunk in the response format.",
+    ["model", "voice", "format"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "tts_model_load_duration_seconds", "Time to load a model.", ["model"]
+)
+
+# --- Generated audio ---
+
+CHARACTERS = Counter(
+    "tts_characters_total", "Characters synthesized.", ["model", "voice"]
+)
+CHUNKS = Counter("tts_chunks_total", "Chunks synthesized.", ["model", "voice"])
+AUDIO_SECONDS = Counter(
+    "tts_audio_seconds_total", "Seconds of audio synthesized.", ["model", "voice"]
+)
+SYNTHESIS_SECONDS = Counter(
+    "tts_synthesis_seconds_total", "Time spent synthesizing.", ["model", "voice"]
+)
+
+
+def _real_time_factors() -> dict:
+    synthesis, audio = {}, {}
+    for _, labels, value in SYNTHESIS_SECONDS.samples():
+        synthesis[labels["model"]] = synthesis.get(labels["model"], 0.0) + value
+    for _, labels, value in AUDIO_SECONDS.samples():
+        audio[labels["model"]] = audio.get(labels["model"], 0.0) + value
+    return {
+        (model,): synthesis.get(model, 0.0) / seconds
+        for model, seconds in audio.items()
+        if seconds
+    }
+
+
+Gauge(
+    "tts_real_time_factor",
+    "Synthesis time per second of audio, below 1 is faster than real time.",
+    ["model"],
+    collect=_real_time_factors,
+)
+
+# --- Queue, models and caches, read at each scrape ---
+
+
+def _scheduler_stats() -> dict:
+    from tts import inference_scheduler
+
+    return inference_scheduler.stats()
+
+
+Gauge(
+    "tts_queue_depth",
+    "Requests waiting for or running on the model.",
+    collect=lambda: {(): _scheduler_stats()["depth"]},
+)
+Gauge(
+    "tts_queue_capacity",
+    "Maximum queue depth.",
+    collect=lambda: {(): _scheduler_stats()["capacity"]},
+)
+Counter(
+    "tts_requests_rejected_total",
+    "Requests rejected because the queue was full.",
+    collect=lambda: {(): _scheduler_stats()["rejected"]},
+)
+Counter(
+    "tts_requests_cancelled_total",
+    "Requests cancelled before the end of their generation.",
+    collect=lambda: {(): _scheduler_stats()["cancelled"]},
+)
+Counter(
+    "tts_cancelled_synthesis_seconds_total",
+    "Estimated synthesis time saved by cancelling requests.",
+    collect=lambda: {(): _scheduler_stats()["saved_seconds"]},
+)
+
+
+def _models_loaded() -> dict:
+    from models import model_registry
+
+    return {(model,): 1 for model in model_registry.loaded()}
+
+
+Gauge(
+    "tts_model_loaded", "Models currently loaded.", ["model"], collect=_models_loaded
+)
+
+
+def _cache_stats() -> dict:
+    from chunk_cache import chunk_cache
+    from conditionals import conditionals_cache
+    from response_cache import response_cache
+
+    return {
+        "responses": response_cache.stats(),
+        "chunks": chunk_cache.stats(),
+        "conditionals": conditionals_cache.stats(),
+    }
+
+
+Gauge(
+    "tts_cache_hit_ratio",
+    "Hit ratio of the in-memory caches.",
+    ["cache"],
+    collect=lambda: {
+        (name,): stats["hit_ratio"] for name, stats in _cache_stats().items()
+    },
+)
+Gauge(
+    "tts_cache_bytes",
+    "Bytes held by the in-memory caches.",
+    ["cache"],
+    collect=lambda: {
+        (name,): stats["bytes"] for name, stats in _cache_stats().items()
+    },
+)
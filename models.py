@@ -0,0 +1,142 @@
+# models.py
+# Registry of loaded TTS models. Several of config.SUPPORTED_MODELS can stay
+# resident at once; the least recently used one is evicted when the memory
+# budget or the maximum number of loaded models is exceeded.
+# Each precision of a model is a variant of its own. Models are loaded as
+# backends (backends/), which hold the engine running them.
+
+import gc
+import threading
+import time
+
+import config
+import metrics
+from backends import load_backend
+from cache import LRUCache
+
+
+def variant_name(model_name: str, precision: str) -> str:
+    """Registry key of a precision variant, the model name in fp32."""
+    return model_name if precision == "fp32" else f"{model_name}@{precision}"
+
+
+def _release_memory() -> None:
+    gc.collect()
+    if config.DEVICE == "cuda":
+        import torch
+
+        torch.cuda.empty_cache()
+
+
+class ModelRegistry:
+    def __init__(self, memory_budget: int = 0, max_models: int = 0, loader=None):
+        """
+        `loader(model_name, precision)` returns a loaded backend,
+        `backends.load_backend` by default.
+        """
+        self._models = LRUCache(
+            max_items=max_models,
+            max_bytes=memory_budget,
+            sizeof=lambda backend: backend.memory_bytes(),
+            on_evict=self._on_evict,
+        )
+        self.loader = loader or load_backend
+        self._known_sizes = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def get(self, model_name: str, precision: str = None):
+        """
+        Returns the backend of the model in `precision` (config.PRECISION by
+        default), loading it (and evicting others) if needed.
+        """
+        precision = precision or config.PRECISION
+        variant = variant_name(model_name, precision)
+        backend = self._models.get(variant)
+        if backend is not None:
+            print(f"Using cached model: {variant}")
+            return backend
+
+        with self._lock:
+            if variant in self._models:
+                return self._models.get(variant)
+
+            if self._make_room(self._known_sizes.get(variant, 0)):
+                _release_memory()
+
+            print(f"Loading model: {variant}")
+            start = time.perf_counter()
+            backend = self.loader(model_name, precision)
+            elapsed = time.perf_counter() - start
+            self.loads += 1
+            self.load_seconds += elapsed
+            metrics.MODEL_LOAD_SECONDS.observe(elapsed, model=model_name)
+
+            size = backend.memory_bytes()
+            self._known_sizes[variant] = size
+            print(
+                f"Loaded model {variant} with {backend.engine} "
+                f"({size / 2**20:.0f} MB) in {elapsed:.1f}s"
+            )
+
+            evictions = self.evictions
+            self._models.put(variant, backend)
+            if self.evictions != evictions:
+                _release_memory()
+            if variant not in self._models:
+                print(
+                    f"Model {variant} does not fit in the memory budget, "
+                    "it will be reloaded on next use"
+                )
+            return backend
+
+    def loaded(self):
+        """Loaded variants, named by `variant_name`."""
+        return self._models.keys()
+
+    def evict(self, model_name: str) -> bool:
+        """Evicts a model by its variant name."""
+        if self._models.pop(model_name) is None:
+            return False
+        self._on_evict(model_name, None)
+        _release_memory()
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded(),
+            "memory_bytes": self._models.bytes,
+            "memory_budget_bytes": self._models.max_bytes,
+            "max_models": self._models.max_items,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "hits": self._models.hits,
+            "load_seconds": round(self.load_seconds, 3),
+        }
+
+    def _make_room(self, needed: int) -> bool:
+        # Evict before loading so that two models never exceed the budget together
+        budget = self._models.max_bytes
+        max_models = self._models.max_items
+        evicted = False
+        for model_name in self._models.keys():
+            over_budget = budget and self._models.bytes + needed > budget
+            over_count = max_models and len(self._models) >= max_models
+            if not (over_budget or over_count):
+                break
+            self._models.pop(model_name)
+            self._on_evict(model_name, None)
+            evicted = True
+        return evicted
+
+    def _on_evict(self, model_name: str, backend) -> None:
+        print(f"Evicting model: {model_name}")
+        self.evictions += 1
+
+
+model_registry = ModelRegistry(
+    memory_budget=config.MODEL_MEMORY_BUDGET_MB * 2**20,
+    max_models=config.MAX_LOADED_MODELS,
+)
@@ -0,0 +1,157 @@
+# response_cache.py
+# Cache of encoded audio responses, addressed by a hash of the normalized
+# request (text, voice, model, generation parameters, seed, format). Hits are
+# served without touching the model. Responses are kept in a size-bounded LRU
+# memory tier with an optional on-disk tier holding one file per response.
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+import config
+from cache import LRUCache
+
+_HORIZONTAL_SPACE = re.compile(r"[ \t]+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes the parts of the text that don't change the generated audio:
+    line endings, runs of spaces and surrounding whitespace. Line breaks are
+    kept since they delimit bullet points when chunking.
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return _HORIZONTAL_SPACE.sub(" ", text).strip()
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int, disk_dir: str = ""):
+        self.memory = LRUCache(max_bytes=max_bytes, sizeof=len)
+        self.disk_dir = disk_dir
+        self.disk_hits = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.memory.max_bytes or self.disk_dir)
+
+    def key(
+        self,
+        response_format: str,
+        text: str,
+        voice: str,
+        speed: float,
+        cfg_weight: float,
+        temperature: float,
+        exaggeration: float,
+        chunk_size: int,
+        seed: int,
+        model_name: str,
+        language_id: str,
+        first_chunk_size: int = 0,
+        target_latency: float = 0.0,
+        stream_tokens: int = 0,
+        precision: str = "fp32",
+    ) -> str:
+        """
+        Hex digest identifying the response, also used as its ETag. The voice
+        file mtime is part of it so that replacing a voice invalidates it.
+        `stream_tokens` only changes how the audio is streamed, so streamed
+        requests are answered with the complete responses of the others.
+        """
+        request = {
+            "format": response_format,
+            "text": normalize_text(text),
+            "voice": voice,
+            "voice_mtime": os.stat(
+                config.AUDIO_PROMPT_PATH + f"{voice}.wav"
+            ).st_mtime_ns,
+            "speed": float(speed),
+            "cfg_weight": float(cfg_weight),
+            "temperature": float(temperature),
+            "exaggeration": float(exaggeration),
+            "chunk_size": int(chunk_size),
+            "first_chunk_size": int(first_chunk_size),
+            "chunk_growth": config.CHUNK_GROWTH,
+            # Chunks are joined with a crossfade of this length
+            "crossfade_ms": config.CROSSFADE_MS,
+            "target_latency": float(target_latency),
+            "seed": int(seed),
+            "model": model_name,
+            "precision": precision,
+            # Quantized models and other engines give different audio
+            "cpu_quantize": config.CPU_QUANTIZE,
+            "backend": config.BACKEND,
+            # Only the multilingual model uses the language
+            "language_id": (
+                language_id if model_name == "Chatterbox-Multilingual" else None
+            ),
+        }
+        encoded = json.dumps(request, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def get(self, key: str, response_format: str):
+        """Returns the encoded audio, or None."""
+        audio_data = self.memory.get(key)
+        if audio_data is not None:
+            return audio_data
+
+        audio_data = self._load_from_disk(key, response_format)
+        if audio_data is not None:
+            self.memory.put(key, audio_data)
+        return audio_data
+
+    def put(self, key: str, response_format: str, audio_data: bytes) -> None:
+        self.memory.put(key, audio_data)
+        self._save_to_disk(key, response_format, audio_data)
+        self.stores += 1
+
+    def clear(self) -> None:
+        """Drops the in-memory responses."""
+        self.memory.clear()
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats.update({"disk_hits": self.disk_hits, "stores": self.stores})
+        return stats
+
+    def _disk_path(self, key: str, response_format: str) -> str:
+        return os.path.join(self.disk_dir, response_format, f"{key}.{response_format}")
+
+    def _load_from_disk(self, key: str, response_format: str):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key, response_format)
+        try:
+            with open(path, "rb") as f:
+                audio_data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"Could not read cached response {path}: {e}")
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        return audio_data
+
+    def _save_to_disk(self, key: str, response_format: str, audio_data: bytes) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key, response_format)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio_data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save response to {path}: {e}")
+
+
+response_cache = ResponseCache(
+    config.RESPONSE_CACHE_MB * 2**20,
+    config.RESPONSE_CACHE_DIR if config.RESPONSE_DISK_CACHE else "",
+)
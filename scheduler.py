@@ -0,0 +1,260 @@
+# scheduler.py
+# Single-owner inference worker. Requests are queued in a bounded priority
+# queue and a dedicated thread runs them, so that the model and the global RNG
+# state are only ever used from that thread.
+# Pending chunks of different requests that share the same model and
+# parameters are collected within a small time window and generated together,
+# when the model can generate several chunks in one call.
+
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+_CHUNK = "chunk"
+_DONE = "done"
+_ERROR = "error"
+
+
+class QueueFullError(Exception):
+    def __init__(self, depth: int, capacity: int):
+        super().__init__(f"Inference queue is full ({depth}/{capacity})")
+        self.depth = depth
+        self.capacity = capacity
+
+
+class InferenceJob:
+    """
+    A queued generation. Iterating over it yields the worker's output as soon
+    as each item is produced. `sample_rate` blocks until the worker has
+    started the job and loaded its model.
+
+    `task` is run chunk by chunk on the worker. It provides `start()`, which
+    returns the sample rate, `done`, `batch_key`: the chunks of tasks with
+    equal keys can be generated in the same batch, `batchable`: whether its
+    model generates batches, set by `start()`, and `remaining_seconds()`,
+    the estimated time left to generate it. Its `output` is set to `put`, so
+    that a task can hand out audio before its chunk is generated.
+    """
+
+    def __init__(self, task, priority: int, seq: int):
+        self.task = task
+        task.output = self.put
+        self.priority = priority
+        self.seq = seq
+        self.started = False
+        self.cancelled = False
+        self.done = False
+        self._sample_rate = None
+        self._started = threading.Event()
+        self._output = queue.Queue()
+
+    @property
+    def sample_rate(self) -> int:
+        self._started.wait()
+        if self._sample_rate is None:
+            # The job failed before producing anything, surface the error
+            for _ in self:
+                pass
+        return self._sample_rate
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def start(self, sample_rate: int) -> None:
+        self.started = True
+        self._sample_rate = sample_rate
+        self._started.set()
+
+    def put(self, item) -> None:
+        self._output.put((_CHUNK, item))
+
+    def finish(self, error: BaseException = None) -> None:
+        self._output.put((_ERROR, error) if error else (_DONE, None))
+        self._started.set()
+
+    def __iter__(self):
+        try:
+            while not self.done:
+                kind, item = self._output.get()
+                if kind == _CHUNK:
+                    yield item
+                    continue
+                self.done = True
+                if kind == _ERROR:
+                    raise item
+        finally:
+            if not self.done:
+                # The consumer went away, stop at the next chunk boundary
+                self.cancel()
+
+
+class InferenceScheduler:
+    def __init__(
+        self,
+        max_queue_size: int,
+        run_batch,
+        batch_max_size: int = 1,
+        batch_wait: float = 0.0,
+    ):
+        """
+        `run_batch(tasks)` generates the next chunk of each task and returns
+        their audio in the same order. Up to `batch_max_size` jobs are active
+        at once and a batch waits at most `batch_wait` seconds for more jobs.
+        """
+        self.capacity = max_queue_size
+        self.batch_max_size = max(1, batch_max_size)
+        self.batch_wait = batch_wait
+        self._run_batch = run_batch
+        self._queue = queue.PriorityQueue(maxsize=max_queue_size)
+        self._active = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        # Estimated synthesis time not spent on cancelled jobs
+        self.saved_seconds = 0.0
+        self.batch_sizes = Counter()
+
+    def submit(self, task, priority: int = 0) -> InferenceJob:
+        """
+        Queues `task`. Lower priority values run first. Raises QueueFullError
+        when the queue is full instead of waiting.
+        """
+        self._ensure_worker()
+        job = InferenceJob(task, priority, next(self._counter))
+        try:
+            self._queue.put_nowait((priority, job.seq, job))
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError(self.depth(), self.capacity)
+        return job
+
+    def depth(self) -> int:
+        """Number of jobs waiting or running."""
+        return self._queue.qsize() + len(self._active)
+
+    def stats(self) -> dict:
+        batches = sum(self.batch_sizes.values())
+        chunks = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "depth": self.depth(),
+            "capacity": self.capacity,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "batches": batches,
+            "mean_batch_size": chunks / batches if batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
+
+    def _ensure_worker(self) -> None:
+        # Threads don't survive a fork, so each process starts its own worker
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid():
+                self._worker_pid = os.getpid()
+                self._worker = threading.Thread(
+                    target=self._run, name="inference-worker", daemon=True
+                )
+                self._worker.start()
+
+    def _admit(self, timeout: float = None) -> bool:
+        """
+        Moves the next queued job to the active jobs. Waits for one when
+        `timeout` is not 0 (forever if None).
+        """
+        if len(self._active) >= self.batch_max_size:
+            return False
+        try:
+            if timeout == 0:
+                _, _, job = self._queue.get_nowait()
+            else:
+                _, _, job = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        self._active.append(job)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            if not self._active:
+                self._admit(timeout=None)
+            while self._admit(timeout=0):
+                pass
+            for job in [job for job in self._active if job.cancelled]:
+                self._finish(job)
+            if not self._active:
+                continue
+
+            head = min(self._active, key=lambda job: (job.priority, job.seq))
+            if not self._start(head):
+                continue
+
+            if head.task.batchable:
+                batch = self._collect_batch(head)
+                self.batch_sizes[len(batch)] += 1
+            else:
+                # Without batched generation, waiting for more jobs only
+                # delays this one
+                batch = [head]
+            try:
+                results = self._run_batch([job.task for job in batch])
+            except Exception as e:
+                for job in batch:
+                    self._finish(job, e)
+                continue
+
+            for job, audio_data in zip(batch, results):
+                job.put(audio_data)
+                if job.task.done or job.cancelled:
+                    self._finish(job)
+
+    def _start(self, job: InferenceJob) -> bool:
+        """Starts the job if needed, returns whether it has chunks to generate."""
+        if job.cancelled:
+            self._finish(job)
+            return False
+        if not job.started:
+            try:
+                job.start(job.task.start())
+            except Exception as e:
+                self._finish(job, e)
+                return False
+        if job.task.done:
+            self._finish(job)
+            return False
+        return True
+
+    def _collect_batch(self, head: InferenceJob) -> list:
+        batch = [head]
+        deadline = time.monotonic() + self.batch_wait
+        while True:
+            for job in list(self._active):
+                if len(batch) >= self.batch_max_size:
+                    return batch
+                if job in batch or job.task.batch_key != head.task.batch_key:
+                    continue
+                if self._start(job):
+                    batch.append(job)
+
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.batch_max_size or remaining <= 0:
+                return batch
+            if not self._admit(timeout=remaining):
+                return batch
+
+    def _finish(self, job: InferenceJob, error: BaseException = None) -> None:
+        if job.cancelled and not job.task.done:
+            self.cancelled += 1
+            saved = job.task.remaining_seconds()
+            self.saved_seconds += saved
+            print(f"Job cancelled, saved about {saved:.1f}s of synthesis")
+        job.finish(error)
+        self._active.remove(job)
+        self.completed += 1
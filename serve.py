@@ -0,0 +1,115 @@
+# serve.py
+# Production entry point: a pre-fork multi-worker server. The parent binds the
+# listening socket and, on CPU, loads the configured models and voice
+# conditionals once before forking WORKERS processes that share the weights
+# copy-on-write and accept connections from the same socket. Each worker runs
+# its own inference worker thread, warms up, and reports when it is ready.
+#
+# CUDA can't be initialized before a fork, so on GPU each worker loads the
+# models itself while warming up after forking.
+
+import os
+import signal
+import sys
+import threading
+
+from werkzeug.serving import make_server
+
+import config
+from jobs import job_manager
+from server import app
+from warmup import preload, warmup
+
+
+def _run_worker(server, index: int, workers: int, pipe: tuple) -> None:
+    read_fd, ready_fd = pipe
+    os.close(read_fd)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    if config.CPU_THREADS == 0:
+        import torch
+
+        # Share the cores between the workers instead of oversubscribing them,
+        # unless CPU_THREADS sets the threads of each worker
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+
+    def ready():
+        # Resume the unfinished background jobs, shared by all the workers
+        job_manager.start()
+        os.write(ready_fd, f"{index} {os.getpid()}\n".encode())
+        os.close(ready_fd)
+
+    # Answers the health checks while warming up. On CPU the models and
+    # conditionals were loaded before the fork, so only the kernels are left.
+    warmup.start(on_ready=ready)
+    server.serve_forever()
+
+
+def _spawn_worker(server, index: int, workers: int, pipe: tuple) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _run_worker(server, index, workers, pipe)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def _report_ready(read_fd: int) -> None:
+    with os.fdopen(read_fd) as ready:
+        for line in ready:
+            index, pid = line.split()
+            print(f"Worker {index} (pid {pid}) ready")
+
+
+def serve(workers: int = config.WORKERS) -> None:
+    workers = max(1, workers)
+    server = make_server(config.API_HOST, int(config.API_PORT), app, threaded=True)
+
+    if config.DEVICE == "cpu":
+        print("Loading the model before starting the workers...")
+        preload()
+
+    print(
+        f"Serving on http://{config.API_HOST}:{config.API_PORT} "
+        f"with {workers} workers"
+    )
+    pipe = os.pipe()
+    children = {}
+    for index in range(workers):
+        children[_spawn_worker(server, index, workers, pipe)] = index
+    threading.Thread(target=_report_ready, args=(pipe[0],), daemon=True).start()
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+        children[_spawn_worker(server, index, workers, pipe)] = index
+
+    server.server_close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    print("Please wait while the server is starting...")
+    serve()
@@ -1,155 +1,214 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-import io
-from werkzeug.exceptions import HTTPException
+import time
+from werkzeug.exceptions import HTTPException, InternalServerError
 
+import api
 import config
+import metrics
 import tts
+from api import RequestError, stream_done_event, stream_event
+from chunk_cache import chunk_cache
+from conditionals import conditionals_cache
+from jobs import job_manager
+from models import model_registry
+from response_cache import response_cache
+from scheduler import QueueFullError
+from warmup import WarmingUpError, warmup
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": config.CORS_ALLOWED_ORIGIN}})
 
 
-@app.route("/v1/audio/speech", methods=["POST"])
-def speech_api():
+def _stream_audio(audio, response_format, stream_format):
     """
-    OpenAI API compatible endpoint for generating speech from text.
-    It supports a limited set of parameters.
+    Sends the encoded audio as soon as it is available, using chunked
+    transfer encoding. With the "sse" stream format, the audio is sent as
+    base64 encoded `speech.audio.delta` server-sent events like the OpenAI API.
     """
-    data = request.get_json()
-
-    # Extract parameters from the request
-    # OpenAI API compatible parameters only
-    text = data.get("input")
-    model = data.get("model", config.MODEL)
-    voice = data.get("voice")
-    response_format = data.get("response_format", "wav")
-
-    print(f"Got request: {data}")
-
-    # Validate parameters
-    if not text:
-        return (
-            jsonify({"error": "Input text is required."}),
-            400,
-        )
-    if voice not in config.SUPPORTED_VOICES:
-        return jsonify({"error": "Unsupported voice specified."}), 400
-    if response_format not in config.SUPPORTED_RESPONSE_FORMATS:
-        return (
-            jsonify(
-                {
-                    "error": "Unsupported response format specified. Got: "
-                    + response_format
-                }
-            ),
-            400,
-        )
 
-    # Generate audio from the text
-    audio_data = tts.generate_audio(text, voice, model_name=model)
+    def generate():
+        for data in audio:
+            yield from stream_event(data, stream_format)
+        yield from stream_done_event(stream_format)
 
-    # Convert the audio data to the desired format
-    converted_audio_data = tts.convert_audio_format(audio_data, response_format)
-
-    # Create a BytesIO object for the response
-    audio_io = io.BytesIO(converted_audio_data)
-    audio_io.seek(0)
+    mime_type = (
+        "text/event-stream" if stream_format == "sse" else "audio/" + response_format
+    )
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mime_type,
+        headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"},
+    )
 
-    # Set the appropriate MIME type based on the requested response format
-    mime_type = "audio/" + response_format
 
-    return send_file(
-        audio_io,
-        mimetype=mime_type,
-        as_attachment=True,
-        download_name=f"speech.{response_format}",
+def _send_audio(audio_data: bytes, response_format: str, etag: str = None):
+    # Sent from the buffer of the audio, without copying it into a file object
+    response = Response(
+        api.iter_slices(audio_data),
+        mimetype="audio/" + response_format,
+        headers={
+            "Content-Length": str(len(audio_data)),
+            "Content-Disposition": f"attachment; filename=speech.{response_format}",
+        },
+        direct_passthrough=True,
     )
+    if etag:
+        response.set_etag(etag)
+    return response
 
 
-@app.route("/tts", methods=["POST"])
-def tts_api():
+def _audio_response(
+    params: dict,
+    response_format: str,
+    stream_format: str = None,
+    priority: int = config.DEFAULT_PRIORITY,
+):
     """
-    Endpoint for generating audio from text using the TTS model.
-    This endpoint accepts more parameters used by Chatterbox.
+    Answers from the response cache when possible, otherwise generates the
+    audio, streamed when `stream_format` is set.
     """
-    data = request.get_json()
-
-    # Extract parameters from the request
-    text = data.get("text")
-    voice = data.get("predefined_voice_id")
-    model = data.get("model", config.MODEL)
-    speed = float(data.get("speed_factor", 1.0))
-    cfg = float(data.get("cfg_weight", config.AUDIO_CFG_WEIGHT))
-    temperature = float(data.get("temperature", config.AUDIO_TEMPERATURE))
-    exaggeration = float(data.get("exaggeration", config.AUDIO_EXAGGERATION))
-    response_format = data.get("output_format", "wav")
-    seed = data.get("seed", config.SEED)
-    language_id = data.get("language_id", config.LANGUAGE_ID)
-
-    print(f"Got request: {data}")
-    chunk_size = data.get("chunk_size", 250)
-
-    # Validate parameters
-    if not text:
-        return (
-            jsonify({"error": "Input text is required."}),
-            400,
-        )
-    if voice not in config.SUPPORTED_VOICES:
-        return jsonify({"error": "Unsupported voice specified."}), 400
-    if response_format not in config.SUPPORTED_RESPONSE_FORMATS:
-        return (
-            jsonify(
-                {
-                    "error": "Unsupported response format specified. Got: "
-                    + response_format
-                }
-            ),
-            400,
+    warmup.check()
+    start = time.perf_counter()
+    key = None
+    if response_cache.enabled:
+        key = response_cache.key(response_format, **params)
+
+    if key:
+        if request.if_none_match.contains(key):
+            response = Response(status=304)
+            response.set_etag(key)
+            return response
+        audio_data = response_cache.get(key, response_format)
+        if audio_data is not None:
+            metrics.observe_request(
+                params["model_name"],
+                params["voice"],
+                response_format,
+                time.perf_counter() - start,
+                cache="hit",
+            )
+            if stream_format:
+                response = _stream_audio([audio_data], response_format, stream_format)
+                response.set_etag(key)
+                return response
+            return _send_audio(audio_data, response_format, key)
+
+    if stream_format:
+        audio_stream = tts.generate_audio_stream(**params, priority=priority)
+        # Wait for the worker to start the job so that errors get a proper status
+        audio_stream.sample_rate
+        return _stream_audio(
+            tts.encode_audio_stream(audio_stream, response_format),
+            response_format,
+            stream_format,
         )
 
-    if chunk_size < 1:
-        return jsonify({"error": "Chunk size must be greater than 0."}), 400
+    audio_data = tts.generate_audio(
+        **params, response_format=response_format, priority=priority
+    )
+    if key:
+        response_cache.put(key, response_format, audio_data)
+    return _send_audio(audio_data, response_format, key)
+
 
-    if model not in config.SUPPORTED_MODELS:
-        return jsonify({"error": "Unsupported model specified."}), 400
+@app.errorhandler(QueueFullError)
+def handle_queue_full(e):
+    """Rejects the request right away instead of piling it onto the model."""
+    response = jsonify({"error": "Server is busy, please retry later."})
+    response.status_code = config.QUEUE_FULL_STATUS
+    response.headers["Retry-After"] = "1"
+    response.headers["X-Queue-Depth"] = str(e.depth)
+    response.headers["X-Queue-Capacity"] = str(e.capacity)
+    return response
 
-    if language_id not in config.SUPPORTED_LANGUAGE_IDS:
-        return jsonify({"error": "Unsupported language id specified."}), 400
 
-    # Generate audio from the text
-    audio_data = tts.generate_audio(
-        text,
-        voice,
-        speed,
-        cfg,
-        temperature,
-        exaggeration,
-        chunk_size,
-        seed,
-        model,
-        language_id,
-    )
+@app.errorhandler(WarmingUpError)
+def handle_warming_up(e):
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
+
+
+@app.errorhandler(RequestError)
+def handle_request_error(e):
+    return jsonify({"error": str(e)}), 400
+
+
+@app.errorhandler(InternalServerError)
+def handle_internal_error(e):
+    # Generation and encoding failures, Flask has already logged them
+    return jsonify({"error": "Internal server error."}), 500
+
+
+@app.route("/v1/audio/speech", methods=["POST"])
+def speech_api():
+    """
+    OpenAI API compatible endpoint for generating speech from text.
+    It supports a limited set of parameters.
+    """
+    return _audio_response(**api.parse_speech_request(request.get_json()))
+
+
+@app.route("/tts", methods=["POST"])
+def tts_api():
+    """
+    Endpoint for generating audio from text using the TTS model.
+    This endpoint accepts more parameters used by Chatterbox.
+    """
+    return _audio_response(**api.parse_tts_request(request.get_json()))
 
-    # Convert the audio data to the desired format
-    converted_audio_data = tts.convert_audio_format(audio_data, response_format)
 
-    # Create a BytesIO object for the response
-    audio_io = io.BytesIO(converted_audio_data)
-    audio_io.seek(0)
+def _job_not_found():
+    return jsonify({"error": "Job not found."}), 404
 
-    # Set the appropriate MIME type based on the requested response format
-    mime_type = "audio/" + response_format
 
+@app.route("/jobs", methods=["POST"])
+def create_job_api():
+    """
+    Queues the generation of a long text in the background. Takes the
+    parameters of /tts and returns the job status.
+    """
+    if not job_manager.enabled:
+        return jsonify({"error": "Jobs are disabled."}), 404
+    job = job_manager.submit(**api.parse_job_request(request.get_json()))
+    return jsonify(job), 202, {"Location": f"/jobs/{job['id']}"}
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job_api(job_id):
+    job = job_manager.status(job_id)
+    if job is None:
+        return _job_not_found()
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/audio", methods=["GET"])
+def get_job_audio_api(job_id):
+    """Sends the audio of a finished job from disk."""
+    job = job_manager.status(job_id)
+    if job is None:
+        return _job_not_found()
+    path = job_manager.audio_path(job_id)
+    if path is None:
+        return jsonify({"error": "Job is not done.", "status": job["status"]}), 409
+    response_format = job["response_format"]
     return send_file(
-        audio_io,
-        mimetype=mime_type,
+        path,
+        mimetype="audio/" + response_format,
         as_attachment=True,
         download_name=f"speech.{response_format}",
     )
 
 
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def delete_job_api(job_id):
+    if not job_manager.delete(job_id):
+        return _job_not_found()
+    return "", 204
+
+
 @app.route("/voices", methods=["GET"])
 def get_voices_api():
     return jsonify({"voices": config.SUPPORTED_VOICES})
@@ -160,6 +219,43 @@ def get_models_api():
     return jsonify({"models": config.SUPPORTED_MODELS})
 
 
+@app.route("/models/stats", methods=["GET"])
+def get_models_stats_api():
+    return jsonify(model_registry.stats())
+
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats_api():
+    return jsonify(
+        {
+            "responses": response_cache.stats(),
+            "chunks": chunk_cache.stats(),
+            "conditionals": conditionals_cache.stats(),
+        }
+    )
+
+
+@app.route("/health/live", methods=["GET"])
+def health_live_api():
+    return jsonify({"status": "ok"})
+
+
+@app.route("/health/ready", methods=["GET"])
+def health_ready_api():
+    """Ready once the warmup is done."""
+    return jsonify(warmup.status()), 200 if warmup.ready else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics_api():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/queue", methods=["GET"])
+def get_queue_api():
+    return jsonify(tts.inference_scheduler.stats())
+
+
 @app.route("/languages", methods=["GET"])
 def get_languages_api():
     return jsonify({"languages": config.SUPPORTED_LANGUAGE_IDS})
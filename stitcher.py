@@ -0,0 +1,51 @@
+# stitcher.py
+# Joins the int16 PCM of the consecutive chunks of a request. Chunks are
+# generated separately, so their boundaries are hard cuts: the last `fade`
+# samples of each chunk are held back and crossfaded with the first ones of
+# the next chunk. Pieces of a chunk that is still being generated
+# (sub-sentence streaming) are passed on as they come.
+
+
+class ChunkStitcher:
+    def __init__(self, fade: int):
+        self.fade = fade
+        self._tail = None
+        self._fade_in = None
+        self._fade_out = None
+
+    def add(self, audio_data, chunk_end: bool = True) -> list:
+        """
+        Returns the audio ready to be encoded, as views of `audio_data` apart
+        from the crossfaded samples, so that the chunk is not copied. When
+        `chunk_end` is set, the end of the chunk is held back for the next one.
+        """
+        if not self.fade:
+            return [audio_data]
+        parts = []
+        if self._tail is not None:
+            if len(audio_data) >= self.fade:
+                parts.append(self._crossfade(self._tail, audio_data[: self.fade]))
+                audio_data = audio_data[self.fade :]
+            else:
+                # Too short to fade into, left as a hard cut
+                parts.append(self._tail)
+            self._tail = None
+        if chunk_end and len(audio_data) >= self.fade:
+            self._tail = audio_data[len(audio_data) - self.fade :]
+            audio_data = audio_data[: len(audio_data) - self.fade]
+        parts.append(audio_data)
+        return parts
+
+    def flush(self) -> list:
+        """Returns the end of the last chunk."""
+        tail, self._tail = self._tail, None
+        return [tail] if tail is not None else []
+
+    def _crossfade(self, tail, head):
+        import numpy as np
+
+        if self._fade_in is None:
+            self._fade_in = np.linspace(0.0, 1.0, self.fade, dtype=np.float32)
+            self._fade_out = 1.0 - self._fade_in
+        mixed = tail * self._fade_out + head * self._fade_in
+        return np.rint(mixed).astype(np.int16)
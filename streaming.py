@@ -0,0 +1,189 @@
+# streaming.py
+# Sub-sentence streaming for Chatterbox-Turbo. `generate` only returns once
+# every speech token of a chunk is generated and decoded, so the speech token
+# loop of the model is run here instead. Every `stream_tokens` new tokens, a
+# window of the tokens so far is decoded to waveform and the new part of it is
+# handed out right away. Each window starts CONTEXT_TOKENS before the first
+# sample not handed out yet, so that the decoder sees the speech before it.
+# The last FADE_SAMPLES of each piece are crossfaded with the next window.
+# Fewer tokens per window give the first audio sooner but decode the context
+# tokens more often.
+
+# Speech tokens per second of audio
+TOKENS_PER_SECOND = 25
+# Tokens decoded again before the new ones of a window
+CONTEXT_TOKENS = 10
+# The decoder looks ahead of each token, so the audio of the last tokens of a
+# window changes once the next tokens are known and is only kept from the
+# next window
+LOOKAHEAD_TOKENS = 3
+FADE_SAMPLES = 480
+# Speech tokens above the vocabulary are special tokens, not audio
+SPEECH_VOCAB_SIZE = 6561
+# Silence tokens appended to the last window, like `generate` does
+SILENCE_TOKEN = 4299
+MAX_TOKENS = 1000
+
+
+def supports_streaming(tts_model, model_name: str) -> bool:
+    """Whether the token loop of the model can be run here."""
+    return model_name == "Chatterbox-Turbo" and all(
+        hasattr(tts_model, name) for name in ("t3", "s3gen", "tokenizer")
+    )
+
+
+def _speech_tokens(
+    tts_model,
+    text: str,
+    temperature: float,
+    top_k: int,
+    top_p: float,
+    repetition_penalty: float,
+):
+    """Yields the speech tokens of `text` as the model generates them."""
+    import torch
+    import torch.nn.functional as F
+    from chatterbox.tts_turbo import punc_norm
+    from transformers.generation.logits_process import (
+        LogitsProcessorList,
+        RepetitionPenaltyLogitsProcessor,
+        TemperatureLogitsWarper,
+        TopKLogitsWarper,
+        TopPLogitsWarper,
+    )
+
+    # Same sampling as ChatterboxTurboTTS.generate
+    processors = LogitsProcessorList()
+    if temperature > 0 and temperature != 1.0:
+        processors.append(TemperatureLogitsWarper(temperature))
+    if top_k > 0:
+        processors.append(TopKLogitsWarper(top_k))
+    if top_p < 1.0:
+        processors.append(TopPLogitsWarper(top_p))
+    if repetition_penalty != 1.0:
+        processors.append(RepetitionPenaltyLogitsProcessor(repetition_penalty))
+
+    t3 = tts_model.t3
+    text_tokens = tts_model.tokenizer(
+        punc_norm(text), return_tensors="pt", padding=True, truncation=True
+    ).input_ids.to(tts_model.device)
+    token = t3.hp.start_speech_token * torch.ones_like(text_tokens[:, :1])
+    embeds, _ = t3.prepare_input_embeds(
+        t3_cond=tts_model.conds.t3,
+        text_tokens=text_tokens,
+        speech_tokens=token,
+        cfg_weight=0.0,
+    )
+
+    past_key_values = None
+    generated = []
+    for _ in range(MAX_TOKENS + 1):
+        outputs = t3.tfmr(
+            inputs_embeds=embeds, past_key_values=past_key_values, use_cache=True
+        )
+        past_key_values = outputs.past_key_values
+        logits = t3.speech_head(outputs[0][:, -1:])[:, -1, :]
+        input_ids = torch.cat(generated, dim=1) if generated else token
+        logits = processors(input_ids, logits)
+        if torch.all(logits == -float("inf")):
+            break
+        token = torch.multinomial(F.softmax(logits, dim=-1), num_samples=1)
+        if torch.all(token == t3.hp.stop_speech_token):
+            break
+        generated.append(token)
+        if int(token) < SPEECH_VOCAB_SIZE:
+            yield int(token)
+        embeds = t3.speech_emb(token)
+
+
+def _decode(tts_model, tokens: list, final: bool):
+    """Float waveform of the speech tokens, as a numpy array."""
+    import torch
+
+    if final:
+        tokens = tokens + [SILENCE_TOKEN] * 3
+    speech_tokens = torch.tensor(tokens, dtype=torch.long, device=tts_model.device)
+    wav, _ = tts_model.s3gen.inference(
+        speech_tokens=speech_tokens, ref_dict=tts_model.conds.gen, n_cfm_timesteps=2
+    )
+    return wav.squeeze(0).detach().cpu().numpy()
+
+
+class _Stitcher:
+    """Cuts the decoded windows into consecutive, crossfaded pieces."""
+
+    def __init__(self, tts_model):
+        import numpy as np
+
+        self.tts_model = tts_model
+        self.samples_per_token = tts_model.sr // TOKENS_PER_SECOND
+        # Samples handed out so far
+        self.emitted = 0
+        # Audio decoded after them, faded out into the next window
+        self.tail = np.zeros(0, dtype=np.float32)
+        ramp = np.linspace(0.0, 1.0, FADE_SAMPLES, dtype=np.float32)
+        self.fade_in = ramp
+        self.fade_out = 1.0 - ramp
+
+    def piece(self, tokens: list, final: bool = False):
+        """The audio of `tokens` after the samples already handed out."""
+        start = max(0, self.emitted // self.samples_per_token - CONTEXT_TOKENS)
+        wav = _decode(self.tts_model, tokens[start:], final)
+        audio = wav[max(0, self.emitted - start * self.samples_per_token) :].copy()
+
+        fade = min(len(self.tail), len(audio))
+        audio[:fade] = (
+            self.tail[:fade] * self.fade_out[:fade] + audio[:fade] * self.fade_in[:fade]
+        )
+        if final:
+            self.emitted += len(audio)
+            return audio
+
+        stable = (len(tokens) - LOOKAHEAD_TOKENS) * self.samples_per_token
+        stable = min(len(audio), stable - self.emitted)
+        keep = max(0, stable - FADE_SAMPLES)
+        self.tail = audio[keep:stable]
+        self.emitted += keep
+        return audio[:keep]
+
+
+def generate_stream(
+    tts_model,
+    text: str,
+    stream_tokens: int,
+    emit,
+    temperature: float = 0.8,
+    top_k: int = 1000,
+    top_p: float = 0.95,
+    repetition_penalty: float = 1.2,
+    **kwargs,
+):
+    """
+    Generates `text` like `tts_model.generate`, but calls `emit(wav)` with the
+    float waveform of each piece decoded before the end of the text. Returns
+    the last piece, shaped like the output of `generate`.
+    """
+    import torch
+
+    watermarker = getattr(tts_model, "watermarker", None)
+
+    def watermark(wav):
+        if watermarker is None or not len(wav):
+            return wav
+        return watermarker.apply_watermark(wav, sample_rate=tts_model.sr)
+
+    with torch.inference_mode():
+        stitcher = _Stitcher(tts_model)
+        tokens = []
+        next_window = stream_tokens + LOOKAHEAD_TOKENS
+        for token in _speech_tokens(
+            tts_model, text, temperature, top_k, top_p, repetition_penalty
+        ):
+            tokens.append(token)
+            if len(tokens) >= next_window:
+                wav = stitcher.piece(tokens)
+                if len(wav):
+                    emit(watermark(wav))
+                next_window += stream_tokens
+        wav = watermark(stitcher.piece(tokens, final=True))
+    return torch.from_numpy(wav).unsqueeze(0)
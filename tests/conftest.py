@@ -0,0 +1,19 @@
+# tests/conftest.py
+# Points the configuration at a temporary voices directory holding two voices,
+# and adds the Stub model, before the server modules are imported by the tests.
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+VOICE = "test"
+OTHER_VOICE = "other"
+_voices_dir = tempfile.mkdtemp(prefix="tts-test-voices-")
+for _voice in (VOICE, OTHER_VOICE):
+    open(os.path.join(_voices_dir, f"{_voice}.wav"), "wb").close()
+os.environ["VOICES_DIR"] = _voices_dir
+os.environ["SUPPORTED_VOICES"] = f"{VOICE},{OTHER_VOICE}"
+os.environ["STUB_MODEL"] = "true"
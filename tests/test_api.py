@@ -0,0 +1,54 @@
+# tests/test_api.py
+
+import pytest
+
+import api
+import config
+from models import model_registry, variant_name
+
+
+def test_job_request_is_not_streamed():
+    # Jobs checkpoint whole chunks, streaming options must not split them
+    request = api.parse_job_request(
+        {
+            "text": "Hello world.",
+            "predefined_voice_id": "test",
+            "stream": True,
+            "stream_format": "sse",
+            "stream_tokens": 5,
+            "target_latency": 1.0,
+        }
+    )
+    assert "stream_format" not in request
+    assert request["params"]["stream_tokens"] == 0
+    assert request["params"]["target_latency"] == 0.0
+    assert request["params"]["first_chunk_size"] == 0
+
+
+def test_first_chunk_is_only_shortened_when_streamed():
+    data = {
+        "text": "Hello world.",
+        "predefined_voice_id": "test",
+        "first_chunk_size": 40,
+        "target_latency": 1.0,
+    }
+    params = api.parse_tts_request(data)["params"]
+    assert params["first_chunk_size"] == 0
+    assert params["target_latency"] == 0.0
+    params = api.parse_tts_request(dict(data, stream=True))["params"]
+    assert params["first_chunk_size"] == 40
+    assert params["target_latency"] == 1.0
+    params = api.parse_speech_request({"input": "Hello.", "voice": "test"})["params"]
+    assert params["first_chunk_size"] == 0
+
+
+def test_precision_is_only_served_while_loaded(monkeypatch):
+    monkeypatch.setattr(config, "PRECISIONS", ["fp32", "bf16"])
+    data = {"text": "Hello.", "predefined_voice_id": "test", "model": "Stub"}
+    with pytest.raises(api.RequestError, match="not loaded"):
+        api.parse_tts_request(dict(data, precision="bf16"))
+    model_registry.get("Stub", "bf16")
+    assert api.parse_tts_request(dict(data, precision="bf16"))["params"]
+    model_registry.evict(variant_name("Stub", "bf16"))
+    with pytest.raises(api.RequestError, match="not loaded"):
+        api.parse_tts_request(dict(data, precision="bf16"))
@@ -0,0 +1,137 @@
+# tests/test_asgi.py
+
+import asyncio
+import json
+import time
+
+import pytest
+from conftest import VOICE
+
+import asgi
+import metrics
+import tts
+from models import model_registry
+from server import app as flask_app
+
+
+def _request(method: str, path: str, data=None, disconnect_on_body=False):
+    """Runs a request through the ASGI app, returns the sent messages."""
+    body = json.dumps(data).encode() if data is not None else b""
+    sent = []
+
+    async def run():
+        disconnected = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": body}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if disconnect_on_body and message.get("body"):
+                disconnected.set()
+
+        scope = {"type": "http", "method": method, "path": path, "headers": []}
+        await asgi.app(scope, receive, send)
+
+    asyncio.run(run())
+    return sent
+
+
+def _response(sent: list) -> tuple:
+    start = sent[0]
+    headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return start["status"], headers["content-type"].split(";")[0], body
+
+
+@pytest.mark.parametrize(
+    "path, data",
+    [
+        ("/tts", {"response_format": "wav"}),
+        ("/tts", {"response_format": "pcm", "seed": 3}),
+        ("/tts", {"response_format": "wav", "stream": True}),
+        ("/tts", {"response_format": "pcm", "stream": True, "stream_format": "sse"}),
+        ("/tts", {"response_format": "wav", "speed": 0}),
+        ("/tts", {"response_format": "wav", "model": "unknown"}),
+        ("/v1/audio/speech", {"response_format": "wav"}),
+    ],
+)
+def test_audio_routes_match_flask(path, data):
+    text = "Hello there. This is a test of the stub model."
+    if path == "/tts":
+        data = {"text": text, "predefined_voice_id": VOICE, "model": "Stub", **data}
+    else:
+        data = {"input": text, "voice": VOICE, "model": "Stub", **data}
+    # Twice, to compare the generated and the cached responses
+    for _ in range(2):
+        with flask_app.test_client().post(path, json=data) as expected:
+            expected_body = expected.get_data()
+        status, content_type, body = _response(_request("POST", path, data))
+        assert status == expected.status_code
+        assert content_type == expected.mimetype
+        if content_type == "application/json":
+            assert json.loads(body) == json.loads(expected_body)
+        else:
+            assert body == expected_body
+
+
+@pytest.mark.parametrize("path", ["/voices", "/models", "/languages", "/queue"])
+def test_json_routes_match_flask(path):
+    expected = flask_app.test_client().get(path)
+    status, content_type, body = _response(_request("GET", path))
+    assert status == expected.status_code
+    assert content_type == expected.mimetype
+    assert json.loads(body) == expected.get_json()
+
+
+def test_disconnect_cancels_the_generation(monkeypatch):
+    monkeypatch.setattr(model_registry.get("Stub"), "char_latency", 0.002)
+    requests = []
+    monkeypatch.setattr(
+        metrics, "observe_request", lambda *args, **kwargs: requests.append(args)
+    )
+    stats = tts.inference_scheduler.stats()
+    text = "".join(f"This is sentence {i} of a long request. " for i in range(10, 30))
+    data = {
+        "text": text,
+        "predefined_voice_id": VOICE,
+        "model": "Stub",
+        "chunk_size": 40,
+        "response_format": "pcm",
+        "stream": True,
+    }
+
+    sent = _request("POST", "/tts", data, disconnect_on_body=True)
+
+    assert sent[0]["status"] == 200
+    assert len([message for message in sent if message.get("body")]) < 20
+    # The worker stops at the end of its current chunk
+    deadline = time.monotonic() + 10
+    while tts.inference_scheduler.depth() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert tts.inference_scheduler.stats()["cancelled"] == stats["cancelled"] + 1
+    # An interrupted response is not reported as a completed request
+    assert requests == []
+
+
+def test_cancelled_stream_is_not_reported(monkeypatch):
+    requests = []
+    monkeypatch.setattr(
+        metrics, "observe_request", lambda *args, **kwargs: requests.append(args)
+    )
+    text = "".join(f"This is sentence {i} of the request. " for i in range(10, 15))
+    audio_stream = tts.generate_audio_stream(
+        text, VOICE, chunk_size=40, model_name="Stub"
+    )
+    audio = tts.encode_audio_stream(audio_stream, "pcm")
+    assert next(audio)
+    audio_stream.cancel()
+
+    assert len(list(audio)) < 4
+    assert requests == []
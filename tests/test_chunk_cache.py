@@ -0,0 +1,43 @@
+# tests/test_chunk_cache.py
+
+import pytest
+from conftest import OTHER_VOICE, VOICE
+
+import tts
+from chunk_cache import chunk_cache
+
+TEXT = "".join(f"This is sentence {i} of a seeded request. " for i in range(4))
+
+
+def _generate(**params):
+    """Generated wav and chunk cache (hits, misses) of a Stub request."""
+    params = {"voice": VOICE, "seed": 42, **params}
+    before = chunk_cache.stats()
+    audio = tts.generate_audio(
+        TEXT, chunk_size=45, first_chunk_size=0, model_name="Stub", **params
+    )
+    after = chunk_cache.stats()
+    return audio, (after["hits"] - before["hits"], after["misses"] - before["misses"])
+
+
+@pytest.fixture(autouse=True)
+def empty_chunk_cache():
+    chunk_cache.clear()
+
+
+def test_repeated_seeded_request_hits_every_chunk():
+    audio, (hits, misses) = _generate()
+    assert (hits, misses) == (0, 4)
+    assert _generate() == (audio, (4, 0))
+
+
+@pytest.mark.parametrize(
+    "params", [{"seed": 43}, {"voice": OTHER_VOICE}, {"precision": "bf16"}]
+)
+def test_seeded_request_misses_with_other_settings(params):
+    audio, _ = _generate()
+    other_audio, (hits, misses) = _generate(**params)
+    assert (hits, misses) == (0, 4)
+    if "precision" not in params:
+        # The stub gives the same audio in every precision
+        assert other_audio != audio
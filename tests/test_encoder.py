@@ -0,0 +1,53 @@
+# tests/test_encoder.py
+
+import io
+
+import encoder
+
+
+class Process:
+    def __init__(self, key):
+        self.key = key
+        self.stdin = self.stdout = self.stderr = io.BytesIO()
+        self.killed = False
+
+    def poll(self):
+        return -9 if self.killed else None
+
+    def kill(self):
+        self.killed = True
+
+    def wait(self):
+        return self.poll()
+
+
+def test_ffmpeg_pool_keeps_the_recent_spares(monkeypatch):
+    spawned = []
+
+    def spawn(*key):
+        spawned.append(Process(key))
+        return spawned[-1]
+
+    monkeypatch.setattr(encoder.FFmpegPool, "_spawn", staticmethod(spawn))
+    pool = encoder.FFmpegPool(max_spares=2)
+    keys = [("mp3", 24000), ("opus", 24000), ("mp3", 24000), ("aac", 24000)]
+    taken = [pool.take(*key) for key in keys]
+
+    assert [process.key for process in taken] == keys
+    # The second mp3 request took the spare of the first one
+    assert taken[2] is spawned[1]
+    # The opus spare was the least recently used
+    assert [process.key for process in spawned if process.killed] == [keys[1]]
+    idle = [p for p in spawned if p not in taken and not p.killed]
+    assert [process.key for process in idle] == [keys[0], keys[3]]
+
+
+def test_ffmpeg_pool_without_spares(monkeypatch):
+    spawned = []
+    monkeypatch.setattr(
+        encoder.FFmpegPool, "_spawn", staticmethod(lambda *key: spawned.append(key))
+    )
+    pool = encoder.FFmpegPool(max_spares=0)
+    pool.take("mp3", 24000)
+    pool.take("mp3", 24000)
+    assert len(spawned) == 2
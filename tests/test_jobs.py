@@ -0,0 +1,116 @@
+# tests/test_jobs.py
+
+import time
+
+import numpy as np
+import pytest
+from conftest import VOICE
+
+import api
+import config
+import tts
+from chunk_cache import chunk_cache
+from jobs import JobManager
+from models import model_registry
+
+TEXT = "".join(f"This is sentence {i} of a long chapter. " for i in range(6))
+
+
+class Killed(Exception):
+    """The process generating the job died."""
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Makes the Stub sample from the global generators, like the models."""
+    backend = model_registry.get("Stub", config.PRECISION)
+    generate = backend.generate
+    chunks = []
+
+    def sample(text, voice, **params):
+        chunks.append(text)
+        wav = generate(text, voice, **params)
+        noise = np.random.standard_normal(len(wav)).astype(np.float32)
+        return wav + 0.05 * noise
+
+    monkeypatch.setattr(backend, "generate", sample)
+    # The runners are driven by the test
+    monkeypatch.setattr(JobManager, "start", lambda self: None)
+    return chunks
+
+
+def _submit(manager: JobManager, response_format: str) -> str:
+    request = api.parse_job_request(
+        {
+            "text": TEXT,
+            "predefined_voice_id": VOICE,
+            "model": "Stub",
+            "chunk_size": 45,
+            "seed": 1234,
+            "response_format": response_format,
+        }
+    )
+    job = manager.submit(
+        request["params"], request["response_format"], request["priority"]
+    )
+    # Nothing may come from the chunk cache of another run
+    chunk_cache.clear()
+    return job["id"]
+
+
+def _run(manager: JobManager, job_id: str) -> None:
+    claimed, lock_file = manager._claim_next()
+    assert claimed == job_id
+    try:
+        manager._generate(job_id)
+    finally:
+        lock_file.close()
+
+
+def _audio(manager: JobManager, job_id: str) -> bytes:
+    with open(manager.audio_path(job_id), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("response_format", ["wav", "pcm"])
+def test_resumed_job_matches_an_uninterrupted_run(
+    tmp_path, monkeypatch, generated, response_format
+):
+    manager = JobManager(str(tmp_path / "uninterrupted"), config.JOB_PRIORITY)
+    job_id = _submit(manager, response_format)
+    _run(manager, job_id)
+    total = manager.status(job_id)["chunks_total"]
+    assert total == len(generated) > 3
+    expected = _audio(manager, job_id)
+
+    manager = JobManager(str(tmp_path / "resumed"), config.JOB_PRIORITY)
+    job_id = _submit(manager, response_format)
+    update = manager._update
+
+    def kill_after_three_chunks(job_id, job, **changes):
+        if changes.get("chunks_done") == 3:
+            raise Killed
+        update(job_id, job, **changes)
+
+    monkeypatch.setattr(manager, "_update", kill_after_three_chunks)
+    with pytest.raises(Killed):
+        _run(manager, job_id)
+    monkeypatch.setattr(manager, "_update", update)
+    assert manager.status(job_id)["status"] == "running"
+    # The worker stops the killed job at the end of its current chunk
+    deadline = time.monotonic() + 10
+    while tts.inference_scheduler.depth() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # Another process holding the lock owns the job
+    lock_file = manager._try_lock(job_id)
+    assert manager._claim_next() == (None, None)
+    lock_file.close()
+
+    # Other generations move the global generators in between
+    np.random.standard_normal(1000)
+    generated.clear()
+    _run(manager, job_id)
+    assert len(generated) == total - 3
+    assert manager.status(job_id)["status"] == "done"
+    assert _audio(manager, job_id) == expected
@@ -0,0 +1,75 @@
+# tests/test_pytorch_backend.py
+
+from dataclasses import dataclass
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from backends.pytorch import ChatterboxBackend, cast_model  # noqa: E402
+
+
+@dataclass
+class T3Cond:
+    speaker_emb: torch.Tensor
+    emotion_adv: torch.Tensor
+
+    def to(self, *, device=None, dtype=None):
+        # Like chatterbox, casts the float tensors in place
+        for name, value in vars(self).items():
+            setattr(self, name, value.to(device=device, dtype=dtype))
+        return self
+
+
+@dataclass
+class Conditionals:
+    t3: T3Cond
+
+
+class CondEnc(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.spkr_enc = torch.nn.Linear(4, 4, bias=False)
+        self.emotion_adv_fc = torch.nn.Linear(1, 4, bias=False)
+
+
+class T3(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.cond_enc = CondEnc()
+
+
+class MultilingualModel:
+    """The conditioning path of ChatterboxMultilingualTTS.generate."""
+
+    def __init__(self):
+        self.t3 = T3()
+        self.conds = None
+
+    def generate(self, text, exaggeration=0.5, **params):
+        if float(exaggeration) != float(self.conds.t3.emotion_adv[0, 0, 0].item()):
+            self.conds.t3 = T3Cond(
+                speaker_emb=self.conds.t3.speaker_emb,
+                emotion_adv=exaggeration * torch.ones(1, 1, 1),
+            )
+        cond_enc = self.t3.cond_enc
+        embeds = cond_enc.spkr_enc(self.conds.t3.speaker_emb)
+        embeds = embeds + cond_enc.emotion_adv_fc(self.conds.t3.emotion_adv)[0]
+        return embeds.float()
+
+
+def test_bf16_voice_takes_another_exaggeration():
+    tts_model = MultilingualModel()
+    cast_model(tts_model, "Chatterbox-Multilingual", "bf16")
+    backend = ChatterboxBackend("Chatterbox-Multilingual", "bf16", tts_model)
+    voice = backend._cast_voice(
+        Conditionals(T3Cond(torch.ones(1, 4), 0.5 * torch.ones(1, 1, 1)))
+    )
+    assert voice.t3.speaker_emb.dtype == torch.bfloat16
+    assert voice.t3.emotion_adv.dtype == torch.float32
+
+    with torch.inference_mode():
+        wav = backend.generate("Hello.", voice, exaggeration=0.7, language_id="en")
+    assert wav.shape == (4,)
+    # The cached voice keeps its own exaggeration
+    assert voice.t3.emotion_adv.item() == 0.5
@@ -0,0 +1,12 @@
+# tests/test_response_cache.py
+
+import api
+import config
+from response_cache import response_cache
+
+
+def test_response_cache_key_changes_with_the_crossfade(monkeypatch):
+    params = api.parse_tts_request({"text": "Hello.", "predefined_voice_id": "test"})
+    key = response_cache.key(params["response_format"], **params["params"])
+    monkeypatch.setattr(config, "CROSSFADE_MS", config.CROSSFADE_MS + 10)
+    assert response_cache.key(params["response_format"], **params["params"]) != key
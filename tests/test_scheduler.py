@@ -0,0 +1,67 @@
+# tests/test_scheduler.py
+
+from conftest import VOICE
+
+import tts
+from models import model_registry
+from scheduler import InferenceScheduler
+
+
+def _task(text: str, seed: int = 0) -> tts.SynthesisTask:
+    return tts.SynthesisTask(
+        text=text,
+        voice=VOICE,
+        speed=1.0,
+        cfg_weight=0.5,
+        temperature=0.8,
+        exaggeration=0.5,
+        chunk_size=300,
+        seed=seed,
+        model_name="Stub",
+        language_id="en",
+    )
+
+
+def _record_batches(monkeypatch) -> list:
+    backend = model_registry.get("Stub", "fp32")
+    calls = []
+    generate_batch = backend.generate_batch
+
+    def record(texts, voice, **params):
+        calls.append(list(texts))
+        return generate_batch(texts, voice, **params)
+
+    monkeypatch.setattr(backend, "generate_batch", record)
+    return calls
+
+
+def test_queued_tasks_are_generated_in_one_batch(monkeypatch):
+    calls = _record_batches(monkeypatch)
+    scheduler = InferenceScheduler(
+        8, tts.generate_batch, batch_max_size=3, batch_wait=5
+    )
+    texts = ["First request.", "Second request.", "Third request."]
+    jobs = [scheduler.submit(_task(text)) for text in texts]
+    audio = [list(job) for job in jobs]
+
+    assert calls == [texts]
+    assert scheduler.stats()["batch_sizes"] == {3: 1}
+    # Batching doesn't change the audio of a chunk
+    backend = model_registry.get("Stub", "fp32")
+    voice = backend.prepare_voice(f"{VOICE}.wav", 0.5)
+    for text, (audio_data,) in zip(texts, audio):
+        expected = backend.generate(text, voice, exaggeration=0.5, temperature=0.8)
+        assert (tts.postprocess(audio_data) == tts.postprocess(expected)).all()
+
+
+def test_seeded_tasks_are_not_batched(monkeypatch):
+    calls = _record_batches(monkeypatch)
+    scheduler = InferenceScheduler(
+        8, tts.generate_batch, batch_max_size=3, batch_wait=5
+    )
+    jobs = [scheduler.submit(_task(text, seed=7)) for text in ("One.", "Two.")]
+    for job in jobs:
+        list(job)
+
+    assert calls == []
+    assert scheduler.stats()["batch_sizes"] == {1: 2}
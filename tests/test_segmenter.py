@@ -0,0 +1,92 @@
+# tests/test_segmenter.py
+# `utils.chunk_text_by_sentences` must produce exactly the same chunks as the
+# previous segmenter, over a corpus of edge cases and random texts.
+
+import random
+
+import pytest
+from legacy_segmenter import legacy_chunk_text_by_sentences
+
+from utils import chunk_text_by_sentences
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "\n\r\n\t",
+    "Hello",
+    "Hello.",
+    "Hello. World.",
+    "Hello.World. Again",
+    "It costs 3.14 dollars. Then .5 more. Version v1.0.2 is out. So is 2.3.4.",
+    "Numbers end sentences too: it was 42. Next one.",
+    "Mr. Smith met Dr. Jones at 5 p.m. on Main St. yesterday.",
+    "The U.S. and the U.K. signed it in 1999 A.D. It took ca. 3 years, i.e. ages.",
+    "MR. LOUD SPOKE. Prof. Quiet did not. etc. etc.",
+    "Wait... what?! Really?? Yes!!! Fine.. ok.",
+    "Ellipsis at the end...",
+    "...leading dots. And more",
+    'He said "Stop." Then "Go!" and \'why?\' she asked. Done."',
+    "Quotes after punctuation.' Trailing quote.\"",
+    "Line one.\nLine two!\r\nLine three?\rLine four",
+    "Intro text.\n- first item. with two sentences\n- second item\n* star item\n"
+    "• dot item\n1. numbered item\n2. another one. Outro text! Bye.",
+    "No bullets - just dashes - in the middle. 1. Not a list either.",
+    "  \n  - indented bullet\n  - another\nafter the list. Final.",
+    "- starts with a bullet\n- next one",
+    "1. first\n\n2. second\n\n\n3. third. With more.",
+    "(laughs) Hello there. (sighs) (clears throat) Okay then (pause). End.",
+    "Cue at the end (laughs)",
+    "(whispers)",
+    "Unbalanced (parenthesis. And (more) text.",
+    "Unicode: naïve café. Ünïcödé Straße! 日本語です。 Fin.",
+    "Tabs\tand non-breaking spaces. Next sentence.",
+    "verylongwordwithoutanyspacesatallandaperiodattheend. next",
+    "abcdefghijmr. x",
+    "x Mr. y mr.z MR.\tQ",
+    "Done.\n",
+    "Done.  \n\n  ",
+    "a.b.c. d.e. f.",
+    "!?.!?. ?!",
+    ". . . .",
+    "'. \". '",
+    "Sentence one. " * 40,
+    "A" * 600 + ". Short. " + "B " * 300 + "end.",
+]
+
+CHUNK_SIZES = [0, -1, 1, 10, 30, 100, 250, 1000]
+
+TOKENS = [
+    "word", "Hello", "the", "é", "日本", "Mr.", "dr.", "Prof.", "U.S.", "a.m.",
+    "etc.", "e.g.", "i.e.", "3.14", ".5", "v1.0.2", "2.", "42", "...", "..",
+    ".", "!", "?", "?!", '"', "'", "(laughs)", "(sighs)", "(", ")", "-", "*",
+    "•", "1.", "12.",
+]  # fmt: skip
+SEPARATORS = [" ", " ", " ", "", "  ", "\n", "\r\n", "\r", "\t", "\n  "]
+
+
+def random_text(rng: random.Random, length: int) -> str:
+    parts = []
+    for _ in range(length):
+        parts.append(rng.choice(TOKENS))
+        parts.append(rng.choice(SEPARATORS))
+    return "".join(parts)
+
+
+def _random_texts(count: int) -> list:
+    rng = random.Random(0)
+    texts = [random_text(rng, rng.randint(1, 200)) for _ in range(count)]
+    return texts + [random_text(rng, 5000)]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("text", EDGE_CASES, ids=range(len(EDGE_CASES)))
+def test_edge_cases_match_the_previous_segmenter(text, chunk_size):
+    expected = legacy_chunk_text_by_sentences(text, chunk_size)
+    assert chunk_text_by_sentences(text, chunk_size) == expected
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_random_texts_match_the_previous_segmenter(chunk_size):
+    for text in _random_texts(2000):
+        expected = legacy_chunk_text_by_sentences(text, chunk_size)
+        assert chunk_text_by_sentences(text, chunk_size) == expected, text
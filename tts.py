@@ -1,15 +1,394 @@
-import io
-import numpy as np
-import wave
-from pydub import AudioSegment
+import time
+from collections import deque
 import utils
 import config
+import encoder
+import metrics
+from backends import BATCH, STREAM
+from chunk_cache import chunk_cache, chain_digest
+from conditionals import conditionals_cache
+from models import model_registry
+from scheduler import InferenceJob, InferenceScheduler
+from stitcher import ChunkStitcher
 
-_cached_tts_model = None
-_current_model_name = None
+# Stages of the pipeline of a request. Text chunking runs on the request
+# thread before queueing, synthesis on the inference worker, and
+# post-processing and encoding of a chunk on the request thread while the
+# worker synthesizes the next one.
+PIPELINE_STAGES = ("chunking", "queue", "synthesis", "postprocess", "encode")
 
+# Measured synthesis time per character of each model, averaged over the
+# recent chunks, to estimate the remaining work of a request
+synthesis_rates = {}
 
-def generate_audio(
+
+def _update_synthesis_rate(model_name: str, seconds: float, chars: int) -> None:
+    rate = seconds / max(1, chars)
+    previous = synthesis_rates.get(model_name)
+    if previous is not None:
+        rate = 0.8 * previous + 0.2 * rate
+    synthesis_rates[model_name] = rate
+
+
+def estimate_synthesis_seconds(model_name: str, chars: int) -> float:
+    """Estimated synthesis time of `chars` characters, 0 until measured."""
+    return synthesis_rates.get(model_name, 0.0) * chars
+
+
+# Shortest first chunk picked from a target latency, shorter chunks are mostly
+# model overhead and sound choppy
+MIN_FIRST_CHUNK_SIZE = 20
+
+
+def adaptive_first_chunk_size(
+    model_name: str, chunk_size: int, first_chunk_size: int, target_latency: float
+) -> int:
+    """
+    Maximum length of the first chunk: the characters the model synthesizes
+    in `target_latency` seconds once its speed is measured, otherwise
+    `first_chunk_size`.
+    """
+    rate = synthesis_rates.get(model_name)
+    if target_latency > 0 and rate:
+        size = max(MIN_FIRST_CHUNK_SIZE, int(target_latency / rate))
+        return min(size, chunk_size)
+    return first_chunk_size
+
+
+class SynthesisTask:
+    """
+    Generation of one request, run chunk by chunk on the inference worker.
+    Tasks with the same `batch_key` have their chunks generated together.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        voice: str,
+        speed: float,
+        cfg_weight: float,
+        temperature: float,
+        exaggeration: float,
+        chunk_size: int,
+        seed: int,
+        model_name: str,
+        language_id: str,
+        first_chunk_size: int = 0,
+        target_latency: float = 0.0,
+        stream_tokens: int = 0,
+        precision: str = config.PRECISION,
+    ):
+        self.text = text
+        self.voice = voice
+        self.speed = speed
+        self.cfg_weight = cfg_weight
+        self.temperature = temperature
+        self.exaggeration = exaggeration
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.model_name = model_name
+        self.language_id = language_id
+        self.precision = precision
+        # Speech tokens per streamed piece of a chunk, 0 streams whole chunks
+        self.stream_tokens = stream_tokens
+        # Whether the backend generates several chunks in one call, known
+        # once the model is loaded by start()
+        self.batchable = False
+        # Set by the inference job, hands out audio before its chunk is done
+        self.output = None
+        self.position = 0
+        self.rng_state = None
+        self.timings = dict.fromkeys(PIPELINE_STAGES, 0.0)
+        # Digest of the chunks generated so far, for the chunk cache keys
+        self.prefix = ""
+        # Chunk cache entries to store once their audio is post-processed,
+        # and whether they are a piece of a chunk
+        self.uncached = deque()
+
+        start = time.perf_counter()
+        self.chunks = utils.chunk_text_by_sentences(
+            text,
+            chunk_size,
+            adaptive_first_chunk_size(
+                model_name, chunk_size, first_chunk_size, target_latency
+            ),
+            config.CHUNK_GROWTH,
+        )
+        self.submitted = time.perf_counter()
+        self.timings["chunking"] = self.submitted - start
+        metrics.CHUNKING_SECONDS.observe(
+            self.timings["chunking"], model=model_name, voice=voice
+        )
+
+    @property
+    def batch_key(self):
+        params = (
+            self.model_name,
+            self.precision,
+            self.voice,
+            self.exaggeration,
+            self.cfg_weight,
+            self.temperature,
+            self.language_id if self.model_name == "Chatterbox-Multilingual" else None,
+        )
+        # A seeded request has its own RNG stream and a streamed chunk is
+        # generated on its own, so they are never batched
+        if self.seed != 0 or self.stream_tokens:
+            return params + (id(self),)
+        return params
+
+    @property
+    def done(self) -> bool:
+        return self.position >= len(self.chunks)
+
+    def start(self) -> int:
+        """Loads the model, returns the sample rate."""
+        self.timings["queue"] = time.perf_counter() - self.submitted
+        backend = model_registry.get(self.model_name, self.precision)
+        self.batchable = BATCH in backend.capabilities
+        return int(backend.sample_rate * self.speed)
+
+    def report_timings(self) -> None:
+        wall = time.perf_counter() - self.submitted + self.timings["chunking"]
+        busy = sum(self.timings.values())
+        stages = ", ".join(f"{k} {v:.3f}s" for k, v in self.timings.items())
+        # Time spent in stages that ran at the same time as another one
+        print(
+            f"Pipeline timings: {stages}, wall {wall:.3f}s, "
+            f"overlapped {max(0.0, busy - wall):.3f}s"
+        )
+
+    def next_chunk(self) -> str:
+        chunk = self.chunks[self.position]
+        self.position += 1
+        return chunk
+
+    def remaining_seconds(self) -> float:
+        """Estimated synthesis time of the chunks not generated yet."""
+        chars = sum(len(chunk) for chunk in self.chunks[self.position :])
+        return estimate_synthesis_seconds(self.model_name, chars)
+
+    def cache_key(self, chunk: str):
+        """Chunk cache key of `chunk`, the chunk that was just taken."""
+        prefix = self.prefix
+        self.prefix = chain_digest(prefix, chunk)
+        return chunk_cache.key(self, chunk, prefix)
+
+    def store_chunk(self, audio_data) -> bool:
+        """
+        Stores the PCM of the oldest chunk generated by the model. Returns
+        False when it is only a piece of a chunk still being generated.
+        """
+        key, rng_state, piece = self.uncached.popleft()
+        if key is not None:
+            chunk_cache.put(key, audio_data, rng_state)
+        return not piece
+
+    def expected_samples(self, num_samples: int) -> int:
+        """Estimated length of the audio, from the `num_samples` of chunk 0."""
+        chars = sum(len(chunk) for chunk in self.chunks)
+        # With some margin, as the pace of speech varies between chunks
+        return int(num_samples * chars / max(1, len(self.chunks[0])) * 1.1)
+
+
+def generate_batch(tasks: list) -> list:
+    """
+    Runs on the inference worker. Generates the next chunk of each task, which
+    all share the same batch_key, and returns the audio of each chunk: the
+    int16 PCM of chunks found in the chunk cache, the float waveform of the
+    others. Models that implement `generate_batch` get all the chunks in one
+    call, the others generate them one after the other.
+    """
+    audio = [None] * len(tasks)
+    misses = []
+    for i, batch_task in enumerate(tasks):
+        chunk = batch_task.next_chunk()
+        key = batch_task.cache_key(chunk) if chunk_cache.enabled else None
+        entry = chunk_cache.get(key) if key is not None else None
+        if entry is None:
+            misses.append((i, chunk, key))
+            continue
+        print(f"Using cached audio for chunk: {chunk}")
+        audio[i], rng_state = entry
+        if batch_task.seed != 0:
+            batch_task.rng_state = rng_state
+    if not misses:
+        return audio
+
+    import torch
+
+    # The models are only run forward, without the autograd bookkeeping
+    with torch.inference_mode():
+        return _generate_misses(tasks, audio, misses)
+
+
+def _generate_misses(tasks: list, audio: list, misses: list) -> list:
+    """Generates the `(i, chunk, key)` chunks missing from the chunk cache."""
+    task = tasks[0]
+    backend = model_registry.get(task.model_name, task.precision)
+    sample_rate = backend.sample_rate
+
+    if task.seed != 0:
+        # For reproducibility, resume the seeded RNG stream of this request
+        if task.rng_state is None:
+            utils.set_seed(task.seed)
+        else:
+            utils.set_rng_state(task.rng_state)
+
+    # Reuse the voice conditionals instead of re-embedding the reference wav
+    voice = conditionals_cache.get(
+        backend, task.model_name, task.voice, task.exaggeration, task.precision
+    )
+
+    chunks = [chunk for _, chunk, _ in misses]
+    params = dict(
+        exaggeration=task.exaggeration,
+        temperature=task.temperature,
+        cfg_weight=task.cfg_weight,
+        seed=task.seed,
+        **(
+            {"language_id": task.language_id}
+            if task.model_name == "Chatterbox-Multilingual"
+            else {}
+        ),
+    )
+
+    labels = dict(model=task.model_name, voice=task.voice)
+    start = time.perf_counter()
+    if task.stream_tokens and STREAM in backend.capabilities:
+        print(f"Streaming audio for chunk: {chunks[0]}")
+
+        def emit(wav):
+            # Pieces are not stored in the chunk cache, only whole chunks
+            task.uncached.append((None, task.rng_state, True))
+            metrics.AUDIO_SECONDS.inc(len(wav) / (sample_rate * task.speed), **labels)
+            task.output(wav)
+
+        wavs = [backend.stream(chunks[0], voice, task.stream_tokens, emit, **params)]
+        misses = [(i, chunk, None) for i, chunk, _ in misses]
+        metrics.CHUNK_GENERATION_SECONDS.observe(time.perf_counter() - start, **labels)
+    elif len(chunks) > 1 and BATCH in backend.capabilities:
+        print(f"Generating audio for a batch of {len(chunks)} chunks")
+        wavs = backend.generate_batch(chunks, voice, **params)
+        per_chunk = (time.perf_counter() - start) / len(chunks)
+        for _ in chunks:
+            metrics.CHUNK_GENERATION_SECONDS.observe(per_chunk, **labels)
+    else:
+        wavs = []
+        for chunk in chunks:
+            print(f"Generating audio for chunk: {chunk}")
+            chunk_start = time.perf_counter()
+            wavs.append(backend.generate(chunk, voice, **params))
+            metrics.CHUNK_GENERATION_SECONDS.observe(
+                time.perf_counter() - chunk_start, **labels
+            )
+
+    elapsed = time.perf_counter() - start
+    metrics.SYNTHESIS_SECONDS.inc(elapsed, **labels)
+    metrics.CHUNKS.inc(len(chunks), **labels)
+    metrics.CHARACTERS.inc(sum(len(chunk) for chunk in chunks), **labels)
+    for batch_task in tasks:
+        batch_task.timings["synthesis"] += elapsed
+    _update_synthesis_rate(
+        task.model_name, elapsed, sum(len(chunk) for chunk in chunks)
+    )
+
+    if task.seed != 0:
+        task.rng_state = utils.get_rng_state()
+
+    for (i, _, key), wav in zip(misses, wavs):
+        audio[i] = wav
+        tasks[i].uncached.append((key, tasks[i].rng_state, False))
+        metrics.AUDIO_SECONDS.inc(
+            len(audio[i]) / (sample_rate * tasks[i].speed), **labels
+        )
+    return audio
+
+
+def postprocess(wav):
+    """
+    Converts a float waveform to an int16 PCM numpy array. The waveform is
+    scaled in place when it is writeable, it is not used afterwards.
+    """
+    import numpy as np
+
+    if wav.dtype == np.int16:
+        # Already post-processed, from the chunk cache
+        return wav
+    out = wav if wav.flags.writeable else None
+    audio_data = np.clip(wav, -1.0, 1.0, out=out)  # Clip to prevent saturation
+    return np.multiply(audio_data, 32767, out=audio_data).astype(np.int16)
+
+
+def join_audio(parts: list):
+    """Joins encoded audio, without copying a file that is in one part."""
+    return parts[0] if len(parts) == 1 else b"".join(parts)
+
+
+def encode_audio_stream(
+    audio_stream: InferenceJob, response_format: str, streaming: bool = True
+):
+    """
+    Post-processes and encodes each chunk as soon as the inference worker
+    produces it, while the worker goes on with the next chunk. Chunks are
+    crossfaded over CROSSFADE_MS. Yields the encoded audio.
+    """
+    task = audio_stream.task
+    timings = task.timings
+    labels = dict(model=task.model_name, voice=task.voice, format=response_format)
+    sample_rate = audio_stream.sample_rate
+    audio_encoder = encoder.open_encoder(response_format, sample_rate, streaming)
+    stitcher = ChunkStitcher(config.CROSSFADE_MS * sample_rate // 1000)
+    first = True
+    try:
+        for wav in audio_stream:
+            start = time.perf_counter()
+            audio_data = postprocess(wav)
+            chunk_end = True
+            if audio_data is not wav:
+                chunk_end = task.store_chunk(audio_data)
+            if first:
+                audio_encoder.reserve(task.expected_samples(len(audio_data)))
+                first = False
+            parts = stitcher.add(audio_data, chunk_end)
+            encode_start = time.perf_counter()
+            data = b"".join(audio_encoder.write(part) for part in parts if len(part))
+            end = time.perf_counter()
+            timings["postprocess"] += encode_start - start
+            timings["encode"] += end - encode_start
+            metrics.POSTPROCESS_SECONDS.observe(encode_start - start, **labels)
+            metrics.ENCODE_SECONDS.observe(end - encode_start, **labels)
+            if data:
+                yield data
+
+        if audio_stream.cancelled:
+            # The client went away, the audio is incomplete and not reported
+            audio_encoder.abort()
+            return
+
+        start = time.perf_counter()
+        # The complete file of the wav and pcm encoders is yielded as is
+        data = [audio_encoder.write(part) for part in stitcher.flush()]
+        data.append(audio_encoder.close())
+        timings["encode"] += time.perf_counter() - start
+        for item in data:
+            if item:
+                yield item
+    except BaseException:
+        audio_stream.cancel()
+        audio_encoder.abort()
+        raise
+    task.report_timings()
+    metrics.observe_request(
+        task.model_name,
+        task.voice,
+        response_format,
+        time.perf_counter() - task.submitted + timings["chunking"],
+        cache="miss",
+    )
+
+
+def generate_audio_stream(
     text: str,
     voice: str,
     speed: float = 1.0,
@@ -20,92 +399,83 @@ def generate_audio(
     seed: int = 0,
     model_name: str = config.MODEL,
     language_id: str = config.LANGUAGE_ID,
-):
-    global _cached_tts_model, _current_model_name
-
-    if _current_model_name != model_name:
-        print(f"Loading model: {model_name}")
-        if model_name == "Chatterbox-Turbo":
-            from chatterbox.tts_turbo import ChatterboxTurboTTS as ChatterboxTTS
-        elif model_name == "Chatterbox":
-            from chatterbox.tts import ChatterboxTTS
-        elif model_name == "Chatterbox-Multilingual":
-            from chatterbox.mtl_tts import ChatterboxMultilingualTTS as ChatterboxTTS
-        else:
-            raise ValueError(f"Unknown model: {model_name}")
+    priority: int = config.DEFAULT_PRIORITY,
+    first_chunk_size: int = config.FIRST_CHUNK_SIZE,
+    target_latency: float = config.TARGET_LATENCY,
+    stream_tokens: int = 0,
+    precision: str = config.PRECISION,
+) -> InferenceJob:
+    """
+    Queues the generation on the inference worker. The returned job yields
+    the float waveform of each chunk and gives the `sample_rate` of the audio.
+    Raises QueueFullError when the queue is full.
+    """
+    task = SynthesisTask(
+        text,
+        voice,
+        speed,
+        cfg_weight,
+        temperature,
+        exaggeration,
+        chunk_size,
+        seed,
+        model_name,
+        language_id,
+        first_chunk_size,
+        target_latency,
+        stream_tokens,
+        precision,
+    )
+    return inference_scheduler.submit(task, priority)
 
-        _cached_tts_model = ChatterboxTTS.from_pretrained(config.DEVICE)
-        _current_model_name = model_name
-    else:
-        print(f"Using cached model: {model_name}")
 
-    tts_model = _cached_tts_model
-
-    if seed != 0:
-        utils.set_seed(seed)  # For reproducibility
-
-    voice_file = config.AUDIO_PROMPT_PATH + f"{voice}.wav"
-
-    all_audio_data = []
-
-    chunks = utils.chunk_text_by_sentences(text, chunk_size)
-
-    # split in chunks
-    for chunk in chunks:
-        print(f"Generating audio for chunk: {chunk}")
+def generate_audio(
+    text: str,
+    voice: str,
+    speed: float = 1.0,
+    cfg_weight: float = config.AUDIO_CFG_WEIGHT,
+    temperature: float = config.AUDIO_TEMPERATURE,
+    exaggeration: float = config.AUDIO_EXAGGERATION,
+    chunk_size: int = 250,
+    seed: int = 0,
+    model_name: str = config.MODEL,
+    language_id: str = config.LANGUAGE_ID,
+    response_format: str = "wav",
+    priority: int = config.DEFAULT_PRIORITY,
+    first_chunk_size: int = config.FIRST_CHUNK_SIZE,
+    target_latency: float = config.TARGET_LATENCY,
+    stream_tokens: int = 0,
+    precision: str = config.PRECISION,
+):
+    """
+    Returns the audio file in `response_format`. Each chunk is handed to the
+    encoder as soon as it is generated, so encoding overlaps with synthesis.
+    """
+    audio_stream = generate_audio_stream(
+        text,
+        voice,
+        speed,
+        cfg_weight,
+        temperature,
+        exaggeration,
+        chunk_size,
+        seed,
+        model_name,
+        language_id,
+        priority,
+        first_chunk_size,
+        target_latency,
+        stream_tokens,
+        precision,
+    )
+    return join_audio(
+        list(encode_audio_stream(audio_stream, response_format, streaming=False))
+    )
 
-        # Generate the waveform
-        wav = tts_model.generate(
-            chunk,
-            audio_prompt_path=voice_file,
-            exaggeration=exaggeration,
-            temperature=temperature,
-            cfg_weight=cfg_weight,
-            **(
-                {"language_id": language_id}
-                if model_name == "Chatterbox-Multilingual"
-                else {}
-            ),
-        )
 
-        audio_data = wav.squeeze(0).numpy()
-        audio_data = np.clip(audio_data, -1.0, 1.0)  # Clip to prevent saturation
-        audio_data = (audio_data * 32767).astype(np.int16)
-        all_audio_data.append(audio_data)
-
-    audio_data = np.concatenate(all_audio_data)
-
-    # Create a BytesIO object to write the WAV file
-    wav_io = io.BytesIO()
-    with wave.open(wav_io, "wb") as wf:
-        wf.setnchannels(1)  # Mono
-        wf.setsampwidth(2)  # 2 bytes for int16
-        wf.setframerate(int(tts_model.sr * speed))  # Sample rate (adjust as needed)
-        wf.writeframes(audio_data.tobytes())
-
-    wav_io.seek(0)
-    return wav_io.getvalue()  # Return the bytes of the WAV file
-
-
-def convert_audio_format(audio_data, response_format):
-    if response_format == "wav":
-        return audio_data
-
-    # Convert the audio data to the desired format using pydub
-    audio_segment = AudioSegment.from_wav(io.BytesIO(audio_data))
-
-    # Convert to the desired format
-    output_io = io.BytesIO()
-    if response_format == "mp3":
-        audio_segment.export(output_io, format="mp3")
-    elif response_format == "flac":
-        audio_segment.export(output_io, format="flac")
-    elif response_format == "opus":
-        audio_segment.export(output_io, format="opus")
-    elif response_format == "aac":
-        audio_segment.export(output_io, format="aac")
-    elif response_format == "pcm":
-        audio_segment.export(output_io, format="raw")  # PCM is raw audio
-
-    output_io.seek(0)
-    return output_io.getvalue()
+inference_scheduler = InferenceScheduler(
+    config.QUEUE_MAX_SIZE,
+    generate_batch,
+    batch_max_size=config.BATCH_MAX_SIZE,
+    batch_wait=config.BATCH_WAIT_MS / 1000,
+)
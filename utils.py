@@ -13,13 +13,13 @@ import random
 # import io
 # import uuid
 # from pathlib import Path
-from typing import Optional, Tuple, Set, List
+from typing import Iterator, Set, List
 # from pydub import AudioSegment
 
 # import soundfile as sf
 # import torchaudio  # For saving PyTorch tensors and potentially speed adjustment.
-import torch
-import numpy as np
+# torch and numpy are imported by the functions that use them, so that
+# importing the text utilities stays fast.
 
 # Configuration manager to get paths dynamically.
 # Assumes config.py and its config_manager are in the same directory or accessible via PYTHONPATH.
@@ -182,16 +182,12 @@ ABBREVIATIONS: Set[str] = {
 }
 
 # Regex patterns (pre-compiled for efficiency in text processing).
-NUMBER_DOT_NUMBER_PATTERN = re.compile(
-    r"(?<!\d\.)\d*\.\d+"
-)  # Matches numbers like 3.14, .5, 123.456
-VERSION_PATTERN = re.compile(
-    r"[vV]?\d+(\.\d+)+"
-)  # Matches version numbers like v1.0.2, 2.3.4
-# Pattern to find potential sentence endings (punctuation followed by quote/space/end of string).
-POTENTIAL_END_PATTERN = re.compile(r'([.!?])(["\']?)(\s+|$)')
+# Pattern to find potential sentence endings (punctuation and an optional closing
+# quote, followed by whitespace or the end of the string).
+POTENTIAL_END_PATTERN = re.compile(r'([.!?]["\']?)(?:\s+|$)')
 # Pattern to detect start-of-line bullet points or numbered lists.
 BULLET_POINT_PATTERN = re.compile(r"(?:^|\n)\s*([-•*]|\d+\.)\s+")
+LINE_BULLET_POINT_PATTERN = re.compile(r"\n\s*([-•*]|\d+\.)\s+")
 # Placeholder for non-verbal cues or special instructions within text (e.g., (laughs), (sighs)).
 NON_VERBAL_CUE_PATTERN = re.compile(r"(\([\w\s'-]+\))")
 
@@ -721,91 +717,57 @@ NON_VERBAL_CUE_PATTERN = re.compile(r"(\([\w\s'-]+\))")
 
 
 # --- Text Processing Utilities ---
-def _is_valid_sentence_end(text: str, period_index: int) -> bool:
+def _is_abbreviation(text: str, period_index: int) -> bool:
     """
-    Checks if a period at a given index in the text is likely a valid sentence terminator,
-    rather than part of an abbreviation, number, or version string.
+    Checks if the word ending with the period at a given index in the text, looked
+    up to 10 characters back, is a known abbreviation rather than a sentence end.
     """
-    word_start_before_period = period_index - 1
-    scan_limit = max(0, period_index - 10)
-    while (
-        word_start_before_period >= scan_limit
-        and not text[word_start_before_period].isspace()
-    ):
-        word_start_before_period -= 1
-    word_before_period = text[word_start_before_period + 1 : period_index + 1].lower()
-    if word_before_period in ABBREVIATIONS:
+    before_period = text[max(0, period_index - 10) : period_index]
+    if not before_period or before_period[-1].isspace():
         return False
-
-    context_start = max(0, period_index - 10)
-    context_end = min(len(text), period_index + 10)
-    context_segment = text[context_start:context_end]
-    relative_period_index_in_context = period_index - context_start
-
-    for pattern in [NUMBER_DOT_NUMBER_PATTERN, VERSION_PATTERN]:
-        for match in pattern.finditer(context_segment):
-            if match.start() <= relative_period_index_in_context < match.end():
-                is_last_char_of_numeric_match = (
-                    relative_period_index_in_context == match.end() - 1
-                )
-                is_followed_by_space_or_eos = (
-                    period_index + 1 == len(text) or text[period_index + 1].isspace()
-                )
-                if not (is_last_char_of_numeric_match and is_followed_by_space_or_eos):
-                    return False
-    return True
+    word_before_period = before_period.rsplit(None, 1)[-1] + "."
+    return word_before_period.lower() in ABBREVIATIONS
 
 
 def _split_text_by_punctuation(text: str) -> List[str]:
     """
-    Splits text into sentences based on common punctuation marks (.!?),
-    while trying to avoid splitting on periods used in abbreviations or numbers.
+    Splits text into sentences based on common punctuation marks (.!?) in a single
+    pass, while trying to avoid splitting on periods used in abbreviations or
+    ellipses. Periods inside numbers or versions (3.14, v1.0.2) are never followed
+    by whitespace, so they are not sentence ends in the first place.
     """
     sentences: List[str] = []
     last_split_index = 0
-    text_length = len(text)
 
     for match in POTENTIAL_END_PATTERN.finditer(text):
-        punctuation_char_index = match.start(1)
-        punctuation_char = text[punctuation_char_index]
-        slice_end_after_punctuation = match.start(1) + 1 + len(match.group(2) or "")
-
-        if punctuation_char in ["!", "?"]:
-            current_sentence_text = text[
-                last_split_index:slice_end_after_punctuation
-            ].strip()
-            if current_sentence_text:
-                sentences.append(current_sentence_text)
-            last_split_index = match.end()
+        punctuation_char_index = match.start()
+        if text[punctuation_char_index] == "." and (
+            (punctuation_char_index > 0 and text[punctuation_char_index - 1] == ".")
+            or _is_abbreviation(text, punctuation_char_index)
+        ):
             continue
-
-        if punctuation_char == ".":
-            if (
-                punctuation_char_index > 0 and text[punctuation_char_index - 1] == "."
-            ) or (
-                punctuation_char_index < text_length - 1
-                and text[punctuation_char_index + 1] == "."
-            ):
-                continue
-
-            if _is_valid_sentence_end(text, punctuation_char_index):
-                current_sentence_text = text[
-                    last_split_index:slice_end_after_punctuation
-                ].strip()
-                if current_sentence_text:
-                    sentences.append(current_sentence_text)
-                last_split_index = match.end()
+        current_sentence_text = text[last_split_index : match.end(1)].strip()
+        if current_sentence_text:
+            sentences.append(current_sentence_text)
+        last_split_index = match.end()
 
     remaining_text_segment = text[last_split_index:].strip()
     if remaining_text_segment:
         sentences.append(remaining_text_segment)
-
-    sentences = [s for s in sentences if s]
-    if not sentences and text.strip():
-        return [text.strip()]
     return sentences
 
 
+def _find_bullet_points(text: str) -> List[re.Match]:
+    """
+    Finds the same bullet points as BULLET_POINT_PATTERN.finditer(text), but only
+    tries "^" at the start of the text and searches the rest from the line breaks.
+    """
+    first_match = BULLET_POINT_PATTERN.match(text)
+    if first_match is None:
+        return list(LINE_BULLET_POINT_PATTERN.finditer(text))
+    return [first_match, *LINE_BULLET_POINT_PATTERN.finditer(text, first_match.end())]
+
+
 def split_into_sentences(text: str) -> List[str]:
     """
     Splits a given text into sentences. Handles normalization of line breaks
@@ -816,7 +778,7 @@ def split_into_sentences(text: str) -> List[str]:
         return []
 
     text = text.replace("\r\n", "\n").replace("\r", "\n")
-    bullet_point_matches = list(BULLET_POINT_PATTERN.finditer(text))
+    bullet_point_matches = _find_bullet_points(text)
 
     if bullet_point_matches:
         logger.debug("Bullet points detected in text; splitting by bullet items.")
@@ -859,50 +821,26 @@ def split_into_sentences(text: str) -> List[str]:
         return _split_text_by_punctuation(text)
 
 
-def _preprocess_and_segment_text(full_text: str) -> List[Tuple[Optional[str], str]]:
+def _iter_segments(full_text: str) -> Iterator[str]:
     """
-    Internal helper to segment text by non-verbal cues (e.g., (laughs)) and then
-    further split those segments into sentences.
-    Assigns a placeholder "tag" (here, None or empty string) as this system is single-speaker.
-    The tuple structure (tag, sentence) is maintained for compatibility with chunking logic
-    that might expect it, even if the tag itself isn't used for speaker differentiation.
-
-    Args:
-        full_text: The complete input text.
-
-    Returns:
-        A list of tuples, where each tuple is (placeholder_tag, sentence_text).
+    Yields the non-verbal cues (e.g., (laughs)) and the sentences of the text in
+    order, so that chunks can be packed while the text is being segmented.
+    Splitting on the capturing cue pattern puts the cues at the odd indices.
     """
-    if not full_text or full_text.isspace():
-        return []
-
-    placeholder_tag: Optional[str] = None
-    segmented_with_tags: List[Tuple[Optional[str], str]] = []
-    parts_and_cues = NON_VERBAL_CUE_PATTERN.split(full_text)
-
-    for part in parts_and_cues:
+    for index, part in enumerate(NON_VERBAL_CUE_PATTERN.split(full_text)):
         if not part or part.isspace():
             continue
-        if NON_VERBAL_CUE_PATTERN.fullmatch(part):
-            segmented_with_tags.append((placeholder_tag, part.strip()))
+        if index % 2:
+            yield part.strip()
         else:
-            sentences_from_part = split_into_sentences(part.strip())
-            for sentence in sentences_from_part:
-                if sentence:
-                    segmented_with_tags.append((placeholder_tag, sentence))
-
-    if not segmented_with_tags and full_text.strip():
-        segmented_with_tags.append((placeholder_tag, full_text.strip()))
-
-    logger.debug(
-        f"Preprocessed text into {len(segmented_with_tags)} segments/sentences."
-    )
-    return segmented_with_tags
+            yield from split_into_sentences(part.strip())
 
 
 def chunk_text_by_sentences(
     full_text: str,
     chunk_size: int,
+    first_chunk_size: int = 0,
+    growth: float = 2.0,
 ) -> List[str]:
     """
     Chunks text into manageable pieces for TTS processing, respecting sentence boundaries
@@ -913,6 +851,11 @@ def chunk_text_by_sentences(
         full_text: The complete text to be chunked.
         chunk_size: The desired maximum character length for each chunk.
                     Sentences longer than this will form their own chunk.
+        first_chunk_size: The maximum length of the first chunk when smaller than
+                    chunk_size, so that the first audio is ready sooner. The limit
+                    of each next chunk is `growth` times the previous one, up to
+                    chunk_size. 0 gives every chunk the same chunk_size limit.
+        growth: The factor between the limits of consecutive chunks.
 
     Returns:
         A list of text chunks, ready for TTS.
@@ -921,39 +864,35 @@ def chunk_text_by_sentences(
         return []
     if chunk_size <= 0:
         chunk_size = float("inf")
-
-    processed_segments = _preprocess_and_segment_text(full_text)
-    if not processed_segments:
-        return []
+    limit = first_chunk_size if 0 < first_chunk_size < chunk_size else chunk_size
 
     text_chunks: List[str] = []
     current_chunk_sentences: List[str] = []
     current_chunk_length = 0
 
-    for (
-        _,
-        segment_text,
-    ) in processed_segments:
+    for segment_text in _iter_segments(full_text):
         segment_len = len(segment_text)
 
         if not current_chunk_sentences:
             current_chunk_sentences.append(segment_text)
             current_chunk_length = segment_len
-        elif current_chunk_length + 1 + segment_len <= chunk_size:
+        elif current_chunk_length + 1 + segment_len <= limit:
             current_chunk_sentences.append(segment_text)
             current_chunk_length += 1 + segment_len
         else:
             if current_chunk_sentences:
                 text_chunks.append(" ".join(current_chunk_sentences))
+                limit = min(chunk_size, limit * growth)
             current_chunk_sentences = [segment_text]
             current_chunk_length = segment_len
 
-        if current_chunk_length > chunk_size and len(current_chunk_sentences) == 1:
+        if current_chunk_length > limit and len(current_chunk_sentences) == 1:
             logger.info(
-                f"A single segment (length {current_chunk_length}) exceeds chunk_size {chunk_size}. "
+                f"A single segment (length {current_chunk_length}) exceeds chunk_size {limit}. "
                 f"It will form its own chunk."
             )
             text_chunks.append(" ".join(current_chunk_sentences))
+            limit = min(chunk_size, limit * growth)
             current_chunk_sentences = []
             current_chunk_length = 0
 
@@ -977,6 +916,9 @@ def set_seed(seed_value: int):
     Sets the seed for torch, random, and numpy for reproducibility.
     This is called if a non-zero seed is provided for generation.
     """
+    import numpy as np
+    import torch
+
     torch.manual_seed(seed_value)
     if torch.cuda.is_available():
         torch.cuda.manual_seed(seed_value)
@@ -988,6 +930,36 @@ def set_seed(seed_value: int):
     logger.info(f"Global seed set to: {seed_value}")
 
 
+def get_rng_state() -> dict:
+    """
+    Returns the state of the torch, random and numpy generators, so that a
+    seeded generation can be resumed after other generations used them.
+    """
+    import numpy as np
+    import torch
+
+    state = {
+        "torch": torch.get_rng_state(),
+        "random": random.getstate(),
+        "numpy": np.random.get_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: dict):
+    """Restores generator states returned by get_rng_state."""
+    import numpy as np
+    import torch
+
+    torch.set_rng_state(state["torch"])
+    random.setstate(state["random"])
+    np.random.set_state(state["numpy"])
+    if "cuda" in state:
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
 # --- File System Utilities ---
 # def get_valid_reference_files() -> List[str]:
 #     """
@@ -0,0 +1,117 @@
+# warmup.py
+# Startup warmup, run in the background while the server already answers its
+# liveness checks: loads WARMUP_MODELS and config.MODEL in each of the
+# PRECISIONS, builds the conditionals of the supported voices, then
+# synthesizes a short sentence with each variant to warm up the kernels, so
+# that the first requests don't pay for any of it.
+# GET /health/ready answers 503 until the warmup is done, and so do the
+# speech endpoints, so that nothing is generated on a model while it is
+# being prepared.
+
+import threading
+import time
+
+import config
+import tts
+from conditionals import conditionals_cache
+from models import model_registry
+
+WARMUP_TEXT = "Hello, this is a warmup."
+
+
+class WarmingUpError(Exception):
+    """The server is not ready to generate yet, answered with a 503."""
+
+
+def warmup_models() -> list:
+    """Models to warm up, config.MODEL last so that it stays loaded."""
+    models = [model for model in config.WARMUP_MODELS if model != config.MODEL]
+    return models + [config.MODEL]
+
+
+def warmup_precisions() -> list:
+    """Precision variants to warm up, config.PRECISION last."""
+    precisions = [p for p in config.PRECISIONS if p != config.PRECISION]
+    return precisions + [config.PRECISION]
+
+
+def preload(models: list = None, precisions: list = None) -> None:
+    """Loads the models and the conditionals of the supported voices."""
+    for model_name in models or warmup_models():
+        for precision in precisions or warmup_precisions():
+            backend = model_registry.get(model_name, precision)
+            for voice in config.SUPPORTED_VOICES:
+                conditionals_cache.get(
+                    backend, model_name, voice, config.AUDIO_EXAGGERATION, precision
+                )
+
+
+class Warmup:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        # Until the warmup starts, models are loaded on the first request
+        self.ready = True
+        self.error = None
+        self.seconds = None
+        self._thread = None
+
+    def start(self, on_ready=None) -> None:
+        """
+        Warms up in a background thread, then calls `on_ready()`. When the
+        warmup is disabled, `on_ready()` is called right away.
+        """
+        if not self.enabled:
+            if on_ready is not None:
+                on_ready()
+            return
+        self.ready = False
+        self._thread = threading.Thread(
+            target=self._run, args=(on_ready,), name="warmup", daemon=True
+        )
+        self._thread.start()
+
+    def check(self) -> None:
+        """Raises WarmingUpError until the warmup is done."""
+        if not self.ready:
+            raise WarmingUpError(self.error or "The server is warming up.")
+
+    def status(self) -> dict:
+        if self.ready:
+            status = "ready"
+        else:
+            status = "failed" if self.error else "warming up"
+        return {
+            "status": status,
+            "warmup_seconds": round(self.seconds, 3) if self.seconds else None,
+            "error": self.error,
+            "models": model_registry.loaded(),
+        }
+
+    def _run(self, on_ready) -> None:
+        start = time.perf_counter()
+        try:
+            for model_name in warmup_models():
+                for precision in warmup_precisions():
+                    preload([model_name], [precision])
+                    if not config.SUPPORTED_VOICES:
+                        continue
+                    # Runs on the inference worker like a request, so the
+                    # kernels are warmed up on the thread that will use them
+                    tts.generate_audio(
+                        WARMUP_TEXT,
+                        config.SUPPORTED_VOICES[0],
+                        model_name=model_name,
+                        precision=precision,
+                    )
+        except Exception as e:
+            self.error = f"Warmup failed: {e}"
+            print(self.error)
+            return
+        self.seconds = time.perf_counter() - start
+        self.ready = True
+        print(f"Warmed up in {self.seconds:.1f}s, ready to serve")
+        if on_ready is not None:
+            on_ready()
+
+
+warmup = Warmup(config.WARMUP)